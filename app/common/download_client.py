@@ -1,28 +1,507 @@
-from typing import Optional
+import asyncio
+import random
+import re
+import ssl
+import time
+import xmlrpc.client
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Collection,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import aiohttp
 
 from app.common.logger import logger
+from app.settings import HttpSettings, settings
 
+from .hedging import Hedger
 from .proxy_manager import ProxyManager
+from .source_health import SourceHealth
+
+# 流式传输的分块大小
+CHUNK_SIZE = 256 * 1024
+# 可以重试的上游状态码
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 可以重试（续传）的传输错误
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# 续传后至少读到这么多数据才重置失败计数，每个连接只传少量数据的上游仍受重试次数限制
+RESUME_PROGRESS_RESET = 16 * CHUNK_SIZE
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)", re.IGNORECASE)
+
+
+class UpstreamChangedError(Exception):
+    """续传时上游文件已发生变化，已下载的部分不能再使用"""
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """解析 ``Content-Range: bytes a-b/total``，返回 (起始位置, 总大小)"""
+    match = _CONTENT_RANGE_RE.fullmatch(value.strip()) if value else None
+    if match is None:
+        return None
+    total = match[3]
+    return int(match[1]), None if total == "*" else int(total)
+
+
+def _byte_range(start: int, end: Optional[int] = None) -> str:
+    """``[start, end)`` 的 ``Range`` 请求头，``end`` 为 None 时到文件末尾"""
+    return f"bytes={start}-" if end is None else f"bytes={start}-{end - 1}"
+
+
+@dataclass
+class FetchResult:
+    """一次完整请求的结果"""
+
+    url: str
+    status: int
+    headers: Mapping[str, str]
+    body: bytes = b""
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class ResumableResponse:
+    """支持断点续传的上游响应
+
+    与 aiohttp 响应一样通过 ``content.iter_chunked()`` 读取。传输中断时按指数退避
+    等待后，从已读取的位置发起 ``Range`` 请求继续，``If-Range`` 携带首个响应的
+    强 ETag（或 Last-Modified）；续传响应的位置、总大小或 ETag 与首个响应不一致
+    时抛出 ``UpstreamChangedError``，调用方丢弃已下载的部分。
+    首个响应是 206 时从 ``Content-Range`` 的起始位置开始，到请求的范围末尾结束
+    （分段下载）。
+    """
+
+    def __init__(
+        self,
+        client: "DownloadClient",
+        url: str,
+        response: aiohttp.ClientResponse,
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        self.client = client
+        self.request_url = url
+        self.request_headers = dict(headers or {})
+        self.response = response
+        self.url = response.url
+        self.status = response.status
+        self.headers = response.headers
+        self.content_type = response.content_type
+        self.content_length = response.content_length
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.resumes = 0
+        # 正文在文件中的起始位置、结束位置（不含）与文件总大小
+        self.start, self.size = 0, response.content_length
+        if response.status == 206:
+            content_range = parse_content_range(response.headers.get("Content-Range"))
+            if content_range is not None:
+                self.start, self.size = content_range
+        self.end = self.size
+        if response.status == 206 and response.content_length is not None:
+            self.end = self.start + response.content_length
+
+    @property
+    def content(self) -> "ResumableResponse":
+        return self
+
+    def release(self):
+        self.response.release()
+
+    @property
+    def validator(self) -> Optional[str]:
+        """``If-Range`` 的取值：弱 ETag 不能用于范围请求，改用 Last-Modified"""
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    async def iter_chunked(self, chunk_size: int) -> AsyncIterator[bytes]:
+        """按块读取正文，中断后自动续传"""
+        position = self.start
+        failures = 0
+        resumed_at = position
+        started = time.monotonic()
+        while True:
+            try:
+                async for chunk in self.response.content.iter_chunked(chunk_size):
+                    position += len(chunk)
+                    if failures and position - resumed_at >= RESUME_PROGRESS_RESET:
+                        failures = 0
+                    yield chunk
+                if self.end is None or position >= self.end:
+                    self.client.health.observe_transfer(
+                        self.request_url,
+                        position - self.start,
+                        time.monotonic() - started,
+                    )
+                    return
+                raise aiohttp.ClientPayloadError(
+                    f"Connection closed at {position} of {self.end} bytes"
+                )
+            except TRANSIENT_ERRORS as e:
+                failures += 1
+                resumed_at = position
+                # 不知道总大小时无法判断续传是否完整
+                if failures > self.client.max_retries or self.end is None:
+                    raise
+                logger.warning(
+                    "download.resume",
+                    url=self.request_url,
+                    position=position,
+                    size=self.size,
+                    attempt=failures,
+                    error=str(e) or type(e).__name__,
+                )
+                self.response.release()
+                await asyncio.sleep(self.client.backoff(failures))
+                self.response = await self._reopen(position)
+                self.resumes += 1
+
+    async def _reopen(self, position: int) -> aiohttp.ClientResponse:
+        """从 ``position`` 处重新打开响应"""
+        headers = {**self.request_headers, "Range": _byte_range(position, self.end)}
+        validator = self.validator
+        if validator:
+            headers["If-Range"] = validator
+        response = await self.client.open(
+            self.request_url, headers=headers, statuses=(200, 206)
+        )
+        if response is None:
+            raise aiohttp.ClientConnectionError(f"Resume failed: {self.request_url}")
+
+        etag = response.headers.get("ETag")
+        changed = bool(self.etag and etag and etag != self.etag)
+        if response.status == 206:
+            content_range = parse_content_range(response.headers.get("Content-Range"))
+            changed = (
+                changed
+                or content_range is None
+                or content_range[0] != position
+                or content_range[1] not in (None, self.size)
+            )
+        else:
+            # 200：If-Range 不匹配（文件已变化）或上游不支持范围请求
+            changed = (
+                changed
+                or response.content_length != self.size
+                or (
+                    self.last_modified is not None
+                    and response.headers.get("Last-Modified") != self.last_modified
+                )
+            )
+        if changed:
+            response.release()
+            raise UpstreamChangedError(f"Upstream file changed: {self.request_url}")
+
+        if response.status == 200:
+            # 内容未变但不支持范围请求：跳过已下载的部分
+            try:
+                remaining = position
+                while remaining:
+                    chunk = await response.content.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise aiohttp.ClientPayloadError("Connection closed")
+                    remaining -= len(chunk)
+            except BaseException:
+                response.release()
+                raise
+        return response
 
 
 class DownloadClient:
-    def __init__(self, proxy_manager: ProxyManager):
+    """上游下载客户端
+
+    所有请求复用同一个 ``aiohttp.ClientSession``，连接池按主机限流，
+    并开启 keep-alive 与 DNS 缓存，避免每个请求重新握手。
+    连接失败或上游返回 429/5xx 时按指数退避（带随机抖动）重试。
+    每次请求的耗时与结果记入 ``health``，供按源评分排序。
+    """
+
+    def __init__(
+        self,
+        proxy_manager: ProxyManager,
+        http_settings: Optional[HttpSettings] = None,
+        timeout_seconds: Optional[int] = None,
+        health: Optional[SourceHealth] = None,
+    ):
         self.proxy_manager = proxy_manager
+        self.health = health or SourceHealth()
+        self.hedger = Hedger(self.health)
+        self.http_settings = http_settings or settings.http
+        self.timeout_seconds = timeout_seconds or settings.pypi.timeout_seconds
+        self.max_retries = settings.pypi.max_retries
+        self.retry_backoff = settings.pypi.retry_backoff
+        self.retry_backoff_max = settings.pypi.retry_backoff_max
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+        # 所有连接共用一个 SSL 上下文，证书只加载一次
+        self._ssl_context = ssl.create_default_context()
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池的会话"""
+        connector = aiohttp.TCPConnector(
+            limit=self.http_settings.pool_size,
+            limit_per_host=self.http_settings.pool_size_per_host,
+            keepalive_timeout=self.http_settings.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.http_settings.dns_cache_ttl,
+            ssl=self._ssl_context,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=self.http_settings.connect_timeout,
+            sock_read=self.timeout_seconds,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """获取共享会话，未启动时按需创建
+
+        会话绑定创建它的事件循环，事件循环变化时先关闭旧会话再重新创建。
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._loop is not loop:
+            self._close_stale_session()
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            self._loop = loop
+        return self._session
+
+    def _close_stale_session(self):
+        """关闭绑定到其他事件循环的会话"""
+        session, loop = self._session, self._loop
+        self._session = self._loop = None
+        if session.closed:
+            return
+        if loop is not None and not loop.is_closed():
+            # 原事件循环仍在运行（其他线程）：在原事件循环中关闭
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # 原事件循环已结束，连接不能再使用：在当前事件循环中释放会话
+        task = asyncio.ensure_future(session.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def start(self):
+        """启动连接池"""
+        _ = self.session
+        logger.info(
+            "download.client.started",
+            pool_size=self.http_settings.pool_size,
+            pool_size_per_host=self.http_settings.pool_size_per_host,
+        )
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    def backoff(self, attempt: int) -> float:
+        """第 ``attempt`` 次重试前的等待时间：指数退避加全抖动"""
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay)
 
     async def download(self, url: str) -> Optional[bytes]:
-        """下载文件"""
+        """下载文件，传输中断时自动续传"""
+        response = await self.open(url, resumable=True)
+        if response is None:
+            return None
+        try:
+            chunks = [
+                chunk async for chunk in response.content.iter_chunked(CHUNK_SIZE)
+            ]
+            return b"".join(chunks)
+        except Exception as e:
+            logger.error(f"Download error: {url}, error: {e!s}")
+            return None
+        finally:
+            response.release()
+
+    def plan_segments(self, response: ResumableResponse) -> List[int]:
+        """按配置计算分段并行下载时其余各段的起始位置
+
+        文件小于阈值、大小未知或上游未声明 ``Accept-Ranges: bytes`` 时返回空列表。
+        """
+        threshold = int(self.http_settings.segment_threshold_mb * 1024 * 1024)
+        count = self.http_settings.segment_count
+        size = response.size
+        if not threshold or count < 2 or not size or size < threshold:
+            return []
+        if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+            return []
+        step = -(-size // count)
+        return [index * step for index in range(1, count)]
+
+    async def open_segment(
+        self, response: ResumableResponse, start: int, end: Optional[int] = None
+    ) -> Optional[ResumableResponse]:
+        """打开同一文件 ``[start, end)`` 的一段，与 ``response`` 不是同一文件时返回 None"""
+        headers = {**response.request_headers, "Range": _byte_range(start, end)}
+        if response.validator:
+            headers["If-Range"] = response.validator
+        segment = await self.open(
+            response.request_url, headers=headers, statuses=(206,), resumable=True
+        )
+        if segment is None:
+            return None
+        if (
+            segment.start != start
+            or segment.size != response.size
+            or (response.etag and segment.etag and segment.etag != response.etag)
+        ):
+            segment.release()
+            return None
+        return segment
+
+    async def fetch(
+        self, url: str, headers: Optional[Mapping[str, str]] = None
+    ) -> Optional[FetchResult]:
+        """带请求头获取资源，用于条件请求
+
+        返回 200 或 304 的结果，其他情况返回 None。
+        """
         proxy = self.proxy_manager.get_proxy(url)
         proxy_url = proxy.http_proxy if proxy else None
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, proxy=proxy_url) as response:
-                    if response.status == 200:
-                        return await response.read()
+        started = time.monotonic()
+        try:
+            async with self.session.get(
+                url, proxy=proxy_url, headers=headers
+            ) as response:
+                self._observe(url, started, response.status)
+                if response.status == 200:
+                    body = await response.read()
+                elif response.status == 304:
+                    body = b""
+                else:
                     logger.error(f"Download failed: {url}, status: {response.status}")
                     return None
+                return FetchResult(
+                    url=str(response.url),
+                    status=response.status,
+                    headers=response.headers,
+                    body=body,
+                )
+        except Exception as e:
+            self._observe(url, started, None)
+            logger.error(f"Download error: {url}, error: {e!s}")
+            return None
+
+    async def open(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        method: str = "GET",
+        statuses: Collection[int] = (200,),
+        resumable: bool = False,
+    ) -> Union[aiohttp.ClientResponse, ResumableResponse, None]:
+        """打开流式下载
+
+        成功时返回尚未读取正文的响应，调用方负责 ``release()``；失败返回 None。
+        连接失败或可重试的状态码最多重试 ``max_retries`` 次。
+
+        Args:
+            method: 请求方法，``HEAD`` 只获取响应头
+            statuses: 视为成功的状态码，范围请求需要包含 206
+            resumable: 返回传输中断时自动续传的 ``ResumableResponse``
+        """
+        proxy = self.proxy_manager.get_proxy(url)
+        proxy_url = proxy.http_proxy if proxy else None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff(attempt))
+            started = time.monotonic()
+            try:
+                response = await self.session.request(
+                    method, url, proxy=proxy_url, headers=headers, allow_redirects=True
+                )
+            except TRANSIENT_ERRORS as e:
+                self._observe(url, started, None)
+                logger.error(f"Download error: {url}, error: {e!s}")
+                continue
             except Exception as e:
+                self._observe(url, started, None)
                 logger.error(f"Download error: {url}, error: {e!s}")
                 return None
+
+            self._observe(url, started, response.status)
+            if response.status in statuses:
+                if resumable:
+                    return ResumableResponse(self, url, response, headers)
+                return response
+            logger.error(f"Download failed: {url}, status: {response.status}")
+            response.release()
+            if response.status not in RETRY_STATUSES:
+                return None
+        return None
+
+    async def xmlrpc(self, url: str, method: str, *params) -> Optional[Any]:
+        """调用上游的 XML-RPC 接口（如 PyPI 的 changelog），失败时返回 None"""
+        proxy = self.proxy_manager.get_proxy(url)
+        proxy_url = proxy.http_proxy if proxy else None
+        body = xmlrpc.client.dumps(params, method, allow_none=True)
+        started = time.monotonic()
+        try:
+            async with self.session.post(
+                url,
+                proxy=proxy_url,
+                data=body.encode(),
+                headers={"Content-Type": "text/xml"},
+            ) as response:
+                self._observe(url, started, response.status)
+                if response.status != 200:
+                    logger.error(f"XML-RPC failed: {url}, status: {response.status}")
+                    return None
+                content = await response.read()
+            return xmlrpc.client.loads(content.decode())[0][0]
+        except Exception as e:
+            logger.error(f"XML-RPC error: {url} {method}, error: {e!s}")
+            return None
+
+    async def probe(self, url: str) -> bool:
+        """向上游发送一次 HEAD 请求（不重试），结果记入健康评分"""
+        proxy = self.proxy_manager.get_proxy(url)
+        proxy_url = proxy.http_proxy if proxy else None
+        timeout = aiohttp.ClientTimeout(total=self.http_settings.connect_timeout)
+        started = time.monotonic()
+        try:
+            async with self.session.head(
+                url, proxy=proxy_url, allow_redirects=True, timeout=timeout
+            ) as response:
+                status = response.status
+        except Exception as e:
+            self._observe(url, started, None)
+            logger.warning("source.probe.failed", source=url, error=str(e))
+            return False
+        self._observe(url, started, status)
+        return status not in RETRY_STATUSES
+
+    def _observe(self, url: str, started: float, status: Optional[int]):
+        """记录一次请求：连接错误、超时与可重试的状态码视为失败"""
+        self.health.observe(
+            url,
+            time.monotonic() - started,
+            status is not None and status not in RETRY_STATUSES,
+        )
+
+    @staticmethod
+    async def iter_chunks(
+        response: aiohttp.ClientResponse, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """按块读取响应正文"""
+        async for chunk in response.content.iter_chunked(chunk_size):
+            yield chunk
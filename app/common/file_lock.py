@@ -0,0 +1,79 @@
+import fcntl
+import os
+from pathlib import Path
+from typing import Optional
+
+
+class FileLock:
+    """基于 ``flock`` 的跨进程文件锁
+
+    锁文件在释放时删除；获取锁后会校验路径仍指向同一个文件，
+    避免与删除锁文件的进程发生竞争。锁文件内容可用于记录持有者信息。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """尝试非阻塞获取锁，成功返回 True"""
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is None or current.st_ino != os.fstat(fd).st_ino:
+                # 锁文件在获取期间被其他进程删除或替换，重试
+                os.close(fd)
+                continue
+
+            self._fd = fd
+            return True
+
+    def release(self):
+        """释放锁并删除锁文件"""
+        if self._fd is None:
+            return
+        try:
+            self.path.unlink(missing_ok=True)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def write_owner(self, content: str):
+        """记录持有者信息"""
+        if self._fd is None:
+            raise RuntimeError(f"Lock not held: {self.path}")
+        data = content.encode()
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, data, 0)
+
+    def read_owner(self) -> Optional[str]:
+        """读取当前持有者信息"""
+        try:
+            return self.path.read_text() or None
+        except FileNotFoundError:
+            return None
+
+    def is_held_elsewhere(self) -> bool:
+        """判断锁是否被其他持有者占用"""
+        if self._fd is not None:
+            return False
+        if not self.acquire():
+            return True
+        self.release()
+        return False
@@ -0,0 +1,122 @@
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.common.logger import logger
+from app.settings import HedgeSettings, settings
+
+from .source_health import SourceHealth
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """对冲请求
+
+    按顺序向各源发出同一请求：首选源在其延迟分位数内没有返回时，提前向下一个源
+    发出相同请求，取先成功的结果并取消其余请求；某个源失败时立即尝试下一个源。
+    每次请求最多对冲一次，每种请求类型的对冲次数不超过请求总数的 ``budget`` 比例，
+    避免上游负载翻倍。未启用对冲的请求类型按顺序逐个尝试。
+    """
+
+    def __init__(
+        self, health: SourceHealth, hedge_settings: Optional[HedgeSettings] = None
+    ):
+        self.health = health
+        self.settings = hedge_settings or settings.hedge
+        self._requests: Counter = Counter()
+        self._hedges: Counter = Counter()
+
+    def delay(self, source: str) -> float:
+        """等待首选源的时间：其延迟分位数，限制在配置的上下限之间"""
+        latency = self.health.latency_percentile(source, self.settings.percentile)
+        if latency is None:
+            return self.settings.max_delay
+        return min(self.settings.max_delay, max(self.settings.min_delay, latency))
+
+    def _allow(self, kind: str) -> bool:
+        """对冲次数是否仍在预算内"""
+        return self._hedges[kind] + 1 <= self.settings.budget * self._requests[kind]
+
+    async def run(
+        self,
+        kind: str,
+        sources: List[str],
+        attempt: Callable[[str], Awaitable[Optional[T]]],
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> Optional[T]:
+        """依次（或对冲）向 ``sources`` 调用 ``attempt``，返回第一个非 None 的结果
+
+        Args:
+            kind: 请求类型，对应 ``HedgeSettings`` 中的开关
+            attempt: 向单个源发出请求，失败时返回 None 或抛出异常
+            discard: 释放被放弃的结果（如未读取的响应）
+        """
+        enabled = getattr(self.settings, kind, False)
+        self._requests[kind] += 1
+        queue = list(sources)
+        pending: Dict[asyncio.Future, str] = {}
+        hedged = False
+
+        def launch():
+            source = queue.pop(0)
+            pending[asyncio.ensure_future(attempt(source))] = source
+
+        try:
+            while queue or pending:
+                if not pending:
+                    launch()
+                timeout = None
+                if enabled and not hedged and queue:
+                    timeout = self.delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    if self._allow(kind):
+                        self._hedges[kind] += 1
+                        logger.info(
+                            "source.hedge.fired",
+                            kind=kind,
+                            primary=next(iter(pending.values())),
+                            hedge=queue[0],
+                            delay=timeout,
+                        )
+                        launch()
+                    continue
+
+                result = None
+                for task in done:
+                    source = pending.pop(task)
+                    try:
+                        value = task.result()
+                    except Exception as e:
+                        logger.error(
+                            "source.request.failed",
+                            kind=kind,
+                            source=source,
+                            error=str(e),
+                        )
+                        continue
+                    if value is None:
+                        continue
+                    if result is None:
+                        result = value
+                    elif discard is not None:
+                        discard(value)
+                if result is not None:
+                    return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(lambda t: _discard_abandoned(t, discard))
+
+
+def _discard_abandoned(task: asyncio.Future, discard: Optional[Callable]):
+    """释放被取消前已经完成的请求结果"""
+    if task.cancelled():
+        return
+    if task.exception() is None and task.result() is not None and discard:
+        discard(task.result())
@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.settings import settings
+
+T = TypeVar("T")
+
+
+class IOPool:
+    """文件 I/O 线程池
+
+    所有可能阻塞的文件系统操作（读写、stat、遍历目录、删除）都通过
+    ``run()`` 交给独立的线程池执行，事件循环只负责调度。
+    与 anyio/默认执行器分开，大文件写入不会占满其他组件的线程。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """线程池，首次使用或关闭后重新创建"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="dephost-io"
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """在线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        if kwargs:
+            fn = functools.partial(fn, **kwargs)
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+# 全局文件 I/O 线程池
+io_pool = IOPool(settings.io.workers)
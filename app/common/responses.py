@@ -0,0 +1,432 @@
+import gzip
+import hashlib
+import os
+import stat
+import uuid
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.common.io_pool import io_pool
+
+# 无零拷贝扩展时每次从文件读取的块大小
+READ_CHUNK_SIZE = 1024 * 1024
+# 单个请求最多接受的范围数，超过时忽略 Range 返回完整文件
+MAX_RANGES = 32
+# 小于该大小的正文不预先压缩
+MIN_COMPRESS_SIZE = 1024
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 ``Range: bytes=...`` 请求头
+
+    支持 ``a-b``、``a-`` 与后缀 ``-n`` 形式，超出文件的部分截断，
+    重叠或相邻的范围合并。
+
+    Returns:
+        按起始位置排序的 ``[start, end)`` 列表；语法无效或范围过多时返回 None
+        （应忽略该请求头），没有可满足的范围时返回空列表
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = (item.strip() for item in part.partition("-"))
+        if not sep or not (first or last):
+            return None
+        if any(item and not item.isdigit() for item in (first, last)):
+            return None
+        if not first:
+            # 后缀范围：最后 n 个字节
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            end = int(last) + 1 if last else size
+            ranges.append((start, min(end, size)))
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_accept_encoding(value: Optional[str]) -> Dict[str, float]:
+    """解析 ``Accept-Encoding``，返回 {编码: q 值}"""
+    encodings = {}
+    for item in (value or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        encodings[coding.lower()] = q
+    return encodings
+
+
+@dataclass
+class RenderedBody:
+    """预先渲染并压缩的响应正文
+
+    渲染一次后可以被任意多个请求直接发送：按 ``Accept-Encoding`` 选择已压缩的版本，
+    ETag 为内容摘要（压缩版本附加编码后缀），无需再次序列化或压缩。
+    """
+
+    content: bytes
+    media_type: str
+    etag: str  # 内容摘要，不含引号
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def render(cls, content: bytes, media_type: str) -> "RenderedBody":
+        """计算摘要并预先压缩，压缩后没有变小的编码不保留"""
+        encoded = {}
+        if len(content) >= MIN_COMPRESS_SIZE:
+            encoded["gzip"] = gzip.compress(content, compresslevel=6, mtime=0)
+            encoded = {
+                coding: compressed
+                for coding, compressed in encoded.items()
+                if len(compressed) < len(content)
+            }
+        return cls(
+            content=content,
+            media_type=media_type,
+            etag=hashlib.sha256(content).hexdigest()[:32],
+            encoded=encoded,
+        )
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """选择客户端接受且压缩率最高的编码，都不接受时返回 None"""
+        accepted = parse_accept_encoding(accept_encoding)
+        candidates = [
+            coding
+            for coding in self.encoded
+            if accepted.get(coding, accepted.get("*", 0.0)) > 0
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda coding: len(self.encoded[coding]))
+
+
+class RenderedResponse(Response):
+    """发送 ``RenderedBody``
+
+    处理 ``If-None-Match``（304），按 ``Accept-Encoding`` 发送预压缩的版本。
+    """
+
+    def __init__(
+        self,
+        rendered: RenderedBody,
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        self.rendered = rendered
+        self.status_code = 200
+        self.media_type = rendered.media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        rendered = self.rendered
+        encoding = rendered.choose_encoding(request_headers.get("accept-encoding"))
+        body = rendered.encoded[encoding] if encoding else rendered.content
+        etag = f"{rendered.etag}-{encoding}" if encoding else rendered.etag
+        self.headers["etag"] = f'"{etag}"'
+        if rendered.encoded:
+            vary = self.headers.get("vary")
+            self.headers["vary"] = (
+                f"{vary}, Accept-Encoding" if vary else ("Accept-Encoding")
+            )
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [
+                tag.strip().removeprefix("W/").strip('"')
+                for tag in if_none_match.split(",")
+            ]
+            # 任一编码版本的 ETag 都表示内容未变
+            if "*" in tags or any(
+                tag.split("-", 1)[0] == rendered.etag for tag in tags
+            ):
+                self.status_code = 304
+                del self.headers["content-type"]
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": self.raw_headers,
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if encoding:
+            self.headers["content-encoding"] = encoding
+        self.headers["content-length"] = str(len(body))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+class CachedFileResponse(Response):
+    """缓存文件响应
+
+    服务器支持 ASGI ``http.response.zerocopysend`` 扩展时直接交给
+    ``os.sendfile`` 发送；否则在文件 I/O 线程池中按块 ``pread``，内存占用只有一个块。
+    不超过一块的文件（大多数 wheel）在打开文件的同一次线程池调用中整体读入。
+    自动设置 ``Content-Length``/``Last-Modified``/``ETag`` 并处理条件请求，
+    GET 请求支持 ``Range``（单个或多个范围）与 ``If-Range``。
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: str = "application/octet-stream",
+        etag: Optional[str] = None,
+    ):
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.etag = etag
+        self._content: Optional[bytes] = None  # 整体读入的小文件内容
+        self.init_headers(headers)
+
+    def _open(self, read_small: bool) -> Tuple[Optional[int], os.stat_result]:
+        """打开文件并取状态，返回文件描述符与状态
+
+        ``read_small`` 为真且文件不超过一块时同时读入内容并关闭文件，
+        此时返回的文件描述符为 None。
+        """
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            stat_result = os.fstat(fd)
+            if not stat.S_ISREG(stat_result.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            if read_small and stat_result.st_size <= READ_CHUNK_SIZE:
+                content = os.pread(fd, stat_result.st_size, 0)
+                if len(content) == stat_result.st_size:
+                    self._content = content
+                    os.close(fd)
+                    return None, stat_result
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, stat_result
+
+    def _set_file_headers(self, stat_result: os.stat_result):
+        """根据文件状态设置响应头"""
+        etag = self.etag or f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+        self.headers["content-length"] = str(stat_result.st_size)
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["etag"] = f'"{etag}"'
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    def _is_not_modified(self, request_headers: Headers) -> bool:
+        """检查条件请求头，判断客户端缓存是否仍然有效"""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = self.headers["etag"]
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                modified = parsedate_to_datetime(self.headers["last-modified"])
+            except (TypeError, ValueError):
+                return False
+            return modified <= since
+        return False
+
+    def _if_range_matches(self, request_headers: Headers) -> bool:
+        """``If-Range`` 与当前文件一致时才按范围响应（ETag 使用强比较）"""
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', "W/")):
+            return if_range == self.headers["etag"]
+        return if_range == self.headers["last-modified"]
+
+    async def _send_start(self, send: Send, status: int):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": self.raw_headers,
+            }
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # 先打开文件再取状态，避免发送过程中文件被替换或删除
+        request_headers = Headers(scope=scope)
+        extensions = scope.get("extensions") or {}
+        read_small = (
+            scope["method"].upper() == "GET"
+            and "http.response.zerocopysend" not in extensions
+            and "if-none-match" not in request_headers
+            and "if-modified-since" not in request_headers
+        )
+        fd, stat_result = await io_pool.run(self._open, read_small)
+        try:
+            self._set_file_headers(stat_result)
+            size = stat_result.st_size
+
+            if self._is_not_modified(request_headers):
+                for header in ("content-length", "content-type"):
+                    del self.headers[header]
+                await self._send_start(send, 304)
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            method = scope["method"].upper()
+            ranges = None
+            range_header = request_headers.get("range")
+            if (
+                method == "GET"
+                and range_header is not None
+                and self._if_range_matches(request_headers)
+            ):
+                ranges = parse_range_header(range_header, size)
+
+            if ranges is None:
+                await self._send_start(send, self.status_code)
+                if method == "HEAD":
+                    await send({"type": "http.response.body", "body": b""})
+                else:
+                    await self._send_file(scope, send, fd, 0, size)
+            elif not ranges:
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                await self._send_start(send, 416)
+                await send({"type": "http.response.body", "body": b""})
+            elif len(ranges) == 1:
+                start, end = ranges[0]
+                self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+                self.headers["content-length"] = str(end - start)
+                await self._send_start(send, 206)
+                await self._send_file(scope, send, fd, start, end - start)
+            else:
+                await self._send_multipart(scope, send, fd, ranges, size)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    async def _send_multipart(
+        self,
+        scope: Scope,
+        send: Send,
+        fd: Optional[int],
+        ranges: List[Tuple[int, int]],
+        size: int,
+    ):
+        """以 ``multipart/byteranges`` 发送多个范围"""
+        boundary = uuid.uuid4().hex
+        content_type = self.headers.get("content-type", self.media_type)
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode("latin-1")
+        length = len(closing) + sum(
+            len(header) + (end - start) + 2
+            for header, (start, end) in zip(part_headers, ranges)
+        )
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(length)
+        await self._send_start(send, 206)
+
+        for index, (start, end) in enumerate(ranges):
+            prefix = b"\r\n" if index else b""
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": prefix + part_headers[index],
+                    "more_body": True,
+                }
+            )
+            await self._send_file(scope, send, fd, start, end - start, more_body=True)
+        await send({"type": "http.response.body", "body": b"\r\n" + closing})
+
+    async def _send_file(
+        self,
+        scope: Scope,
+        send: Send,
+        fd: Optional[int],
+        offset: int,
+        count: int,
+        more_body=False,
+    ):
+        """发送文件的一段内容，``more_body`` 为真时之后还有其他正文"""
+        if self._content is not None:
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": self._content[offset : offset + count],
+                    "more_body": more_body,
+                }
+            )
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": fd,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": more_body,
+                }
+            )
+            return
+
+        end = offset + count
+        while True:
+            size = min(READ_CHUNK_SIZE, end - offset)
+            chunk = await io_pool.run(os.pread, fd, size, offset)
+            offset += len(chunk)
+            remaining = bool(chunk) and offset < end
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining or more_body,
+                }
+            )
+            if not remaining:
+                break
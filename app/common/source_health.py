@@ -0,0 +1,197 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from app.common.logger import logger
+from app.settings import PyPISettings, settings
+
+# 每个源保留的最近成功请求耗时样本数（用于计算分位数）
+LATENCY_SAMPLES = 64
+# 计算分位数所需的最少样本数
+MIN_LATENCY_SAMPLES = 8
+
+# 熔断状态
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class SourceStats:
+    """单个上游源的健康记录"""
+
+    source: str
+    latency: Optional[float] = None  # 响应头到达耗时的 EWMA（秒）
+    throughput: Optional[float] = None  # 单连接下载速度的 EWMA（字节/秒）
+    error_rate: float = 0.0  # 失败比例的 EWMA
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None  # 熔断开始时间
+    last_seen: float = 0.0  # 最近一次请求完成时间
+    # 最近成功请求的耗时（秒）
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+
+class SourceHealth:
+    """上游源健康评分
+
+    每次请求上游后记录响应耗时与是否失败（连接错误、超时、429 与 5xx 记为失败，
+    404 等正常响应只记录耗时），下载完成时记录单连接吞吐量，均按 EWMA 平滑。
+    评分为期望耗时：``延迟 + 错误率 × 超时时间``，越小越优先；尚无记录的源评分为 0，
+    会被优先尝试一次。连续失败达到阈值后熔断，排到最后；冷却时间过后进入半开状态，
+    按评分正常参与排序，下一次成功即恢复，失败则重新熔断。
+
+    每个进程（worker）维护自己的记录。
+    """
+
+    def __init__(self, pypi_settings: Optional[PyPISettings] = None):
+        self.settings = pypi_settings or settings.pypi
+        self._stats: Dict[str, SourceStats] = {}
+        for source in self.settings.sources:
+            self._get(source)
+
+    def _get(self, source: str) -> SourceStats:
+        stats = self._stats.get(source)
+        if stats is None:
+            stats = self._stats[source] = SourceStats(source=source)
+        return stats
+
+    def source_for(self, url: str) -> Optional[str]:
+        """URL 所属的上游源：优先按地址前缀匹配，其次按主机匹配"""
+        matched = None
+        for source in self._stats:
+            prefix = source.rstrip("/")
+            if "/simple" in prefix:
+                prefix = prefix[: prefix.index("/simple")]
+            if url.startswith(prefix) and (
+                matched is None or len(prefix) > len(matched[1])
+            ):
+                matched = (source, prefix)
+        if matched is not None:
+            return matched[0]
+        host = urlsplit(url).netloc
+        for source in self._stats:
+            if urlsplit(source).netloc == host:
+                return source
+        return None
+
+    def state(self, stats: SourceStats, now: Optional[float] = None) -> str:
+        """熔断状态"""
+        if stats.opened_at is None:
+            return CLOSED
+        now = time.monotonic() if now is None else now
+        if now - stats.opened_at < self.settings.source_open_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    def score(self, stats: SourceStats) -> float:
+        """期望耗时（秒），越小越好"""
+        return (stats.latency or 0.0) + stats.error_rate * self.settings.timeout_seconds
+
+    def rank(self, sources: Iterable[str]) -> List[str]:
+        """按评分排序源，熔断中的源排在最后；评分相同时保持配置顺序"""
+        now = time.monotonic()
+        stats = [self._get(source) for source in sources]
+        stats.sort(key=lambda s: (self.state(s, now) == OPEN, self.score(s)))
+        return [s.source for s in stats]
+
+    def observe(self, url: str, latency: float, ok: bool):
+        """记录一次请求的结果"""
+        source = self.source_for(url)
+        if source is None:
+            return
+        stats = self._get(source)
+        alpha = self.settings.source_ewma_alpha
+        now = time.monotonic()
+        stats.requests += 1
+        stats.last_seen = now
+        stats.latency = (
+            latency
+            if stats.latency is None
+            else alpha * latency + (1 - alpha) * stats.latency
+        )
+        stats.error_rate = alpha * (0.0 if ok else 1.0) + (1 - alpha) * stats.error_rate
+
+        if ok:
+            stats.samples.append(latency)
+            if stats.opened_at is not None:
+                logger.info("source.circuit.closed", source=source)
+            stats.consecutive_failures = 0
+            stats.opened_at = None
+            return
+
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.settings.source_failure_threshold and (
+            self.state(stats, now) != OPEN
+        ):
+            stats.opened_at = now
+            logger.warning(
+                "source.circuit.opened",
+                source=source,
+                failures=stats.consecutive_failures,
+            )
+
+    def latency_percentile(self, source: str, q: float) -> Optional[float]:
+        """源最近成功请求耗时的 ``q`` 分位数，样本不足时返回 None"""
+        samples = self._get(source).samples
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def observe_transfer(self, url: str, size: int, elapsed: float):
+        """记录一次完整下载的吞吐量"""
+        source = self.source_for(url)
+        if source is None or elapsed <= 0 or size <= 0:
+            return
+        stats = self._get(source)
+        alpha = self.settings.source_ewma_alpha
+        speed = size / elapsed
+        stats.throughput = (
+            speed
+            if stats.throughput is None
+            else alpha * speed + (1 - alpha) * stats.throughput
+        )
+
+    def due_for_probe(self, sources: Iterable[str]) -> List[str]:
+        """需要探测的源：已过冷却时间的熔断源，以及超过探测间隔没有请求的源"""
+        now = time.monotonic()
+        interval = self.settings.source_probe_interval
+        due = []
+        for source in sources:
+            stats = self._get(source)
+            state = self.state(stats, now)
+            if state == HALF_OPEN or (
+                state == CLOSED and now - stats.last_seen >= interval
+            ):
+                due.append(source)
+        return due
+
+    def scoreboard(self, sources: Iterable[str]) -> List[dict]:
+        """按排序返回各源的当前状态"""
+        now = time.monotonic()
+        board = []
+        for source in self.rank(sources):
+            stats = self._stats[source]
+            board.append(
+                {
+                    "source": source,
+                    "state": self.state(stats, now),
+                    "score": round(self.score(stats), 4),
+                    "latency_ms": None
+                    if stats.latency is None
+                    else round(stats.latency * 1000, 1),
+                    "throughput": None
+                    if stats.throughput is None
+                    else int(stats.throughput),
+                    "error_rate": round(stats.error_rate, 4),
+                    "requests": stats.requests,
+                    "failures": stats.failures,
+                    "consecutive_failures": stats.consecutive_failures,
+                }
+            )
+        return board
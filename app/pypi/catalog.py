@@ -0,0 +1,303 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.common.logger import logger
+
+from .metadata import METADATA_SUFFIX
+from .storage import PackageStorage
+
+# 目录数据库文件名（位于存储目录内，以 "." 开头，不会被当作缓存文件）
+CATALOG_NAME = ".catalog.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    project TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    version TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    source_url TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project, filename)
+);
+CREATE INDEX IF NOT EXISTS artifacts_project_version ON artifacts (project, version);
+CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access);
+"""
+
+
+@dataclass
+class ArtifactRecord:
+    """缓存文件的元数据"""
+
+    project: str
+    filename: str
+    version: str
+    path: str  # 相对存储目录的路径
+    size: int
+    sha256: Optional[str] = None
+    source_url: Optional[str] = None
+    fetched_at: float = 0.0
+    last_access: float = 0.0
+    hits: int = 0  # 缓存命中次数（不含首次下载）
+
+
+_COLUMNS = ", ".join(field.name for field in fields(ArtifactRecord))
+_INSERT = (
+    f"INSERT OR REPLACE INTO artifacts ({_COLUMNS}) "
+    f"VALUES ({', '.join('?' * len(fields(ArtifactRecord)))})"
+)
+
+
+@dataclass
+class CatalogStats:
+    """缓存统计"""
+
+    projects: int
+    versions: int
+    files: int
+    size: int
+    hits: int
+
+
+class PackageCatalog:
+    """缓存文件目录（SQLite）
+
+    记录每个缓存文件的项目、版本、大小、sha256、来源与访问情况，
+    列表、统计和淘汰都通过索引查询完成，不需要遍历文件树。
+    使用 WAL 模式，多个 worker 可以同时读取；写入串行化并设置忙等待超时。
+    所有数据库操作都在文件 I/O 线程池中执行。
+    """
+
+    def __init__(self, storage: PackageStorage):
+        self.storage = storage
+        self.root = storage.root
+        self.path = storage.root / CATALOG_NAME
+        self.pool = storage.pool
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # 数据库文件是否为本进程新建（旧版本的缓存目录需要从磁盘重建）
+        self.created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.created = not self.path.exists()
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _transaction(self, statements: List[Tuple[str, tuple]]) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def close(self):
+        """关闭数据库连接"""
+        await self.pool.run(self._close)
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def relative(self, path: Path) -> str:
+        """缓存文件相对存储目录的路径"""
+        return path.relative_to(self.root).as_posix()
+
+    async def open(self):
+        """打开数据库并建表"""
+        await self.pool.run(self._connect)
+
+    async def put(self, record: ArtifactRecord):
+        """新增或替换文件记录"""
+        await self.pool.run(self._execute, _INSERT, astuple(record))
+
+    async def hit(self, project: str, filename: str) -> Optional[ArtifactRecord]:
+        """记录一次缓存命中，返回更新后的记录（不存在时返回 None）"""
+        rows = await self.pool.run(
+            self._execute,
+            "UPDATE artifacts SET hits = hits + 1, last_access = ? "
+            f"WHERE project = ? AND filename = ? RETURNING {_COLUMNS}",
+            (time.time(), project, filename),
+        )
+        return ArtifactRecord(*rows[0]) if rows else None
+
+    async def get(self, project: str, filename: str) -> Optional[ArtifactRecord]:
+        """按项目和文件名查找记录"""
+        rows = await self.pool.run(
+            self._execute,
+            f"SELECT {_COLUMNS} FROM artifacts WHERE project = ? AND filename = ?",
+            (project, filename),
+        )
+        return ArtifactRecord(*rows[0]) if rows else None
+
+    async def delete_paths(self, paths: List[str]):
+        """删除文件记录"""
+        await self.pool.run(
+            self._transaction,
+            [("DELETE FROM artifacts WHERE path = ?", (path,)) for path in paths],
+        )
+
+    async def delete_version(self, project: str, version: str):
+        """删除项目某个版本的全部记录"""
+        await self.pool.run(
+            self._execute,
+            "DELETE FROM artifacts WHERE project = ? AND version = ?",
+            (project, version),
+        )
+
+    async def list_files(self, project: str, version: str) -> List[ArtifactRecord]:
+        """列出项目某个版本的全部记录"""
+        rows = await self.pool.run(
+            self._execute,
+            f"SELECT {_COLUMNS} FROM artifacts WHERE project = ? AND version = ?",
+            (project, version),
+        )
+        return [ArtifactRecord(*row) for row in rows]
+
+    async def list_filenames(self, project: str) -> List[str]:
+        """列出项目已缓存的文件名"""
+        rows = await self.pool.run(
+            self._execute,
+            "SELECT filename FROM artifacts WHERE project = ?",
+            (project,),
+        )
+        return [row[0] for row in rows]
+
+    async def list_versions(self, project: str) -> List[str]:
+        """列出项目已缓存的版本"""
+        rows = await self.pool.run(
+            self._execute,
+            "SELECT DISTINCT version FROM artifacts WHERE project = ?",
+            (project,),
+        )
+        return [row[0] for row in rows]
+
+    async def entries(self) -> List[Tuple[str, int, float, int, Optional[str]]]:
+        """全部文件的 (路径, 大小, 最后访问时间, 命中次数, sha256)，供淘汰使用"""
+        return await self.pool.run(
+            self._execute,
+            "SELECT path, size, last_access, hits, sha256 FROM artifacts",
+        )
+
+    async def stats(self) -> CatalogStats:
+        """缓存统计"""
+        rows = await self.pool.run(
+            self._execute,
+            "SELECT COUNT(DISTINCT project), COUNT(DISTINCT project || '/' || version),"
+            " COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM artifacts",
+        )
+        return CatalogStats(*rows[0])
+
+    async def rebuild(self) -> int:
+        """从磁盘重建目录，返回记录数"""
+        return await self.pool.run(self.rebuild_sync)
+
+    def rebuild_sync(self) -> int:
+        """遍历存储目录重建全部记录
+
+        保留仍然存在且大小未变的文件的来源与访问统计，其余重新计算 sha256；
+        尚未链接到内容目录的文件（旧版本缓存）登记为内容文件并去重。
+        """
+        known = {
+            row[3]: ArtifactRecord(*row)
+            for row in self._execute(f"SELECT {_COLUMNS} FROM artifacts")
+        }
+        records = []
+        for path in self._walk():
+            relative = self.relative(path)
+            parts = relative.split("/")
+            if len(parts) != 3:
+                continue
+            try:
+                stat_result = path.stat()
+            except FileNotFoundError:
+                continue
+
+            record = known.get(relative)
+            if record is None or record.size != stat_result.st_size:
+                record = ArtifactRecord(
+                    project=parts[0],
+                    version=parts[1],
+                    filename=parts[2],
+                    path=relative,
+                    size=stat_result.st_size,
+                    sha256=_file_sha256(path),
+                    fetched_at=stat_result.st_mtime,
+                    last_access=max(stat_result.st_atime, stat_result.st_mtime),
+                )
+            elif record.sha256 is None:
+                record.sha256 = _file_sha256(path)
+            if stat_result.st_nlink == 1:
+                self.storage.adopt(path, record.sha256)
+            records.append(record)
+
+        self._transaction(
+            [("DELETE FROM artifacts", ())]
+            + [(_INSERT, astuple(record)) for record in records]
+        )
+        logger.info("package.catalog.rebuilt", files=len(records))
+        return len(records)
+
+    def _walk(self):
+        """遍历存储目录中的缓存文件，跳过临时文件、锁、数据库与元数据文件"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for filename in filenames:
+                if not filename.startswith(".") and not filename.endswith(
+                    METADATA_SUFFIX
+                ):
+                    yield Path(dirpath, filename)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    """命令行：python -m app.pypi.catalog rebuild"""
+    from app.settings import settings
+
+    parser = argparse.ArgumentParser(description="包缓存目录维护")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--root", default=settings.pypi.packages_path)
+    args = parser.parse_args()
+
+    catalog = PackageCatalog(PackageStorage(Path(args.root)))
+    count = catalog.rebuild_sync()
+    catalog._close()
+    print(f"Rebuilt catalog with {count} files: {catalog.path}")
+
+
+if __name__ == "__main__":
+    main()
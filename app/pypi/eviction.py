@@ -0,0 +1,357 @@
+import asyncio
+import heapq
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.common.logger import logger
+from app.settings import CacheSettings
+
+from .catalog import PackageCatalog
+from .storage import PackageStorage
+
+GB = 1024**3
+
+
+@dataclass
+class CacheEntry:
+    """缓存文件的访问记录"""
+
+    path: Path
+    size: int
+    last_access: float
+    hits: int = 1
+    sha256: Optional[str] = None  # 内容摘要，删除最后一个引用时一并删除内容
+    version: int = 0  # 每次更新递增，用于跳过堆中的过期记录
+
+
+class EvictionPolicy:
+    """淘汰策略：优先级越低越先被淘汰"""
+
+    name = ""
+
+    def priority(self, entry: CacheEntry) -> Tuple[float, float]:
+        raise NotImplementedError
+
+    def evicted(self, priority: Tuple[float, float]):
+        """文件被淘汰后的回调"""
+
+
+class LRUPolicy(EvictionPolicy):
+    """最近最少使用"""
+
+    name = "lru"
+
+    def priority(self, entry: CacheEntry) -> Tuple[float, float]:
+        return (entry.last_access, 0.0)
+
+
+class LFUPolicy(EvictionPolicy):
+    """最不经常使用，次数相同时淘汰较久未访问的"""
+
+    name = "lfu"
+
+    def priority(self, entry: CacheEntry) -> Tuple[float, float]:
+        return (float(entry.hits), entry.last_access)
+
+
+class GDSFPolicy(EvictionPolicy):
+    """Greedy-Dual-Size-Frequency
+
+    优先级 = L + 访问次数 / 文件大小，偏向保留小而热的文件；
+    L 为最近一次淘汰的优先级，使长期未访问的旧文件逐渐失去优势。
+    """
+
+    name = "gdsf"
+
+    def __init__(self):
+        self.inflation = 0.0
+
+    def priority(self, entry: CacheEntry) -> Tuple[float, float]:
+        return (self.inflation + entry.hits / max(entry.size, 1), entry.last_access)
+
+    def evicted(self, priority: Tuple[float, float]):
+        self.inflation = max(self.inflation, priority[0])
+
+
+POLICIES = {policy.name: policy for policy in (LRUPolicy, LFUPolicy, GDSFPolicy)}
+
+
+class CacheEvictor:
+    """包缓存淘汰
+
+    启动时从缓存目录数据库加载一次，之后在写入、命中和删除时增量维护
+    总大小与每个文件的访问记录，淘汰决策不需要遍历目录。超过大小上限或
+    剩余空间低于下限时按策略淘汰；定时任务另外清理超过保存时间未访问的文件。
+
+    每个进程（worker）在内存中维护自己的记录：其他进程写入的文件在首次
+    命中时加入记录，定时任务从数据库重新加载以校正偏差；剩余空间始终以
+    文件系统为准。
+
+    内容相同的文件通过硬链接共享同一份数据，总大小按 sha256 只计一次，
+    删除最后一个引用时才释放空间。剩余空间不足时最多淘汰本缓存新写入的量，
+    其他程序占满磁盘时不会清空缓存。
+    """
+
+    def __init__(
+        self,
+        storage: PackageStorage,
+        catalog: PackageCatalog,
+        cache_settings: CacheSettings,
+    ):
+        self.storage = storage
+        self.catalog = catalog
+        self.settings = cache_settings
+        self.policy: EvictionPolicy = POLICIES[cache_settings.eviction_policy]()
+        self.total_size = 0
+        self._entries: Dict[Path, CacheEntry] = {}
+        # sha256 -> 引用该内容的文件数
+        self._blobs: Dict[str, int] = {}
+        # 上次淘汰检查后本缓存新写入的字节数
+        self._growth = 0
+        self._heap: List[Tuple[Tuple[float, float], int, Path]] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def max_bytes(self) -> Optional[int]:
+        """缓存大小上限，0 表示不限"""
+        return int(self.settings.max_size_gb * GB) or None
+
+    @property
+    def min_free_bytes(self) -> int:
+        return int(self.settings.min_free_space_gb * GB)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._entries
+
+    async def load(self):
+        """从缓存目录数据库加载访问记录"""
+        rows = await self.catalog.entries()
+        self._entries.clear()
+        self._heap.clear()
+        self._blobs.clear()
+        self.total_size = 0
+        for path, size, last_access, hits, sha256 in rows:
+            self._put(
+                CacheEntry(
+                    path=self.storage.root / path,
+                    size=size,
+                    last_access=last_access,
+                    hits=hits + 1,
+                    sha256=sha256,
+                )
+            )
+        logger.info(
+            "package.cache.loaded",
+            files=len(self._entries),
+            size=self.total_size,
+            policy=self.policy.name,
+        )
+
+    def record(self, path: Path, size: int, sha256: Optional[str] = None):
+        """记录新写入的文件"""
+        entry = self._entries.get(path)
+        before = self.total_size
+        if entry is not None:
+            self._release(entry)
+            entry.size = size
+            entry.sha256 = sha256
+            entry.last_access = time.time()
+            entry.hits += 1
+            self._account(entry)
+            self._push(entry)
+        else:
+            self._put(
+                CacheEntry(path=path, size=size, last_access=time.time(), sha256=sha256)
+            )
+        self._growth += max(self.total_size - before, 0)
+
+    def touch(self, path: Path, size: int):
+        """记录一次缓存命中，未记录的文件（其他进程写入）直接加入"""
+        entry = self._entries.get(path)
+        if entry is None:
+            self._put(CacheEntry(path=path, size=size, last_access=time.time()))
+            return
+        entry.hits += 1
+        entry.last_access = time.time()
+        self._push(entry)
+
+    def forget(self, path: Path):
+        """移除文件的记录"""
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._release(entry)
+        self._compact()
+
+    def _put(self, entry: CacheEntry):
+        self._entries[entry.path] = entry
+        self._account(entry)
+        self._push(entry)
+
+    def _account(self, entry: CacheEntry):
+        """计入文件大小，共享内容的文件只在第一个引用时计入"""
+        if entry.sha256 is not None:
+            count = self._blobs.get(entry.sha256, 0)
+            self._blobs[entry.sha256] = count + 1
+            if count:
+                return
+        self.total_size += entry.size
+
+    def _release(self, entry: CacheEntry) -> int:
+        """移除文件的大小，返回实际释放的字节数（内容仍被引用时为 0）"""
+        if entry.sha256 is not None:
+            count = self._blobs.pop(entry.sha256, 1) - 1
+            if count:
+                self._blobs[entry.sha256] = count
+                return 0
+        self.total_size -= entry.size
+        return entry.size
+
+    def _push(self, entry: CacheEntry):
+        entry.version += 1
+        heapq.heappush(
+            self._heap, (self.policy.priority(entry), entry.version, entry.path)
+        )
+        self._compact()
+
+    def _compact(self):
+        """堆中的过期记录过多时重建堆"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (self.policy.priority(entry), entry.version, entry.path)
+                for entry in self._entries.values()
+            ]
+            heapq.heapify(self._heap)
+
+    def _pop_victim(self, protect: Set[Path]) -> Optional[Tuple[CacheEntry, int]]:
+        """取出优先级最低的文件及删除它释放的字节数"""
+        skipped = []
+        victim = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            priority, version, path = item
+            entry = self._entries.get(path)
+            if entry is None or entry.version != version:
+                continue
+            if path in protect:
+                skipped.append(item)
+                continue
+            self.policy.evicted(priority)
+            victim = entry
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        if victim is None:
+            return None
+        del self._entries[victim.path]
+        return victim, self._release(victim)
+
+    async def free_space(self) -> int:
+        """缓存所在文件系统的剩余空间"""
+        usage = await self.storage.run(shutil.disk_usage, self.storage.root)
+        return usage.free
+
+    async def _excess(self, incoming: int) -> int:
+        """需要淘汰的字节数：超出大小上限与剩余空间下限的部分中较大的一个
+
+        剩余空间的缺口最多按本缓存上次检查后新写入（及即将写入）的量计算，
+        其余部分由其他程序占用，淘汰缓存也无济于事。
+        """
+        excess = 0
+        max_bytes = self.max_bytes
+        if max_bytes is not None:
+            excess = self.total_size + incoming - max_bytes
+        if self.min_free_bytes:
+            shortfall = self.min_free_bytes - (await self.free_space() - incoming)
+            own = min(shortfall, incoming + self._growth)
+            if shortfall > own:
+                logger.warning(
+                    "package.cache.disk_low",
+                    shortfall=shortfall,
+                    evictable=max(own, 0),
+                )
+            excess = max(excess, own)
+        return excess
+
+    async def make_room(self, incoming: int = 0, protect: Set[Path] = frozenset()):
+        """淘汰文件，直到能容纳 ``incoming`` 字节且满足大小与剩余空间限制
+
+        Returns:
+            淘汰的文件数
+        """
+        removed = freed = 0
+        async with self._lock:
+            excess = await self._excess(incoming)
+            self._growth = 0
+            while self._entries and freed < excess:
+                popped = self._pop_victim(protect)
+                if popped is None:
+                    break
+                victim, size = popped
+                await self._remove(victim)
+                removed += 1
+                freed += size
+
+        if removed:
+            logger.info(
+                "package.cache.evicted",
+                removed=removed,
+                freed=freed,
+                size=self.total_size,
+                policy=self.policy.name,
+            )
+        return removed
+
+    async def expire(self, max_age_days: Optional[int] = None) -> int:
+        """删除超过保存时间未访问的文件
+
+        Returns:
+            删除的文件数
+        """
+        max_age_days = max_age_days or self.settings.file_ttl_days
+        deadline = time.time() - max_age_days * 86400
+        removed = 0
+        async with self._lock:
+            expired = [
+                entry
+                for entry in self._entries.values()
+                if entry.last_access < deadline
+            ]
+            for entry in expired:
+                self.forget(entry.path)
+                await self._remove(entry)
+                removed += 1
+
+        if removed:
+            logger.info("package.cache.expired", removed=removed, size=self.total_size)
+        return removed
+
+    async def _remove(self, entry: CacheEntry):
+        """删除文件与目录记录，内容不再被引用时一并删除"""
+        try:
+            await self.catalog.delete_paths([self.catalog.relative(entry.path)])
+            await self.storage.run(self.storage.remove, entry.path, entry.sha256)
+            logger.debug("package.cache.removed", path=str(entry.path))
+        except Exception as e:
+            logger.error(
+                "package.cache.remove.failed", path=str(entry.path), error=str(e)
+            )
+
+    def schedule(self, protect: Set[Path] = frozenset()):
+        """写入后在后台检查限制，同一时刻只有一个淘汰任务"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self.make_room(protect=protect))
+
+    async def run(self):
+        """定时任务：重新加载记录，清理过期文件并执行淘汰"""
+        async with self._lock:
+            await self.load()
+        await self.expire()
+        await self.make_room()
@@ -1,57 +1,88 @@
 import asyncio
-import json
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Set
-
-from bs4 import BeautifulSoup
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from app.common.download_client import DownloadClient
+from app.common.io_pool import io_pool
 from app.common.logger import logger
 from app.common.proxy_manager import ProxyManager
+from app.common.singleflight import SingleFlight
 from app.settings import settings
 
+from .name_index import NAME_INDEX_NAME, ProjectNameIndex
+from .page_cache import ProjectPage, ProjectPageCache
+from .project_pages import ProjectPageRenders
+from .root_index import RootIndexCache
 from .schema import PackageVersion
+from .simple_parser import (
+    SERIAL_HEADER,
+    UPSTREAM_ACCEPT,
+    ProjectNameParser,
+    is_json_response,
+    normalize_project_name,
+    parse_project_names_json,
+    parse_project_response,
+)
+from .versions import ProjectVersions
 
 
 class PyPIIndexManager:
     """PyPI 包索引管理器"""
 
-    def __init__(self):
+    def __init__(self, download_client: Optional[DownloadClient] = None):
         """
         初始化索引管理器
+
+        Args:
+            download_client: 共享的下载客户端，未提供时自行创建
         """
         self.settings = settings.pypi
+        # 旧版本的索引文件，启动时导入项目名索引
         self.index_file = Path(self.settings.index_path) / "package_index.json"
-        self._local_index: Set[str] = set()  # 本地包索引
-        self._remote_index: Set[str] = set()  # 远程包索引
+        self.names = ProjectNameIndex(Path(self.settings.index_path) / NAME_INDEX_NAME)
+        self.root_index = RootIndexCache(self.names)
         self.cache_ttl = timedelta(
             seconds=self.settings.index_cache_ttl
         )  # 缓存过期时间
         self.last_index_update: Optional[datetime] = None  # 最后更新时间
-        self.download_client = DownloadClient(ProxyManager())
+        self.download_client = download_client or DownloadClient(ProxyManager())
         self.sources = self.settings.sources
+        self.page_cache = ProjectPageCache(
+            Path(self.settings.index_path) / "projects",
+            max_entries=self.settings.index_cache_entries,
+        )
+        self.project_pages = ProjectPageRenders(self.settings.index_cache_entries)
+        # 按版本分组的项目文件，页面对象变化时重新构建
+        self._versions: "OrderedDict[str, ProjectVersions]" = OrderedDict()
+        self._page_flights: SingleFlight[Optional[ProjectPage]] = SingleFlight()
+        self._background_tasks: Set[asyncio.Task] = set()
 
     async def init_index(self):
-        """初始化包索引"""
-        if self.index_file.exists():
-            try:
-                with open(self.index_file, "r") as f:
-                    data = json.load(f)
-                    self._local_index = set(data.get("local_packages", []))
-                    self._remote_index = set(data.get("remote_packages", []))
-                    self.last_index_update = (
-                        datetime.fromisoformat(data["last_update"])
-                        if data["last_update"]
-                        else None
-                    )
-                    logger.info(
-                        "package.index.loaded",
-                        local_count=len(self._local_index),
-                        remote_count=len(self._remote_index),
-                    )
-            except Exception as e:
-                logger.error("package.index.load.failed", error=str(e))
+        """初始化包索引
+
+        只打开项目名索引并读取更新时间，不加载项目名；首次启动时导入旧版本的索引文件。
+        """
+        try:
+            await self.names.open()
+            last_update = await self.names.import_json(self.index_file)
+            if last_update is not None:
+                await self.names.set_meta("last_update", last_update)
+            else:
+                last_update = await self.names.get_meta("last_update")
+        except Exception as e:
+            logger.error("package.index.load.failed", error=str(e))
+            return
+
+        self.last_index_update = (
+            datetime.fromisoformat(last_update) if last_update else None
+        )
+        local_count, remote_count = await self.names.counts()
+        logger.info(
+            "package.index.loaded", local_count=local_count, remote_count=remote_count
+        )
 
     def is_index_expired(self) -> bool:
         """检查索引是否过期"""
@@ -60,66 +91,76 @@ class PyPIIndexManager:
             or datetime.now() - self.last_index_update > self.cache_ttl
         )
 
-    def update_remote_index(self, packages: Set[str]):
-        """更新远程包索引"""
-        self._remote_index = packages
+    async def update_remote_index(self, packages: Set[str]):
+        """更新远程包索引，只写入发生变化的项目"""
+        try:
+            added, removed = await self.names.replace_remote(packages)
+            await self._mark_updated()
+        except Exception as e:
+            logger.error("package.index.save.failed", error=str(e))
+            return
+        logger.info("package.index.remote.updated", added=added, removed=removed)
+
+    async def _mark_updated(self):
+        """记录索引更新时间"""
         self.last_index_update = datetime.now()
-        self._save_index()
+        await self.names.set_meta("last_update", self.last_index_update.isoformat())
 
-    def update_local_index(self, package_name: str):
+    async def update_local_index(self, package_name: str):
         """更新本地索引"""
-        self._local_index.add(package_name)
-        self._save_index()
+        try:
+            await self.names.add_local(package_name)
+        except Exception as e:
+            logger.error("package.index.save.failed", error=str(e))
 
-    def remove_from_local_index(self, package_name: str):
+    async def remove_from_local_index(self, package_name: str):
         """从本地索引中移除包"""
-        self._local_index.discard(package_name)
-        self._save_index()
-
-    def get_all_packages(self) -> Set[str]:
-        """获取所有包名称"""
-        return self._local_index | self._remote_index
-
-    def _save_index(self):
-        """保存索引到文件"""
         try:
-            cache_data = {
-                "last_update": self.last_index_update.isoformat()
-                if self.last_index_update
-                else None,
-                "local_packages": list(self._local_index),
-                "remote_packages": list(self._remote_index),
-            }
-            with open(self.index_file, "w") as f:
-                json.dump(cache_data, f)
+            await self.names.remove_local(package_name)
         except Exception as e:
             logger.error("package.index.save.failed", error=str(e))
 
-    def get_index_status(self) -> dict:
+    async def has_package(self, package_name: str) -> bool:
+        """本地或上游是否存在该项目"""
+        return await self.names.contains(package_name)
+
+    async def count_packages(self) -> int:
+        """本地与上游项目总数"""
+        return await self.names.count()
+
+    async def get_index_status(self) -> dict:
         """获取索引状态"""
+        local_count, remote_count = await self.names.counts()
         return {
             "last_update": self.last_index_update.isoformat()
             if self.last_index_update
             else None,
-            "local_packages_count": len(self._local_index),
-            "remote_packages_count": len(self._remote_index),
+            "local_packages_count": local_count,
+            "remote_packages_count": remote_count,
             "is_expired": self.is_index_expired(),
         }
 
-    def clear_index(self):
+    async def clear_index(self):
         """清除索引缓存"""
-        self._local_index.clear()
-        self._remote_index.clear()
+        await self.names.clear()
         self.last_index_update = None
-        if self.index_file.exists():
-            self.index_file.unlink()
+        await io_pool.run(self.index_file.unlink, missing_ok=True)
 
     async def list_upstream_packages(self) -> List[str]:
         """获取上游源的包列表"""
+        packages, _, _ = await self._list_upstream()
+        return sorted(packages)
+
+    async def _list_upstream(self) -> Tuple[List[str], Optional[int], Optional[str]]:
+        """获取上游源的包列表
+
+        Returns:
+            (项目名, 上游的最新变更序列号, 源地址)，全部失败时项目名为空
+        """
         max_retries = 3
         retry_delay = 1
 
-        for source_url in self.sources:
+        for source_url in self.download_client.health.rank(self.sources):
             retries = 0
             while retries < max_retries:
                 try:
@@ -127,24 +168,19 @@ class PyPIIndexManager:
                     index_url = (
                         f"{source_url}/simple/"
                         if "/simple" not in source_url
-                        else source_url
+                        else f"{source_url}/"
                     )
 
                     logger.info("packages.upstream.list.start", source=source_url)
-                    content = await self.download_client.download(index_url)
+                    packages, serial = await self._stream_project_names(index_url)
 
-                    if content:
-                        soup = BeautifulSoup(content, "html.parser")
-                        packages = [
-                            link.string for link in soup.find_all("a") if link.string
-                        ]
-
-                        logger.info(
-                            "packages.upstream.list.success",
-                            source=source_url,
-                            count=len(packages),
-                        )
-                        return sorted(packages)
+                    logger.info(
+                        "packages.upstream.list.success",
+                        source=source_url,
+                        count=len(packages),
+                        serial=serial,
+                    )
+                    return packages, serial, source_url
 
                 except Exception as e:
                     retries += 1
@@ -163,75 +199,314 @@ class PyPIIndexManager:
                             error=str(e),
                         )
 
-        return []
+        return [], None, None
+
+    async def _stream_project_names(
+        self, index_url: str
+    ) -> Tuple[List[str], Optional[int]]:
+        """获取根索引页面中的项目名与 ``X-PyPI-Last-Serial``
+
+        上游支持 PEP 691 时直接解析 JSON，否则边下载边解析 HTML。
+        """
+        response = await self.download_client.open(
+            index_url, headers={"Accept": UPSTREAM_ACCEPT}
+        )
+        if response is None:
+            raise RuntimeError(f"Index unavailable: {index_url}")
+        serial = _parse_serial(response.headers.get(SERIAL_HEADER))
+
+        if is_json_response(response.content_type):
+            try:
+                return parse_project_names_json(await response.read()), serial
+            finally:
+                response.release()
+
+        parser = ProjectNameParser()
+        names = []
+        try:
+            async for chunk in self.download_client.iter_chunks(response):
+                names.extend(parser.feed(chunk))
+            names.extend(parser.close())
+        finally:
+            response.release()
+        return names, serial
 
     async def update_index(self):
-        """更新包索引"""
+        """更新包索引
+
+        记录了上次同步的序列号且上游提供 changelog 时只同步之后变化的项目，
+        并使这些项目的缓存页面失效；否则（或落后太多时）全量同步。
+        """
         try:
-            packages = await self.list_upstream_packages()
-            if packages:
-                self.update_remote_index(set(packages))
-                logger.info(
-                    "package.index.updated",
-                    local_count=len(self._local_index),
-                    remote_count=len(self._remote_index),
-                )
+            if self.settings.index_incremental_sync and await self._sync_changes():
+                return
+            await self._sync_full()
         except Exception as e:
             logger.error("package.index.update.failed", error=str(e))
 
+    async def _sync_full(self):
+        """下载完整的根索引并替换上游项目列表"""
+        packages, serial, source_url = await self._list_upstream()
+        if not packages:
+            return
+        await self.update_remote_index(set(packages))
+        await self.names.set_meta("serial", None if serial is None else str(serial))
+        await self.names.set_meta("serial_source", source_url)
+        local_count, remote_count = await self.names.counts()
+        logger.info(
+            "package.index.updated",
+            local_count=local_count,
+            remote_count=remote_count,
+            serial=serial,
+        )
+
+    async def _sync_changes(self) -> bool:
+        """按 changelog 增量同步，无法增量同步时返回 False"""
+        serial = _parse_serial(await self.names.get_meta("serial"))
+        source_url = await self.names.get_meta("serial_source")
+        if serial is None or not source_url:
+            return False
+
+        changelog_url = self.changelog_url(source_url)
+        client = self.download_client
+        last_serial = await client.xmlrpc(changelog_url, "changelog_last_serial")
+        if not isinstance(last_serial, int):
+            return False
+        if last_serial - serial > self.settings.index_sync_max_events:
+            logger.info(
+                "package.index.sync.too_far_behind",
+                serial=serial,
+                last_serial=last_serial,
+            )
+            return False
+
+        events = []
+        if last_serial > serial:
+            events = await client.xmlrpc(
+                changelog_url, "changelog_since_serial", serial
+            )
+            if events is None:
+                return False
+
+        # 按序列号顺序重放，得到每个项目的最终状态
+        present: Dict[str, bool] = {}
+        for name, _version, _timestamp, action, event_serial in sorted(
+            events, key=lambda event: event[4]
+        ):
+            present[name] = action != "remove project"
+            serial = max(serial, event_serial)
+        serial = max(serial, last_serial)
+
+        await self.names.update_remote(
+            [name for name, exists in present.items() if exists],
+            [name for name, exists in present.items() if not exists],
+        )
+        await self.invalidate_projects(present)
+        await self.names.set_meta("serial", str(serial))
+        await self._mark_updated()
+        logger.info(
+            "package.index.synced",
+            source=source_url,
+            changed=len(present),
+            serial=serial,
+        )
+        return True
+
+    async def invalidate_projects(self, package_names: Iterable[str]):
+        """使项目的缓存页面失效
+
+        删除本 worker 内存与磁盘中的页面，并在项目名索引中记录失效时间，
+        其他 worker 取用内存中的页面前会检查该记录。
+        """
+        keys = {normalize_project_name(name) for name in package_names}
+        for key in keys:
+            await self.page_cache.invalidate(key)
+        keep = (
+            self.cache_ttl.total_seconds() + self.settings.index_stale_while_revalidate
+        )
+        await self.names.invalidate(keys, time.time(), keep)
+
+    @staticmethod
+    def changelog_url(source_url: str) -> str:
+        """源站的 XML-RPC 地址（PyPI 为 ``https://pypi.org/pypi``）"""
+        source_url = source_url.rstrip("/")
+        if "/simple" in source_url:
+            source_url = source_url[: source_url.index("/simple")]
+        return f"{source_url}/pypi"
+
     async def list_versions(self, package_name: str) -> List[PackageVersion]:
-        """获取包版本列表"""
-        versions = []
-        package_name = package_name.lower()
+        """获取包版本列表，按版本从新到旧排序（PEP 440）"""
+        versions = await self.get_versions(package_name)
+        return list(versions.files) if versions is not None else []
 
-        # 遍历所有源
-        for source_url in self.sources:
-            try:
-                # 修改这里的URL构造逻辑
-                source_url = source_url.rstrip("/")
-                index_url = (
-                    f"{source_url}/simple/{package_name}/"
-                    if "/simple" not in source_url
-                    else f"{source_url}/{package_name}/"
-                )
-                content = await self.download_client.download(index_url)
-
-                if content:
-                    soup = BeautifulSoup(content, "html.parser")
-                    for link in soup.find_all("a"):
-                        if not link.string:
-                            continue
-
-                        filename = link.string
-                        url = link.get("href", "")
-                        requires_python = link.get("data-requires-python")
-
-                        version = PackageVersion(
-                            version=filename.split("-")[1],
-                            filename=filename,
-                            url=url,
-                            requires_python=requires_python,
-                        )
-                        versions.append(version)
+    async def get_versions(self, package_name: str) -> Optional[ProjectVersions]:
+        """获取按版本分组的文件
 
-                    logger.info(
-                        "package.versions.list.success",
-                        package=package_name,
-                        source=source_url,
-                        count=len(versions),
-                    )
-                    break
+        每个项目页面只解析、排序一次，页面刷新后重新构建。
+        """
+        package_name = normalize_project_name(package_name)
+        page = await self.get_project_page(package_name)
+        if page is None:
+            return None
+
+        versions = self._versions.get(package_name)
+        if versions is None or versions.page is not page:
+            versions = ProjectVersions.from_page(page)
+            self._versions[package_name] = versions
+        self._versions.move_to_end(package_name)
+        while len(self._versions) > self.settings.index_cache_entries:
+            self._versions.popitem(last=False)
+        return versions
+
+    async def get_project_page(self, package_name: str) -> Optional[ProjectPage]:
+        """获取项目页面
+
+        - 缓存未过期时直接返回
+        - 过期不久（stale-while-revalidate）时返回旧页面并在后台刷新
+        - 否则向上游发起条件请求；上游出错或超时则在允许范围内返回旧页面
+        - 任一 worker 同步 changelog 时记录了失效的页面，立即重新验证
+        同一项目的并发刷新只会向上游发起一次请求。
+        """
+        package_name = normalize_project_name(package_name)
+        page = await self.page_cache.get(package_name)
+        if page is None:
+            return await self._page_flights.do(
+                package_name, lambda: self._refresh_page(package_name, None)
+            )
+
+        # 其他 worker 同步 changelog 后页面失效：立即重新验证
+        invalidated_at = await self.names.invalidated_at(package_name)
+        current = invalidated_at is None or page.fetched_at >= invalidated_at
+
+        age = page.age()
+        ttl = self.cache_ttl.total_seconds()
+        if current and age < ttl:
+            return page
+
+        if current and age < ttl + self.settings.index_stale_while_revalidate:
+            self._refresh_in_background(package_name, page)
+            return page
+
+        refresh = self._page_flights.do(
+            package_name, lambda: self._refresh_page(package_name, page)
+        )
+        try:
+            refreshed = await asyncio.wait_for(
+                refresh, timeout=self.settings.index_refresh_timeout
+            )
+        except asyncio.TimeoutError:
+            # 刷新仍在后台继续，完成后更新缓存
+            refreshed = None
+
+        if refreshed is None and age < ttl + self.settings.index_stale_if_error:
+            logger.warning(
+                "package.versions.serve_stale", package=package_name, age=int(age)
+            )
+            return page
+        return refreshed
+
+    def _refresh_in_background(self, package_name: str, page: ProjectPage):
+        """在后台刷新项目页面"""
+        if package_name in self._page_flights:
+            return
+        task = asyncio.ensure_future(
+            self._page_flights.do(
+                package_name, lambda: self._refresh_page(package_name, page)
+            )
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def project_url(source_url: str, package_name: str) -> str:
+        """构造源站上的项目页面地址"""
+        source_url = source_url.rstrip("/")
+        return (
+            f"{source_url}/simple/{package_name}/"
+            if "/simple" not in source_url
+            else f"{source_url}/{package_name}/"
+        )
 
-            except Exception as e:
-                logger.error(
-                    "package.versions.list.failed",
+    async def _refresh_page(
+        self, package_name: str, cached: Optional[ProjectPage]
+    ) -> Optional[ProjectPage]:
+        """从上游刷新项目页面，缓存页面来自同一源时使用条件请求
+
+        按源评分依次尝试，首选源响应慢时对冲请求下一个源。
+        """
+        client = self.download_client
+        page = await client.hedger.run(
+            "pages",
+            client.health.rank(self.sources),
+            lambda source_url: self._fetch_page(source_url, package_name, cached),
+        )
+        if page is None:
+            return None
+        if page is cached:
+            cached.fetched_at = time.time()
+        await self.page_cache.put(page)
+        return page
+
+    async def _fetch_page(
+        self, source_url: str, package_name: str, cached: Optional[ProjectPage]
+    ) -> Optional[ProjectPage]:
+        """从单个源获取项目页面，未变化时返回 ``cached``"""
+        index_url = self.project_url(source_url, package_name)
+        headers = {"Accept": UPSTREAM_ACCEPT}
+        if cached is not None and cached.source == index_url:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            result = await self.download_client.fetch(index_url, headers)
+            if result is None:
+                return None
+
+            if result.not_modified and cached is not None:
+                logger.info(
+                    "package.versions.revalidated",
                     package=package_name,
                     source=source_url,
-                    error=str(e),
                 )
+                return cached
+
+            page = ProjectPage(
+                project=package_name,
+                source=index_url,
+                files=parse_project_response(
+                    result.body, result.headers.get("Content-Type"), result.url
+                ),
+                etag=result.headers.get("ETag"),
+                last_modified=result.headers.get("Last-Modified"),
+                fetched_at=time.time(),
+            )
+            logger.info(
+                "package.versions.list.success",
+                package=package_name,
+                source=source_url,
+                count=len(page.files),
+            )
+            return page
 
-        return sorted(versions, key=lambda v: v.version, reverse=True)
-
-    async def list_packages(self) -> List[str]:
-        """获取所有包名称"""
-        return sorted(self.get_all_packages())
+        except Exception as e:
+            logger.error(
+                "package.versions.list.failed",
+                package=package_name,
+                source=source_url,
+                error=str(e),
+            )
+            return None
+
+    async def list_packages(self, prefix: str = "") -> List[str]:
+        """按名称排序获取包名称，可按前缀过滤"""
+        return await self.names.names(prefix)
+
+
+def _parse_serial(value: Optional[str]) -> Optional[int]:
+    """解析序列号，无效时返回 None"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
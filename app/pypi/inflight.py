@@ -0,0 +1,480 @@
+import asyncio
+import hashlib
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import aiohttp
+
+from app.common.download_client import CHUNK_SIZE, DownloadClient
+from app.common.file_lock import FileLock
+from app.common.logger import logger
+
+from .storage import PackageStorage
+
+# 跟随其他进程的下载时轮询文件的间隔（秒）
+FOREIGN_POLL_INTERVAL = 0.05
+# 分段下载进度文件的格式：连续写入的字节数
+PROGRESS_FORMAT = struct.Struct("<Q")
+
+
+class DownloadIntegrityError(Exception):
+    """下载内容与上游声明的大小或摘要不符"""
+
+
+class InflightDownload:
+    """正在进行的上游下载
+
+    上游数据只下载一次，写入临时文件；任意多个客户端通过 ``tail()``
+    从临时文件中跟随读取。写入时同步计算 sha256，下载结束后校验大小与
+    上游声明的摘要，通过后才登记到内容目录并链接到缓存路径。
+    校验完成前读取方拿不到最后一个字节，损坏或截断的文件不会被客户端当作完整文件。
+
+    分段下载时临时文件预分配完整大小，各段并行写入各自的位置；
+    ``written`` 始终是从头开始连续写入并已计算摘要的字节数，读取方仍按顺序读取。
+    """
+
+    def __init__(
+        self,
+        storage: PackageStorage,
+        temp_path: Path,
+        final_path: Path,
+        size: Optional[int] = None,
+        expected_sha256: Optional[str] = None,
+    ):
+        self.storage = storage
+        self.temp_path = temp_path
+        self.final_path = final_path
+        self.size = size
+        self.expected_sha256 = expected_sha256
+        self.written = 0
+        self.sha256: Optional[str] = None  # 校验并登记完成后的摘要
+        # 校验通过、开始登记时的摘要；此后临时文件随时可能被移走
+        self._verified: Optional[str] = None
+        self.duplicate = False  # 内容是否与已缓存的文件相同
+        self._digest = hashlib.sha256()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._progress = asyncio.Condition()
+        # 分段下载的状态：各段的 (起始, 结束) 与当前写入位置
+        self._segments: List[Tuple[int, int]] = []
+        self._positions: List[int] = []
+        self._hashed = 0
+        self._hashing = False  # 是否有线程正在计算摘要
+        self._segment_lock = threading.Lock()
+        self._progress_fd: Optional[int] = None
+        # 先创建临时文件，保证读取方随时都能打开
+        self._file = open(temp_path, "w+b")
+
+    async def run(
+        self,
+        response: aiohttp.ClientResponse,
+        on_complete: Optional[Callable[[], Awaitable[None]]] = None,
+        segments: Sequence[int] = (),
+        open_segment: Optional[Callable[[int, int], Awaitable[Any]]] = None,
+    ):
+        """从上游读取数据并写入临时文件
+
+        Args:
+            on_complete: 重命名完成后、通知读取方结束之前执行的回调
+            segments: 分段下载时其余各段的起始位置（需要已知大小）
+            open_segment: 打开 ``[start, end)`` 的一段，失败返回 None
+        """
+        try:
+            if segments and open_segment is not None and self.size:
+                await self._download_segments(response, segments, open_segment)
+            else:
+                async for chunk in DownloadClient.iter_chunks(response):
+                    await self.storage.run(self._append, chunk)
+                    self.written += len(chunk)
+                    await self._notify()
+
+            sha256 = self._verify()
+            self._verified = sha256
+            self.duplicate = await self.storage.run(self._commit, sha256)
+            self.sha256 = sha256
+            if on_complete is not None:
+                await on_complete()
+            logger.info(
+                "package.cache.saved",
+                path=str(self.final_path),
+                size=self.written,
+                sha256=sha256,
+                duplicate=self.duplicate,
+            )
+        except BaseException as e:
+            # 清理在事件循环中同步完成，保证任务被取消时也能执行
+            self.error = e
+            self._file.close()
+            self.temp_path.unlink(missing_ok=True)
+            self._close_progress()
+            logger.warning(
+                "package.cache.discarded", path=str(self.final_path), error=str(e)
+            )
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            response.release()
+            self.done = True
+            await self._notify()
+
+    async def _download_segments(
+        self,
+        response,
+        starts: Sequence[int],
+        open_segment: Callable[[int, int], Awaitable[Any]],
+    ):
+        """分段并行下载
+
+        首段沿用已打开的完整响应，其余各段并发发起只覆盖本段的范围请求；
+        打开失败的段由前一段继续读取，全部失败时退化为单连接下载。
+        """
+        planned_ends = list(starts[1:]) + [self.size]
+        opened = await asyncio.gather(
+            *(open_segment(start, end) for start, end in zip(starts, planned_ends)),
+            return_exceptions=True,
+        )
+        active = [(0, response)]
+        for start, segment in zip(starts, opened):
+            if segment is None or isinstance(segment, BaseException):
+                logger.warning(
+                    "package.download.segment.unavailable",
+                    path=str(self.final_path),
+                    start=start,
+                )
+                continue
+            active.append((start, segment))
+
+        ends = [start for start, _ in active[1:]] + [self.size]
+        self._segments = [(start, end) for (start, _), end in zip(active, ends)]
+        self._positions = [start for start, _ in active]
+        logger.info(
+            "package.download.segmented",
+            path=str(self.final_path),
+            size=self.size,
+            segments=len(active),
+        )
+        tasks: List[asyncio.Future] = []
+        try:
+            await self.storage.run(self._preallocate)
+            tasks = [
+                asyncio.ensure_future(self._read_segment(index, segment, open_segment))
+                for index, (_, segment) in enumerate(active)
+            ]
+            # 任一段失败时取消其余各段
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for _, segment in active[1:]:
+                segment.release()
+
+    async def _read_segment(
+        self,
+        index: int,
+        response,
+        open_segment: Callable[[int, int], Awaitable[Any]],
+    ):
+        """读取一段并写入对应位置，到达段尾即停止
+
+        相邻的段打开失败时本段要继续读取它的范围：本段的范围请求读完后，
+        为剩余部分发起新的范围请求。
+        """
+        start, end = self._segments[index]
+        position = start
+        continuation = None
+        try:
+            while True:
+                chunks = DownloadClient.iter_chunks(response)
+                try:
+                    async for chunk in chunks:
+                        if position + len(chunk) > end:
+                            chunk = chunk[: end - position]
+                        written = await self.storage.run(
+                            self._write_segment, index, position, chunk
+                        )
+                        position += len(chunk)
+                        if written > self.written:
+                            self.written = written
+                            await self._notify()
+                        if position >= end:
+                            return
+                finally:
+                    await chunks.aclose()
+
+                # 首段是完整响应，续读的请求只覆盖剩余部分，提前结束说明传输不完整
+                if index == 0 or continuation is not None:
+                    break
+                continuation = response = await open_segment(position, end)
+                if response is None:
+                    break
+        finally:
+            if continuation is not None:
+                continuation.release()
+        raise DownloadIntegrityError(
+            f"Truncated segment: {position - start} of {end - start} bytes"
+        )
+
+    def _preallocate(self):
+        """预分配临时文件并创建进度文件"""
+        fd = self._file.fileno()
+        try:
+            os.posix_fallocate(fd, 0, self.size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, self.size)
+        self._progress_fd = os.open(
+            self.storage.progress_path(self.temp_path),
+            os.O_RDWR | os.O_CREAT | os.O_TRUNC,
+            0o644,
+        )
+        os.pwrite(self._progress_fd, PROGRESS_FORMAT.pack(0), 0)
+
+    def _write_segment(self, index: int, offset: int, chunk: bytes) -> int:
+        """写入一段数据并推进连续写入的位置，返回已计算摘要的连续位置
+
+        摘要必须按顺序计算：同一时刻只有一个线程负责，在锁外把已连续、
+        尚未计算摘要的部分读回计算，其他段的写入不必等待。
+        """
+        fd = self._file.fileno()
+        os.pwrite(fd, chunk, offset)
+        with self._segment_lock:
+            self._positions[index] = offset + len(chunk)
+            contiguous = self._contiguous()
+            if self._hashing or self._hashed >= contiguous:
+                return self._hashed
+            self._hashing = True
+            hashed = self._hashed
+
+        # 刚写入的数据正好接在已计算的位置之后时直接使用，不必读回
+        if offset == hashed:
+            self._digest.update(chunk)
+            hashed += len(chunk)
+        while True:
+            # 之前由后续段写入、现在变为连续的部分从文件读回计算摘要
+            while hashed < contiguous:
+                data = os.pread(fd, min(CHUNK_SIZE * 4, contiguous - hashed), hashed)
+                self._digest.update(data)
+                hashed += len(data)
+            os.pwrite(self._progress_fd, PROGRESS_FORMAT.pack(hashed), 0)
+            with self._segment_lock:
+                self._hashed = hashed
+                contiguous = self._contiguous()
+                if hashed >= contiguous:
+                    self._hashing = False
+                    return hashed
+
+    def _contiguous(self) -> int:
+        """从文件开头连续写入的字节数"""
+        contiguous = 0
+        for (start, end), position in zip(self._segments, self._positions):
+            if contiguous < start:
+                break
+            contiguous = position
+            if position < end:
+                break
+        return contiguous
+
+    def _close_progress(self):
+        if self._progress_fd is not None:
+            os.close(self._progress_fd)
+            self._progress_fd = None
+            self.storage.progress_path(self.temp_path).unlink(missing_ok=True)
+
+    def _append(self, chunk: bytes):
+        """写入一块数据并刷新，使读取方立即可见；同时计算摘要"""
+        self._file.write(chunk)
+        self._file.flush()
+        self._digest.update(chunk)
+
+    def _verify(self) -> str:
+        """校验大小与摘要，返回实际摘要"""
+        if self.size is not None and self.written != self.size:
+            raise DownloadIntegrityError(
+                f"Truncated download: {self.written} of {self.size} bytes"
+            )
+        sha256 = self._digest.hexdigest()
+        if self.expected_sha256 and sha256 != self.expected_sha256.lower():
+            raise DownloadIntegrityError(
+                f"sha256 mismatch: expected {self.expected_sha256}, got {sha256}"
+            )
+        return sha256
+
+    def _commit(self, sha256: str) -> bool:
+        """fsync 并关闭临时文件，登记内容并链接到缓存路径"""
+        os.fsync(self._file.fileno())
+        self._file.close()
+        duplicate = self.storage.commit(self.temp_path, self.final_path, sha256)
+        self._close_progress()
+        return duplicate
+
+    async def _notify(self):
+        """唤醒等待新数据的读取方"""
+        async with self._progress:
+            self._progress.notify_all()
+
+    def _open_reader(self):
+        """打开临时文件；已开始登记时依次尝试最终文件与内容文件"""
+        try:
+            return open(self.temp_path, "rb")
+        except FileNotFoundError as e:
+            if self._verified is not None:
+                # 登记过程中临时文件先成为内容文件，再链接到最终路径
+                for path in (self.final_path, self.storage.blob_path(self._verified)):
+                    try:
+                        return open(path, "rb")
+                    except FileNotFoundError:
+                        continue
+            if self.error is not None:
+                raise RuntimeError(
+                    f"Upstream download failed: {self.final_path.name}"
+                ) from self.error
+            raise e
+
+    @property
+    def _readable(self) -> int:
+        """读取方可以读到的位置：成功结束前保留最后一个字节"""
+        if self.done and self.error is None:
+            return self.written
+        return self.written - 1
+
+    async def tail(self) -> AsyncIterator[bytes]:
+        """跟随下载进度读取文件内容"""
+        file = await self.storage.run(self._open_reader)
+        offset = 0
+        try:
+            while True:
+                if offset < self._readable:
+                    size = min(CHUNK_SIZE, self._readable - offset)
+                    chunk = await self.storage.pread(file.fileno(), size, offset)
+                    offset += len(chunk)
+                    yield chunk
+                    continue
+
+                if self.done:
+                    if self.error is not None:
+                        raise RuntimeError(
+                            f"Upstream download failed: {self.final_path.name}"
+                        ) from self.error
+                    return
+
+                async with self._progress:
+                    if offset >= self._readable and not self.done:
+                        await self._progress.wait()
+        finally:
+            file.close()
+
+
+class ForeignDownload:
+    """由其他进程（worker）进行中的下载
+
+    通过锁文件找到对方的临时文件并轮询读取。对方校验并登记完成后，
+    最终文件与已打开的临时文件是同一个 inode（内容重复时则是已有内容，
+    此时以对方释放锁且大小一致为准），读到末尾即结束；在此之前保留最后一个字节。
+    对方分段下载时临时文件已预分配完整大小，可读位置以进度文件为准。
+    """
+
+    def __init__(self, storage: PackageStorage, lock: FileLock, final_path: Path):
+        self.storage = storage
+        self.lock = lock
+        self.final_path = final_path
+        claim = storage.read_claim(lock)
+        self.size = claim.size if claim else None
+        self._progress_path: Optional[Path] = None
+
+    def _open_temp(self):
+        """打开对方登记的临时文件，尚未登记时返回 None"""
+        claim = self.storage.read_claim(self.lock)
+        if claim is None:
+            return None
+        try:
+            file = open(claim.temp_path, "rb")
+        except FileNotFoundError:
+            return None
+        self._progress_path = claim.progress_path
+        return file
+
+    def _available(self, file_size: int) -> int:
+        """对方已连续写入的字节数"""
+        if self._progress_path is None:
+            return file_size
+        try:
+            with open(self._progress_path, "rb") as f:
+                data = f.read(PROGRESS_FORMAT.size)
+        except FileNotFoundError:
+            return 0
+        if len(data) < PROGRESS_FORMAT.size:
+            return 0
+        return min(PROGRESS_FORMAT.unpack(data)[0], file_size)
+
+    def _read(self, file, offset: int, owner_done: bool) -> Tuple[bytes, bool]:
+        """读取下一块数据，返回数据和对方是否已成功完成"""
+        fd_stat = os.fstat(file.fileno())
+        try:
+            final_stat = os.stat(self.final_path)
+        except FileNotFoundError:
+            final_stat = None
+        finished = final_stat is not None and (
+            final_stat.st_ino == fd_stat.st_ino
+            or (owner_done and final_stat.st_size == fd_stat.st_size)
+        )
+        limit = fd_stat.st_size if finished else self._available(fd_stat.st_size) - 1
+        if offset >= limit:
+            return b"", finished
+        return os.pread(
+            file.fileno(), min(CHUNK_SIZE, limit - offset), offset
+        ), finished
+
+    async def tail(self) -> AsyncIterator[bytes]:
+        """跟随对方的下载进度读取文件内容"""
+        file = None
+        offset = 0
+        owner_done = False
+        try:
+            while file is None:
+                file = await self.storage.run(self._open_temp)
+                if file is not None:
+                    break
+                if not self.lock.is_held_elsewhere():
+                    # 对方已结束：成功则直接读取最终文件
+                    if not await self.storage.exists(self.final_path):
+                        raise RuntimeError(
+                            f"Upstream download failed: {self.final_path.name}"
+                        )
+                    file = await self.storage.run(open, self.final_path, "rb")
+                    owner_done = True
+                    break
+                await asyncio.sleep(FOREIGN_POLL_INTERVAL)
+
+            while True:
+                chunk, finished = await self.storage.run(
+                    self._read, file, offset, owner_done
+                )
+                if chunk:
+                    offset += len(chunk)
+                    yield chunk
+                    continue
+                if finished:
+                    return
+                if owner_done:
+                    raise RuntimeError(
+                        f"Upstream download failed: {self.final_path.name}"
+                    )
+                # 对方释放锁后再读一次，确认是否已成功登记
+                owner_done = not self.lock.is_held_elsewhere()
+                if not owner_done:
+                    await asyncio.sleep(FOREIGN_POLL_INTERVAL)
+        finally:
+            if file is not None:
+                file.close()
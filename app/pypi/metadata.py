@@ -0,0 +1,41 @@
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+# PEP 658 元数据文件后缀：<wheel 文件名>.metadata
+METADATA_SUFFIX = ".metadata"
+
+
+def metadata_path(package_path: Path) -> Path:
+    """wheel 元数据文件的缓存路径（与 wheel 放在同一目录）"""
+    return package_path.with_name(package_path.name + METADATA_SUFFIX)
+
+
+def extract_wheel_metadata(path: Path, filename: str) -> Optional[bytes]:
+    """从 wheel 中读取 ``*.dist-info/METADATA``，原样返回
+
+    只读取 zip 中央目录和这一个成员，不解压其他文件。
+    有多个 dist-info 目录时选择与 wheel 文件名中的包名、版本对应的那个；
+    ``filename`` 为原始的 wheel 文件名，缓存路径中的文件名已被标准化
+    （``_`` 替换为 ``-``），无法据此拆分包名与版本。
+    """
+    try:
+        with zipfile.ZipFile(path) as wheel:
+            candidates = [
+                name
+                for name in wheel.namelist()
+                if name.count("/") == 1 and name.endswith(".dist-info/METADATA")
+            ]
+            if not candidates:
+                return None
+            if len(candidates) > 1:
+                name, version = filename.split("-")[:2]
+                prefix = f"{name}-{version}.dist-info/".replace("-", "_").lower()
+                candidates = [
+                    candidate
+                    for candidate in candidates
+                    if candidate.replace("-", "_").lower() == prefix + "metadata"
+                ] or candidates
+            return wheel.read(candidates[0])
+    except (zipfile.BadZipFile, OSError, ValueError):
+        return None
@@ -0,0 +1,327 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from app.common.io_pool import IOPool, io_pool
+from app.common.logger import logger
+
+# 项目名索引数据库文件名（位于索引目录）
+NAME_INDEX_NAME = "projects.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    is_local INTEGER NOT NULL DEFAULT 0,
+    is_remote INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS invalidations (
+    name TEXT PRIMARY KEY,
+    invalidated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 比任何合法字符都大，用于前缀查询的上界
+_MAX_CHAR = "\U0010ffff"
+
+# 索引内容每次变化时递增的版本号，用于判断渲染好的根索引是否过期
+_BUMP_GENERATION = (
+    "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+    "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+)
+
+
+class ProjectNameIndex:
+    """项目名索引（SQLite）
+
+    按名称排序存储本地与上游的项目名，成员判断与前缀查询都走主键索引，
+    不需要把全部名称加载到内存。启动时只打开数据库；本地项目的增删是单行更新，
+    上游列表更新时只写入发生变化的行。多个 worker 共用同一个数据库（WAL 模式）。
+    所有数据库操作都在文件 I/O 线程池中执行。
+    """
+
+    def __init__(self, path: Path, pool: IOPool = io_pool):
+        self.path = path
+        self.pool = pool
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _write(self, statements: List[Tuple[str, tuple]]):
+        """在一个事务中执行写入并递增版本号"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+                conn.execute(_BUMP_GENERATION)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def open(self):
+        """打开数据库并建表"""
+        await self.pool.run(self._connect)
+
+    async def close(self):
+        """关闭数据库连接"""
+        await self.pool.run(self._close)
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def contains(self, name: str) -> bool:
+        """是否存在该项目"""
+        rows = await self.pool.run(
+            self._execute, "SELECT 1 FROM projects WHERE name = ?", (name,)
+        )
+        return bool(rows)
+
+    async def names(
+        self, prefix: str = "", after: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[str]:
+        """按名称排序列出项目
+
+        Args:
+            prefix: 只列出以此开头的项目
+            after: 只列出排在此名称之后的项目（分页游标）
+            limit: 最多返回的数量
+        """
+        sql = "SELECT name FROM projects WHERE name >= ?"
+        params: tuple = (prefix,)
+        if prefix:
+            sql += " AND name < ?"
+            params += (prefix + _MAX_CHAR,)
+        if after is not None:
+            sql += " AND name > ?"
+            params += (after,)
+        sql += " ORDER BY name"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        rows = await self.pool.run(self._execute, sql, params)
+        return [row[0] for row in rows]
+
+    async def generation(self) -> int:
+        """索引内容的版本号，每次写入后递增"""
+        value = await self.get_meta("generation")
+        return int(value) if value else 0
+
+    async def count(self) -> int:
+        """项目总数"""
+        rows = await self.pool.run(self._execute, "SELECT COUNT(*) FROM projects")
+        return rows[0][0]
+
+    async def counts(self) -> Tuple[int, int]:
+        """(本地项目数, 上游项目数)"""
+        rows = await self.pool.run(
+            self._execute,
+            "SELECT COALESCE(SUM(is_local), 0), COALESCE(SUM(is_remote), 0) "
+            "FROM projects",
+        )
+        return rows[0]
+
+    async def add_local(self, name: str):
+        """登记本地项目"""
+        await self.pool.run(
+            self._write,
+            [
+                (
+                    "INSERT INTO projects (name, is_local) VALUES (?, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET is_local = 1",
+                    (name,),
+                )
+            ],
+        )
+
+    async def remove_local(self, name: str):
+        """移除本地项目，上游也没有时删除整行"""
+        await self.pool.run(
+            self._write,
+            [
+                ("UPDATE projects SET is_local = 0 WHERE name = ?", (name,)),
+                ("DELETE FROM projects WHERE name = ? AND is_remote = 0", (name,)),
+            ],
+        )
+
+    async def replace_remote(self, names: Iterable[str]) -> Tuple[int, int]:
+        """用完整的上游列表替换上游项目，返回 (新增数, 移除数)"""
+        return await self.pool.run(self.replace_remote_sync, sorted(names))
+
+    def replace_remote_sync(self, names: List[str]) -> Tuple[int, int]:
+        """先写入临时表再与现有记录比对，只修改发生变化的行（名称按序写入更快）"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS incoming "
+                "(name TEXT PRIMARY KEY) WITHOUT ROWID"
+            )
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM incoming")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO incoming (name) VALUES (?)",
+                    ((name,) for name in names),
+                )
+                removed = conn.execute(
+                    "UPDATE projects SET is_remote = 0 WHERE is_remote = 1 "
+                    "AND name NOT IN (SELECT name FROM incoming)"
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM projects WHERE is_local = 0 AND is_remote = 0"
+                )
+                added = conn.execute(
+                    "INSERT INTO projects (name, is_remote) "
+                    "SELECT name, 1 FROM incoming WHERE true "
+                    "ON CONFLICT (name) DO UPDATE SET is_remote = 1 "
+                    "WHERE is_remote = 0"
+                ).rowcount
+                conn.execute("DELETE FROM incoming")
+                if added or removed:
+                    conn.execute(_BUMP_GENERATION)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return added, removed
+
+    async def update_remote(self, added: Iterable[str], removed: Iterable[str]):
+        """增量更新上游项目：登记 ``added``，移除 ``removed``"""
+        await self.pool.run(self._update_remote, list(added), list(removed))
+
+    def _update_remote(self, added: List[str], removed: List[str]):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO projects (name, is_remote) VALUES (?, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET is_remote = 1",
+                    ((name,) for name in added),
+                )
+                conn.executemany(
+                    "UPDATE projects SET is_remote = 0 WHERE name = ?",
+                    ((name,) for name in removed),
+                )
+                conn.executemany(
+                    "DELETE FROM projects WHERE name = ? AND is_local = 0",
+                    ((name,) for name in removed),
+                )
+                if added or removed:
+                    conn.execute(_BUMP_GENERATION)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def invalidate(self, names: Iterable[str], at: float, keep: float):
+        """记录项目页面在 ``at`` 时刻失效，并删除 ``keep`` 秒之前的记录
+
+        各 worker 在内存中缓存项目页面，同步 changelog 的 worker 通过该记录
+        通知其他 worker：在此之前获取的页面都需要重新验证。
+        """
+        await self.pool.run(self._invalidate, list(names), at, at - keep)
+
+    def _invalidate(self, names: List[str], at: float, expired: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO invalidations (name, invalidated_at) "
+                    "VALUES (?, ?)",
+                    ((name, at) for name in names),
+                )
+                conn.execute(
+                    "DELETE FROM invalidations WHERE invalidated_at < ?", (expired,)
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def invalidated_at(self, name: str) -> Optional[float]:
+        """项目页面最近一次失效的时间，没有记录时返回 None"""
+        rows = await self.pool.run(
+            self._execute,
+            "SELECT invalidated_at FROM invalidations WHERE name = ?",
+            (name,),
+        )
+        return rows[0][0] if rows else None
+
+    async def get_meta(self, key: str) -> Optional[str]:
+        rows = await self.pool.run(
+            self._execute, "SELECT value FROM meta WHERE key = ?", (key,)
+        )
+        return rows[0][0] if rows else None
+
+    async def set_meta(self, key: str, value: Optional[str]):
+        await self.pool.run(
+            self._execute,
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, value),
+        )
+
+    async def clear(self):
+        """清空索引（保留版本号）"""
+        await self.pool.run(
+            self._write,
+            [
+                ("DELETE FROM projects", ()),
+                ("DELETE FROM invalidations", ()),
+                ("DELETE FROM meta WHERE key != 'generation'", ()),
+            ],
+        )
+
+    async def import_json(self, json_path: Path) -> Optional[str]:
+        """导入旧版本的 ``package_index.json`` 并删除该文件
+
+        Returns:
+            文件中记录的最后更新时间；文件不存在时返回 None
+        """
+        return await self.pool.run(self._import_json, json_path)
+
+    def _import_json(self, json_path: Path) -> Optional[str]:
+        try:
+            with open(json_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        self.replace_remote_sync(sorted(data.get("remote_packages", [])))
+        self._write(
+            [
+                (
+                    "INSERT INTO projects (name, is_local) VALUES (?, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET is_local = 1",
+                    (name,),
+                )
+                for name in data.get("local_packages", [])
+            ]
+        )
+        json_path.unlink()
+        logger.info("package.index.imported", path=str(json_path))
+        return data.get("last_update")
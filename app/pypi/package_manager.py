@@ -1,16 +1,46 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import (
+    AsyncIterator,
+    Collection,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib.parse import quote
 
-from bs4 import BeautifulSoup
+import aiohttp
 from fastapi import HTTPException
 
-from app.common.download_client import DownloadClient
+from app.common.download_client import DownloadClient, ResumableResponse
+from app.common.file_lock import FileLock
 from app.common.logger import logger
 from app.common.proxy_manager import ProxyManager
+from app.common.singleflight import SingleFlight
 from app.settings import settings
 
+from .catalog import ArtifactRecord, PackageCatalog
+from .eviction import CacheEvictor
+from .index_manager import PyPIIndexManager
+from .page_cache import ProjectFile
+from .inflight import ForeignDownload, InflightDownload
+from .metadata import METADATA_SUFFIX, extract_wheel_metadata, metadata_path
+from .simple_parser import (
+    UPSTREAM_ACCEPT,
+    normalize_project_name,
+    parse_project_response,
+)
+from .storage import PackageStorage
+
 
 def normalize_package_name(package_name: str) -> str:
     """标准化包名"""
@@ -36,18 +66,45 @@ def normalize_filename(filename: str) -> str:
     return quote(normalized)
 
 
+@dataclass
+class PackageStream:
+    """边下载边缓存的包文件流"""
+
+    chunks: AsyncIterator[bytes]
+    size: Optional[int] = None
+
+
 class PackageManager:
     """包文件管理器"""
 
-    def __init__(self):
-        """初始化包管理器"""
+    def __init__(
+        self,
+        download_client: Optional[DownloadClient] = None,
+        index_manager: Optional[PyPIIndexManager] = None,
+    ):
+        """初始化包管理器
+
+        Args:
+            download_client: 共享的下载客户端，未提供时自行创建
+            index_manager: 索引管理器，用于从缓存的项目页面定位文件
+        """
         self.settings = settings.pypi
         self.storage_path = Path(self.settings.packages_path)
-        self.download_client = DownloadClient(ProxyManager())
+        self.download_client = download_client or DownloadClient(ProxyManager())
+        self.index_manager = index_manager
         self.sources = self.settings.sources
+        # 进行中的下载，按 (包名, 文件名) 合并并发请求
+        self._inflight: Dict[Tuple[str, str], InflightDownload] = {}
+        self._download_flights: SingleFlight[
+            Union[Path, InflightDownload, ForeignDownload, None]
+        ] = SingleFlight()
+        self._download_tasks: Set[asyncio.Task] = set()
 
         # 确保存储目录存在
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.storage = PackageStorage(self.storage_path)
+        self.catalog = PackageCatalog(self.storage)
+        self.evictor = CacheEvictor(self.storage, self.catalog, settings.cache)
 
     def normalize_package_name(self, package_name: str) -> str:
         """标准化包名"""
@@ -76,193 +133,523 @@ class PackageManager:
         try:
             content = await self.download_client.download(url)
             if content:
-                # 确保目录存在
-                save_path.parent.mkdir(parents=True, exist_ok=True)
-                # 保存文件
-                save_path.write_bytes(content)
+                sha256 = await self.storage.write_bytes(save_path, content)
+                await self._record_artifact(save_path, len(content), sha256, url)
                 logger.info("package.download.success", url=url, path=str(save_path))
                 return content
         except Exception as e:
             logger.error("package.download.failed", url=url, error=str(e))
         return None
 
-    def get_package_file(
+    async def get_package_file(
         self, package_name: str, version: str, filename: str
     ) -> Optional[bytes]:
         """获取本地包文件内容"""
         file_path = self.get_package_path(package_name, version, filename)
-        if file_path.exists():
-            return file_path.read_bytes()
-        return None
+        return await self.storage.read_bytes(file_path)
 
-    def save_package_file(
+    async def save_package_file(
         self, package_name: str, version: str, filename: str, content: bytes
     ):
         """保存包文件到本地"""
         file_path = self.get_package_path(package_name, version, filename)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(content)
+        sha256 = await self.storage.write_bytes(file_path, content)
+        await self._record_artifact(file_path, len(content), sha256)
+
+    async def _record_artifact(
+        self,
+        path: Path,
+        size: int,
+        sha256: Optional[str],
+        source_url: Optional[str] = None,
+    ):
+        """在目录中登记新写入的文件，并检查缓存限制"""
+        relative = self.catalog.relative(path)
+        project, version, filename = relative.split("/", 2)
+        now = time.time()
+        await self.catalog.put(
+            ArtifactRecord(
+                project=project,
+                filename=filename,
+                version=version,
+                path=relative,
+                size=size,
+                sha256=sha256,
+                source_url=source_url,
+                fetched_at=now,
+                last_access=now,
+            )
+        )
+        self.evictor.record(path, size, sha256)
+        self.evictor.schedule(protect={path})
 
-    def delete_package(self, package_name: str, version: str) -> bool:
+    async def _discard_artifact(
+        self, path: Path, record: ArtifactRecord, missing: bool = False
+    ):
+        """删除校验失败或已不存在的缓存文件及其记录，随后按未命中重新下载"""
+        if missing:
+            logger.info("package.cache.missing", path=str(path))
+        else:
+            logger.warning(
+                "package.cache.invalid", path=str(path), expected_size=record.size
+            )
+        await self.catalog.delete_paths([record.path])
+        self.evictor.forget(path)
+        await self.storage.run(self.storage.remove, path, record.sha256)
+
+    async def delete_package(self, package_name: str, version: str) -> bool:
         """删除包文件"""
-        package_dir = (
-            self.storage_path / self.normalize_package_name(package_name) / version
+        project = self.normalize_package_name(package_name)
+        package_dir = self.storage_path / project / version
+        try:
+            records = await self.catalog.list_files(project, version)
+            deleted = await self.storage.run(self._delete_version_dir, package_dir)
+        except Exception as e:
+            logger.error(
+                "package.delete.failed",
+                package=package_name,
+                version=version,
+                error=str(e),
+            )
+            return False
+        if deleted is None:
+            return False
+        await self.catalog.delete_version(project, version)
+        for path in deleted:
+            self.evictor.forget(path)
+        # 删除不再被引用的内容
+        for record in records:
+            await self.storage.run(
+                self.storage.remove, self.storage_path / record.path, record.sha256
+            )
+        return True
+
+    @staticmethod
+    def _delete_version_dir(package_dir: Path) -> Optional[List[Path]]:
+        if not package_dir.exists():
+            return None
+        deleted = []
+        for file in package_dir.iterdir():
+            file.unlink()
+            deleted.append(file)
+        package_dir.rmdir()
+        # 如果版本目录是空的,删除包目录
+        version_dir = package_dir.parent
+        if not any(version_dir.iterdir()):
+            version_dir.rmdir()
+        return deleted
+
+    async def get_package_info(self, package_name: str, version: str) -> dict:
+        """获取包文件信息"""
+        record = await self.catalog.get(
+            self.normalize_package_name(package_name),
+            self.normalize_filename(f"{package_name}-{version}.tar.gz"),
+        )
+        if record is None:
+            return {}
+        return {
+            "size": record.size,
+            "sha256": record.sha256,
+            "source_url": record.source_url,
+            "hits": record.hits,
+            "created_time": datetime.fromtimestamp(record.fetched_at),
+            "modified_time": datetime.fromtimestamp(record.fetched_at),
+            "last_access": datetime.fromtimestamp(record.last_access),
+        }
+
+    async def list_versions(self, package_name: str) -> list[str]:
+        """列出包的所有已缓存版本"""
+        return await self.catalog.list_versions(
+            self.normalize_package_name(package_name)
         )
-        if package_dir.exists():
-            try:
-                for file in package_dir.iterdir():
-                    file.unlink()
-                package_dir.rmdir()
-                # 如果版本目录是空的,删除包目录
-                version_dir = package_dir.parent
-                if not any(version_dir.iterdir()):
-                    version_dir.rmdir()
-                return True
-            except Exception as e:
-                logger.error(
-                    "package.delete.failed",
-                    package=package_name,
-                    version=version,
-                    error=str(e),
-                )
-        return False
 
-    def get_package_info(self, package_name: str, version: str) -> dict:
-        """获取包文件信息"""
-        file_path = self.get_package_path(
-            package_name, version, f"{package_name}-{version}.tar.gz"
+    async def cleanup_old_files(self, max_age_days: Optional[int] = None) -> int:
+        """清理超过保存时间未访问的包文件"""
+        return await self.evictor.expire(max_age_days)
+
+    async def cached_filenames(self, package_name: str) -> Set[str]:
+        """项目已缓存的文件名（标准化后）"""
+        return set(
+            await self.catalog.list_filenames(self.normalize_package_name(package_name))
         )
-        if file_path.exists():
-            return {
-                "size": file_path.stat().st_size,
-                "created_time": datetime.fromtimestamp(file_path.stat().st_ctime),
-                "modified_time": datetime.fromtimestamp(file_path.stat().st_mtime),
-            }
-        return {}
-
-    def list_versions(self, package_name: str) -> list[str]:
-        """列出包的所有版本"""
-        package_dir = self.storage_path / self.normalize_package_name(package_name)
-        if package_dir.exists():
-            return [d.name for d in package_dir.iterdir() if d.is_dir()]
-        return []
-
-    def cleanup_old_files(self, max_age_days: int = 30):
-        """清理过期的包文件"""
-        now = datetime.now()
-        for package_dir in self.storage_path.iterdir():
-            if not package_dir.is_dir():
-                continue
 
-            for version_dir in package_dir.iterdir():
-                if not version_dir.is_dir():
-                    continue
+    async def get_metadata(
+        self, package_name: str, version: str, filename: str
+    ) -> Union[Path, bytes, None]:
+        """获取 wheel 的核心元数据（PEP 658）
+
+        wheel 已缓存时从中提取一次并保存在 wheel 旁边，之后直接返回该文件；
+        否则转发上游声明的 ``.metadata`` 文件（不缓存）。都不可用时返回 None。
+        """
+        package_path = self.get_package_path(package_name, version, filename)
+        record = None
+        if filename.endswith(".whl"):
+            record = await self.catalog.get(
+                self.normalize_package_name(package_name),
+                self.normalize_filename(filename),
+            )
+            if record is not None:
+                # 与 _lookup_cached 一致，使用目录中登记的路径
+                package_path = self.storage_path / record.path
+
+        cached_metadata = metadata_path(package_path)
+        if await self.storage.exists(cached_metadata):
+            return cached_metadata
+
+        if record is not None and await self.storage.run(
+            self.storage.verify, package_path, record.size, record.sha256
+        ):
+            content = await self.storage.run(
+                extract_wheel_metadata, package_path, filename
+            )
+            if content is not None:
+                await self.storage.run(
+                    self.storage.write_file, cached_metadata, content
+                )
+                logger.info("package.metadata.extracted", path=str(package_path))
+                return cached_metadata
 
-                for file_path in version_dir.iterdir():
-                    if not file_path.is_file():
-                        continue
-
-                    file_age = now - datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if file_age.days > max_age_days:
-                        try:
-                            file_path.unlink()
-                            logger.info("package.cleanup.deleted", path=str(file_path))
-                        except Exception as e:
-                            logger.error(
-                                "package.cleanup.failed",
-                                path=str(file_path),
-                                error=str(e),
-                            )
+        return await self._fetch_upstream_metadata(package_name, filename)
+
+    async def _fetch_upstream_metadata(
+        self, package_name: str, filename: str
+    ) -> Optional[bytes]:
+        """从上游获取项目页面中声明的元数据文件，并校验摘要"""
+        if self.index_manager is None:
+            return None
+        page = await self.index_manager.get_project_page(package_name)
+        file = page.find(filename) if page is not None else None
+        if file is None or file.core_metadata is None:
+            return None
+
+        result = await self.download_client.fetch(file.url + METADATA_SUFFIX)
+        if result is None or result.not_modified:
+            return None
+        expected = file.core_metadata.get("sha256")
+        if expected and hashlib.sha256(result.body).hexdigest() != expected:
+            logger.warning(
+                "package.metadata.hash_mismatch", url=result.url, expected=expected
+            )
+            return None
+        return result.body
 
     async def get_package(
         self, package_name: str, version: str, filename: str
-    ) -> bytes:
-        """获取包文件内容"""
+    ) -> Union[Path, PackageStream]:
+        """获取包文件
+
+        命中缓存时返回本地文件路径；未命中时返回边下载边写入缓存的流。
+        同一文件的并发未命中只触发一次上游下载，所有请求共享同一份数据。
+        """
         normalized_name = self.normalize_package_name(package_name)
         normalized_filename = self.normalize_filename(filename)
         package_path = (
             self.storage_path / normalized_name / version / normalized_filename
         )
-
-        # 检查本地缓存
-        if package_path.exists():
-            return package_path.read_bytes()
-
-        # 从远程源下载
-        content = await self._download_from_sources(package_name, version, filename)
-        if content:
-            # 保存到本地缓存
-            package_path.parent.mkdir(parents=True, exist_ok=True)
-            package_path.write_bytes(content)
-            return content
+        key = (normalized_name, normalized_filename)
+
+        # 已有进行中的下载时直接跟随读取
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            cached = await self._lookup_cached(key, package_path)
+            if cached is not None:
+                return cached
+
+            # 从远程源下载
+            inflight = await self._download_flights.do(
+                key,
+                lambda: self._start_download(
+                    key, package_name, version, filename, package_path
+                ),
+            )
+            if isinstance(inflight, Path):
+                return inflight
+
+        if inflight is not None:
+            return PackageStream(chunks=inflight.tail(), size=inflight.size)
 
         raise HTTPException(
             status_code=404,
             detail=f"Package {package_name} version {version} not found",
         )
 
-    async def _download_from_sources(
+    async def get_cached_package(
         self, package_name: str, version: str, filename: str
-    ) -> Optional[bytes]:
-        """从源站下载包文件"""
+    ) -> Optional[Path]:
+        """只查找已完整缓存的文件，不触发下载
+
+        用于 HEAD 与范围请求（如 pip/uv 读取 wheel 元数据的探测），
+        不计为缓存命中，也不影响淘汰优先级。
+        """
+        normalized_name = self.normalize_package_name(package_name)
+        normalized_filename = self.normalize_filename(filename)
+        package_path = (
+            self.storage_path / normalized_name / version / normalized_filename
+        )
+        return await self._lookup_cached(
+            (normalized_name, normalized_filename), package_path, count_hit=False
+        )
+
+    async def _lookup_cached(
+        self, key: Tuple[str, str], package_path: Path, count_hit: bool = True
+    ) -> Optional[Path]:
+        """检查本地缓存，校验通过才返回
+
+        目录按（项目, 文件名）登记，同一文件以不同的版本路径请求时，
+        校验并返回登记的路径。``count_hit`` 为真时记录一次命中并更新淘汰记录。
+        """
+        if count_hit:
+            record = await self.catalog.hit(*key)
+        else:
+            record = await self.catalog.get(*key)
+        if record is not None:
+            cached_path = self.storage_path / record.path
+            valid = await self.storage.run(
+                self.storage.verify, cached_path, record.size, record.sha256
+            )
+            if valid:
+                if count_hit:
+                    self.evictor.touch(cached_path, record.size)
+                return cached_path
+            await self._discard_artifact(cached_path, record, missing=valid is None)
+            return None
+
+        stat_result = await self.storage.stat(package_path)
+        if stat_result is None:
+            return None
+        # 目录中没有记录（如从旧版本升级），补充登记
+        await self._record_artifact(package_path, stat_result.st_size, None)
+        return package_path
+
+    async def open_upstream(
+        self,
+        package_name: str,
+        version: str,
+        filename: str,
+        headers: Mapping[str, str],
+        method: str = "GET",
+    ) -> Optional[aiohttp.ClientResponse]:
+        """将范围请求或 HEAD 请求直接转发到上游，不写入缓存
+
+        返回上游的 200/206 响应，调用方负责 ``release()``。
+        """
+        opened = await self._open_from_sources(
+            package_name,
+            version,
+            filename,
+            headers=headers,
+            method=method,
+            statuses=(200, 206),
+        )
+        return opened[0] if opened is not None else None
+
+    async def _start_download(
+        self,
+        key: Tuple[str, str],
+        package_name: str,
+        version: str,
+        filename: str,
+        package_path: Path,
+    ) -> Union[Path, InflightDownload, ForeignDownload, None]:
+        """打开上游下载并在后台写入缓存
+
+        先获取跨进程下载锁：拿到锁的 worker 负责下载，
+        其余 worker 跟随读取持锁者的临时文件。
+        """
+        # 等待期间可能已有其他请求完成下载
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return inflight
+
+        lock = self.storage.lock(key)
+        if not lock.acquire():
+            logger.info("package.download.follow", path=str(package_path))
+            return ForeignDownload(self.storage, lock, package_path)
+
+        try:
+            # 其他 worker 可能刚刚完成下载
+            if await self.storage.exists(package_path):
+                lock.release()
+                return package_path
+
+            # 传输中断时从已下载的位置续传
+            opened = await self._open_from_sources(
+                package_name, version, filename, resumable=True
+            )
+        except BaseException:
+            lock.release()
+            raise
+        if opened is None:
+            lock.release()
+            return None
+        response, expected_sha256 = opened
+
+        if response.content_length:
+            # 预先腾出空间，避免写入时磁盘写满
+            try:
+                await self.evictor.make_room(response.content_length)
+            except BaseException:
+                response.release()
+                lock.release()
+                raise
+
+        # 大文件且上游支持范围请求时分段并行下载
+        segments = self.download_client.plan_segments(response)
+        temp_path = self.storage.new_temp_path(key)
+        self.storage.claim(
+            lock, temp_path, response.content_length, segmented=bool(segments)
+        )
+        inflight = InflightDownload(
+            storage=self.storage,
+            temp_path=temp_path,
+            final_path=package_path,
+            size=response.content_length,
+            expected_sha256=expected_sha256,
+        )
+        self._inflight[key] = inflight
+
+        # 下载在独立任务中进行，客户端断开不影响缓存写入
+        task = asyncio.create_task(
+            self._run_download(key, lock, inflight, response, segments)
+        )
+        self._download_tasks.add(task)
+        task.add_done_callback(self._download_tasks.discard)
+        return inflight
+
+    async def _run_download(
+        self,
+        key: Tuple[str, str],
+        lock: FileLock,
+        inflight: InflightDownload,
+        response: ResumableResponse,
+        segments: List[int],
+    ):
+        """执行下载，成功后先在目录中登记再结束读取方并释放下载锁"""
+        source_url = str(response.url)
+
+        async def _record():
+            try:
+                await self._record_artifact(
+                    inflight.final_path, inflight.written, inflight.sha256, source_url
+                )
+            except Exception as e:
+                logger.error(
+                    "package.catalog.record.failed",
+                    path=str(inflight.final_path),
+                    error=str(e),
+                )
+
+        try:
+            await inflight.run(
+                response,
+                on_complete=_record,
+                segments=segments,
+                open_segment=partial(self.download_client.open_segment, response),
+            )
+        finally:
+            self._inflight.pop(key, None)
+            lock.release()
+
+    async def _resolve_file(
+        self, source_url: str, package_name: str, filename: str
+    ) -> Optional[ProjectFile]:
+        """在源站上查找包文件的下载地址与摘要"""
         normalized_path = normalize_package_path(package_name)
 
-        for source_url in self.sources:
+        if "/simple" not in source_url:
+            return ProjectFile(
+                filename=filename,
+                url=f"{source_url}/packages/source/{normalized_path[0]}/{normalized_path}/{filename}",
+            )
+
+        # 处理 simple API
+        index_url = f"{source_url}/{normalized_path}/"
+        result = await self.download_client.fetch(
+            index_url, headers={"Accept": UPSTREAM_ACCEPT}
+        )
+        if result is None:
+            return None
+
+        files = parse_project_response(
+            result.body, result.headers.get("Content-Type"), result.url
+        )
+        for file in files:
+            if file.filename == filename:
+                logger.info("package.download.match_found", filename=filename)
+                return file
+
+        logger.info("package.download.no_match", filename=filename)
+        return None
+
+    async def _open_from_sources(
+        self,
+        package_name: str,
+        version: str,
+        filename: str,
+        headers: Optional[Mapping[str, str]] = None,
+        method: str = "GET",
+        statuses: Collection[int] = (200,),
+        resumable: bool = False,
+    ) -> Optional[Tuple[aiohttp.ClientResponse, Optional[str]]]:
+        """从源站打开包文件的流式下载，返回响应与上游声明的 sha256"""
+        # 优先从缓存的项目页面定位文件，避免重复请求页面
+        page = None
+        if self.index_manager is not None:
+            page = await self.index_manager.get_project_page(package_name)
+            file = page.find(filename) if page is not None else None
+            if file is not None:
+                response = await self.download_client.open(
+                    file.url,
+                    headers=headers,
+                    method=method,
+                    statuses=statuses,
+                    resumable=resumable,
+                )
+                if response is not None:
+                    logger.info(
+                        "package.download.started",
+                        package=package_name,
+                        version=version,
+                        source=page.source,
+                        size=response.content_length,
+                    )
+                    return response, file.hashes.get("sha256")
+
+        for source_url in self.download_client.health.rank(self.sources):
+            if page is not None and page.source == PyPIIndexManager.project_url(
+                source_url, normalize_project_name(package_name)
+            ):
+                continue
             try:
                 source_url = source_url.rstrip("/")
-                if "/simple" in source_url:
-                    # 处理 simple API
-                    index_url = f"{source_url}/{normalized_path}/"
-                    index_content = await self.download_client.download(index_url)
-                    if not index_content:
-                        continue
-
-                    soup = BeautifulSoup(index_content, "html.parser")
-                    file_url = None
-                    for link in soup.find_all("a"):
-                        link_text = link.string if link.string else ""
-                        if link_text and filename == link_text:
-                            file_url = link.get("href")
-                            logger.info(
-                                "package.download.match_found",
-                                link_text=link_text,
-                                filename=filename,
-                            )
-                            break
-
-                    if not file_url:
-                        logger.info("package.download.no_match", filename=filename)
-                        continue
-
-                    # 处理相对URL
-                    if file_url.startswith("../") or file_url.startswith("./"):
-                        # 获取基础URL（移除 /simple/package_name/）
-                        base_url = source_url.rsplit("/simple/", 1)[0]
-                        # 移除URL中的hash部分
-                        file_url = file_url.split("#")[0]
-                        # 构建完整URL
-                        file_url = f"{base_url}/packages/{file_url.lstrip('./')}"
-                else:
-                    # 修改这里的URL构造逻辑
-                    file_url = f"{source_url}/packages/source/{normalized_path[0]}/{normalized_path}/{filename}"
+                file = await self._resolve_file(source_url, package_name, filename)
+                if file is None:
+                    continue
 
                 logger.info(
                     "package.download.attempt",
                     package=package_name,
                     version=version,
                     source=source_url,
-                    file_url=file_url,
+                    file_url=file.url,
                 )
 
-                content = await self.download_client.download(file_url)
-                if content:
+                response = await self.download_client.open(
+                    file.url,
+                    headers=headers,
+                    method=method,
+                    statuses=statuses,
+                    resumable=resumable,
+                )
+                if response is not None:
                     logger.info(
-                        "package.download.success",
+                        "package.download.started",
                         package=package_name,
                         version=version,
                         source=source_url,
+                        size=response.content_length,
                     )
-                    return content
+                    return response, file.hashes.get("sha256")
 
             except Exception as e:
                 logger.error(
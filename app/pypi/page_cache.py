@@ -0,0 +1,123 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.common.io_pool import IOPool, io_pool
+from app.common.logger import logger
+
+
+@dataclass
+class ProjectFile:
+    """项目页面中的一个文件链接"""
+
+    filename: str
+    url: str
+    hashes: Dict[str, str] = field(default_factory=dict)
+    requires_python: Optional[str] = None
+    yanked: Optional[str] = None  # 撤回原因，空字符串表示已撤回但未说明原因
+    # PEP 658 元数据文件的摘要，空字典表示可用但未提供摘要，None 表示不可用
+    core_metadata: Optional[Dict[str, str]] = None
+
+
+@dataclass
+class ProjectPage:
+    """上游项目页面的缓存条目"""
+
+    project: str
+    source: str  # 页面来源地址，用于条件请求
+    files: List[ProjectFile] = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    def age(self) -> float:
+        """距上次从上游确认的秒数"""
+        return time.time() - self.fetched_at
+
+    def find(self, filename: str) -> Optional[ProjectFile]:
+        """按文件名查找链接"""
+        for file in self.files:
+            if file.filename == filename:
+                return file
+        return None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProjectPage":
+        files = [ProjectFile(**f) for f in data.pop("files", [])]
+        return cls(files=files, **data)
+
+
+class ProjectPageCache:
+    """项目页面缓存
+
+    内存 LRU 在前，磁盘 JSON 在后（``index_path/projects``），
+    重启后仍可用缓存页面向上游发起条件请求。磁盘读写在文件 I/O 线程池中执行。
+    """
+
+    def __init__(
+        self, cache_dir: Path, max_entries: int = 2048, pool: Optional[IOPool] = None
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.pool = pool or io_pool
+        self._memory: "OrderedDict[str, ProjectPage]" = OrderedDict()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, project: str) -> Path:
+        return self.cache_dir / f"{project}.json"
+
+    async def get(self, project: str) -> Optional[ProjectPage]:
+        """获取缓存页面（不检查是否过期）"""
+        page = self._memory.get(project)
+        if page is not None:
+            self._memory.move_to_end(project)
+            return page
+
+        try:
+            content = await self.pool.run(self._path(project).read_text)
+        except FileNotFoundError:
+            return None
+        try:
+            page = ProjectPage.from_dict(json.loads(content))
+        except Exception as e:
+            logger.warning("index.page.load.failed", project=project, error=str(e))
+            return None
+        self._remember(page)
+        return page
+
+    async def put(self, page: ProjectPage):
+        """保存页面到内存和磁盘"""
+        self._remember(page)
+        content = json.dumps(page.to_dict())
+        try:
+            await self.pool.run(self._write, self._path(page.project), content)
+        except Exception as e:
+            logger.error("index.page.save.failed", project=page.project, error=str(e))
+
+    async def invalidate(self, project: str):
+        """删除项目的缓存页面"""
+        self._memory.pop(project, None)
+        await self.pool.run(self._path(project).unlink, missing_ok=True)
+
+    @staticmethod
+    def _write(path: Path, content: str):
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            temp_path.write_text(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    def _remember(self, page: ProjectPage):
+        self._memory[page.project] = page
+        self._memory.move_to_end(page.project)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
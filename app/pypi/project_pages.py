@@ -0,0 +1,153 @@
+import json
+from collections import OrderedDict
+from html import escape
+from typing import FrozenSet, List, Tuple
+from urllib.parse import quote
+
+from app.common.io_pool import io_pool
+from app.common.logger import logger
+from app.common.responses import RenderedBody
+from app.common.singleflight import SingleFlight
+
+from .schema import PackageVersion
+from .simple_parser import SIMPLE_JSON_TYPE, normalize_project_name
+from .versions import ProjectVersions
+
+# 渲染结果依赖的内容：版本分组结果（按对象身份比较，页面刷新后重新构建）
+# 与由本服务补充元数据（PEP 658）的文件名
+PageKey = Tuple[ProjectVersions, FrozenSet[str]]
+
+
+def package_file_url(package_name: str, version: PackageVersion) -> str:
+    """本服务上的包文件地址"""
+    return (
+        f"/pypi/packages/{quote(package_name)}/{quote(version.version)}/"
+        f"{quote(version.filename)}"
+    )
+
+
+def render_project_page(
+    simple_format: str, package_name: str, versions: List[PackageVersion]
+) -> RenderedBody:
+    """渲染项目页面（PEP 691 JSON 或 HTML）并预先压缩"""
+    if simple_format == "json":
+        return _render_json(package_name, versions)
+    return _render_html(package_name, versions)
+
+
+def _render_json(package_name: str, versions: List[PackageVersion]) -> RenderedBody:
+    """构建 PEP 691 JSON 版本列表"""
+    files = []
+    for version in versions:
+        file = {
+            "filename": version.filename,
+            "url": package_file_url(package_name, version),
+            "hashes": {"sha256": version.sha256} if version.sha256 else {},
+        }
+        if version.requires_python:
+            file["requires-python"] = version.requires_python
+        if version.yanked is not None:
+            file["yanked"] = version.yanked or True
+        if version.core_metadata is not None:
+            metadata = _metadata_json(version.core_metadata)
+            file["core-metadata"] = metadata
+            file["dist-info-metadata"] = metadata
+        files.append(file)
+
+    content = {"meta": {"api-version": "1.0"}, "name": package_name, "files": files}
+    return RenderedBody.render(json.dumps(content).encode(), SIMPLE_JSON_TYPE)
+
+
+def _metadata_json(value: str):
+    """将 ``true`` 或 ``sha256=...`` 形式的属性值转换为 PEP 691 JSON 字段值"""
+    hash_name, sep, hash_value = value.partition("=")
+    return {hash_name: hash_value} if sep else True
+
+
+def _render_html(package_name: str, versions: List[PackageVersion]) -> RenderedBody:
+    """构建版本列表HTML"""
+    version_items = []
+    for version in versions:
+        href = package_file_url(package_name, version)
+        if version.sha256:
+            href += f"#sha256={version.sha256}"
+        attrs = ""
+        if version.requires_python:
+            attrs += f' data-requires-python="{escape(version.requires_python)}"'
+        if version.yanked is not None:
+            attrs += f' data-yanked="{escape(version.yanked)}"'
+        if version.core_metadata is not None:
+            # PEP 714 的新属性名，旧属性名保留给较早的客户端
+            attrs += f' data-core-metadata="{escape(version.core_metadata)}"'
+            attrs += f' data-dist-info-metadata="{escape(version.core_metadata)}"'
+        version_items.append(
+            f'<a href="{escape(href)}"{attrs}>{escape(version.filename)}</a><br/>'
+        )
+
+    title = escape(package_name)
+    content = (
+        "<!DOCTYPE html>\n<html>\n<head>\n"
+        '<meta name="pypi:repository-version" content="1.0">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>Links for {title}</title>\n</head>\n<body>\n"
+        f"<h1>Links for {title}</h1>\n"
+        f"{''.join(version_items)}\n</body>\n</html>\n"
+    )
+    return RenderedBody.render(content.encode(), "text/html")
+
+
+class ProjectPageRenders:
+    """渲染好的项目页面
+
+    按（标准化项目名, 格式）保存最近一次的渲染结果及其 ``PageKey``，
+    版本分组结果未重新构建、补充的元数据也未变化时直接发送缓存的正文，
+    判断不需要遍历版本列表。同一内容的并发渲染只执行一次，
+    条目数超过上限时淘汰最久未使用的。
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        # (项目名, 格式) -> (PageKey, 渲染结果)
+        self._rendered: "OrderedDict[Tuple[str, str], Tuple[PageKey, RenderedBody]]"
+        self._rendered = OrderedDict()
+        self._flights: SingleFlight[RenderedBody] = SingleFlight()
+
+    async def get(
+        self,
+        simple_format: str,
+        package_name: str,
+        versions: List[PackageVersion],
+        key: PageKey,
+    ) -> RenderedBody:
+        """项目页面的渲染结果，``versions`` 为 ``key`` 对应的文件列表"""
+        entry = (normalize_project_name(package_name), simple_format)
+        cached = self._rendered.get(entry)
+        if cached is not None and cached[0][0] is key[0] and cached[0][1] == key[1]:
+            self._rendered.move_to_end(entry)
+            return cached[1]
+        return await self._flights.do(
+            (entry, key),
+            lambda: self._render(entry, key, versions),
+        )
+
+    async def _render(
+        self,
+        entry: Tuple[str, str],
+        key: PageKey,
+        versions: List[PackageVersion],
+    ) -> RenderedBody:
+        package_name, simple_format = entry
+        rendered = await io_pool.run(
+            render_project_page, simple_format, package_name, versions
+        )
+        self._rendered[entry] = (key, rendered)
+        self._rendered.move_to_end(entry)
+        while len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+        logger.debug(
+            "package.versions.rendered",
+            package=package_name,
+            format=simple_format,
+            size=len(rendered.content),
+        )
+        return rendered
@@ -0,0 +1,90 @@
+import json
+from html import escape
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.common.io_pool import io_pool
+from app.common.logger import logger
+from app.common.responses import RenderedBody
+from app.common.singleflight import SingleFlight
+
+from .name_index import ProjectNameIndex
+from .simple_parser import SIMPLE_JSON_TYPE
+
+# 根索引分页的默认与最大页大小
+INDEX_PAGE_SIZE = 1000
+MAX_INDEX_PAGE_SIZE = 10000
+
+
+def render_index(simple_format: str, names: List[str]) -> RenderedBody:
+    """渲染根索引并预先压缩"""
+    if simple_format == "html":
+        links = "\n".join(
+            f'<a href="/pypi/simple/{quote(name)}/">{escape(name)}</a>'
+            for name in names
+        )
+        content = (
+            "<!DOCTYPE html>\n<html>\n<head>\n"
+            '<meta name="pypi:repository-version" content="1.0">\n'
+            "<title>Simple index</title>\n</head>\n<body>\n"
+            f"{links}\n</body>\n</html>\n"
+        )
+        return RenderedBody.render(content.encode(), "text/html")
+    if simple_format == "json":
+        content = {
+            "meta": {"api-version": "1.0"},
+            "projects": [{"name": name} for name in names],
+        }
+        return RenderedBody.render(json.dumps(content).encode(), SIMPLE_JSON_TYPE)
+    return RenderedBody.render(json.dumps(names).encode(), "application/json")
+
+
+class RootIndexCache:
+    """渲染好的根索引
+
+    每种格式在项目名索引变化（版本号递增）后的首次请求时渲染并压缩一次，
+    之后的请求直接发送缓存的正文；同一格式的并发渲染只执行一次。
+    分页与前缀查询只渲染请求的部分，不缓存。
+    """
+
+    def __init__(self, names: ProjectNameIndex):
+        self.names = names
+        self._rendered: Dict[str, Tuple[int, RenderedBody]] = {}
+        self._flights: SingleFlight[RenderedBody] = SingleFlight()
+
+    async def get(self, simple_format: str) -> RenderedBody:
+        """完整的根索引"""
+        generation = await self.names.generation()
+        cached = self._rendered.get(simple_format)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        return await self._flights.do(
+            (simple_format, generation),
+            lambda: self._render(simple_format, generation),
+        )
+
+    async def _render(self, simple_format: str, generation: int) -> RenderedBody:
+        names = await self.names.names()
+        rendered = await io_pool.run(render_index, simple_format, names)
+        self._rendered[simple_format] = (generation, rendered)
+        logger.info(
+            "package.index.rendered",
+            format=simple_format,
+            generation=generation,
+            projects=len(names),
+            size=len(rendered.content),
+        )
+        return rendered
+
+    async def page(
+        self,
+        simple_format: str,
+        prefix: str = "",
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[RenderedBody, Optional[str]]:
+        """根索引的一部分，返回正文与下一页的游标（没有下一页时为 None）"""
+        names = await self.names.names(prefix, after, limit)
+        next_cursor = names[-1] if limit is not None and len(names) == limit else None
+        rendered = await io_pool.run(render_index, simple_format, names)
+        return rendered, next_cursor
@@ -1,16 +1,23 @@
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi import APIRouter, FastAPI, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, Response
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from app.common.download_client import DownloadClient
 from app.common.logger import logger
+from app.common.responses import CachedFileResponse, RenderedResponse
+from app.settings import settings
 
 from . import schema
 from .instance import pypi_service
+from .metadata import METADATA_SUFFIX
+from .package_manager import PackageStream
+from .root_index import INDEX_PAGE_SIZE, MAX_INDEX_PAGE_SIZE
+from .simple_parser import SIMPLE_HTML_TYPE, SIMPLE_JSON_TYPE
 
 # 初始化路由和模板
 api_router = APIRouter(prefix="/pypi")
@@ -24,17 +31,32 @@ scheduler = AsyncIOScheduler()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    await pypi_service.start()
     logger.info("Loading package index...")
     await pypi_service.init_index()
 
-    @scheduler.scheduled_job("interval", hours=1)
+    @scheduler.scheduled_job("interval", seconds=settings.pypi.index_update_interval)
     async def refresh_index():
         logger.info("Refreshing package index...")
         await pypi_service.update_index()
 
+    @scheduler.scheduled_job("interval", hours=settings.cache.cleanup_interval_hours)
+    async def cleanup_cache():
+        logger.info("Cleaning up package cache...")
+        await pypi_service.cleanup_cache()
+
+    if settings.pypi.source_probe_interval:
+
+        @scheduler.scheduled_job(
+            "interval", seconds=settings.pypi.source_probe_interval
+        )
+        async def probe_sources():
+            await pypi_service.probe_sources()
+
     scheduler.start()
     yield
     scheduler.shutdown()
+    await pypi_service.close()
 
 
 # API 路由
@@ -44,47 +66,187 @@ async def get_statistics():
     return await pypi_service.get_statistics()
 
 
+@api_router.get("/sources", response_model=List[schema.SourceStatus])
+async def get_sources():
+    """获取上游源评分"""
+    return pypi_service.get_sources()
+
+
 @api_router.get(
     "/simple",
     response_model=List[str],
     responses={404: {"description": "Package index not found"}},
 )
-async def get_simple_index():
-    """获取包索引列表"""
-    packages = await pypi_service.index_manager.list_packages()
-    return packages
+@api_router.get("/simple/", response_model=List[str], include_in_schema=False)
+async def get_simple_index(
+    request: Request,
+    prefix: str = "",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_INDEX_PAGE_SIZE),
+):
+    """获取包索引列表
+
+    按 Accept 头返回 PEP 691 JSON 或 HTML，默认返回包名列表。
+    完整列表使用缓存的渲染结果（支持 gzip 与 ETag/304）；
+    指定 ``prefix``、``cursor`` 或 ``limit`` 时按名称分页，下一页地址见 ``Link`` 头。
+    """
+    simple_format = _negotiate_simple_format(request, default=None) or "list"
+    root_index = pypi_service.index_manager.root_index
+    headers = dict(_SIMPLE_HEADERS)
+    if not prefix and cursor is None and limit is None:
+        rendered = await root_index.get(simple_format)
+        return RenderedResponse(rendered, headers=headers)
+
+    limit = limit or INDEX_PAGE_SIZE
+    rendered, next_cursor = await root_index.page(simple_format, prefix, cursor, limit)
+    if next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=next_cursor, limit=limit)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    return RenderedResponse(rendered, headers=headers)
 
 
 @api_router.get("/simple/{package_name}/")
-async def get_package_versions(package_name: str):
-    """获取包版本列表"""
-    versions = await pypi_service.index_manager.list_versions(package_name)
-    if not versions:
+async def get_package_versions(request: Request, package_name: str):
+    """获取包版本列表
+
+    按 Accept 头返回 PEP 691 JSON 或 HTML（默认）。
+    版本列表不变时使用缓存的渲染结果（支持 gzip 与 ETag/304）。
+    """
+    simple_format = _negotiate_simple_format(request, default="html")
+    rendered = await pypi_service.render_versions(simple_format, package_name)
+    if rendered is None:
         raise HTTPException(status_code=404, detail="Package not found")
+    return RenderedResponse(rendered, headers=_PROJECT_HEADERS)
 
-    return _build_version_html(package_name, versions)
 
+# 元数据文件（PEP 658）的内容类型
+METADATA_MEDIA_TYPE = "text/plain; charset=utf-8"
 
-@api_router.get("/packages/{package_name}/{version}/{filename}")
-async def get_package_file(package_name: str, version: str, filename: str):
-    """获取包文件"""
-    content = await pypi_service.package_manager.get_package(
-        package_name, version, filename
-    )
+# 转发范围请求时从上游响应复制的响应头
+UPSTREAM_PASSTHROUGH_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "Content-Range",
+    "Accept-Ranges",
+    "ETag",
+    "Last-Modified",
+)
+
+
+@api_router.api_route(
+    "/packages/{package_name}/{version}/{filename}", methods=["GET", "HEAD"]
+)
+async def get_package_file(
+    request: Request, package_name: str, version: str, filename: str
+):
+    """获取包文件
+
+    范围请求与 HEAD 请求命中缓存时由文件响应处理；文件尚未完整缓存时
+    直接转发到上游，只传输请求的部分，不触发完整下载。
+    """
+    if filename.endswith(METADATA_SUFFIX):
+        return await _get_metadata_file(package_name, version, filename)
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Content-Type": "application/x-gzip",
+    }
+    package_manager = pypi_service.package_manager
+    range_header = request.headers.get("range")
+    if request.method == "HEAD" or range_header is not None:
+        cached = await package_manager.get_cached_package(
+            package_name, version, filename
+        )
+        if cached is not None:
+            return CachedFileResponse(
+                cached, media_type="application/octet-stream", headers=headers
+            )
+        response = await _proxy_upstream(
+            request, package_name, version, filename, headers
+        )
+        if response is not None:
+            return response
+        if request.method == "HEAD":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Package file not found: {package_name}-{version}",
+            )
+        # 上游不支持转发时回退为完整下载
+
+    content = await package_manager.get_package(package_name, version, filename)
     if not content:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Package file not found: {package_name}-{version}",
         )
 
-    return Response(
-        content=content,
+    if isinstance(content, PackageStream):
+        # 未命中缓存：边从上游下载边转发
+        if content.size is not None:
+            headers["Content-Length"] = str(content.size)
+        return StreamingResponse(
+            content.chunks,
+            media_type="application/octet-stream",
+            headers=headers,
+        )
+
+    # 命中缓存：由文件直接发送，不经过 Python 内存
+    return CachedFileResponse(
+        content,
         media_type="application/octet-stream",
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "application/x-gzip",
-        },
+        headers=headers,
+    )
+
+
+async def _get_metadata_file(package_name: str, version: str, filename: str):
+    """获取 wheel 的元数据文件（PEP 658）"""
+    metadata = await pypi_service.package_manager.get_metadata(
+        package_name, version, filename.removesuffix(METADATA_SUFFIX)
+    )
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Metadata not found: {filename}",
+        )
+    if isinstance(metadata, bytes):
+        return Response(content=metadata, media_type=METADATA_MEDIA_TYPE)
+    return CachedFileResponse(metadata, media_type=METADATA_MEDIA_TYPE)
+
+
+async def _proxy_upstream(
+    request: Request,
+    package_name: str,
+    version: str,
+    filename: str,
+    headers: dict,
+) -> Optional[Response]:
+    """将范围请求或 HEAD 请求转发到上游，返回 None 表示所有源都不可用"""
+    upstream_headers = {"Accept-Encoding": "identity"}
+    range_header = request.headers.get("range")
+    if range_header is not None:
+        upstream_headers["Range"] = range_header
+    upstream = await pypi_service.package_manager.open_upstream(
+        package_name, version, filename, upstream_headers, method=request.method
     )
+    if upstream is None:
+        return None
+
+    for name in UPSTREAM_PASSTHROUGH_HEADERS:
+        value = upstream.headers.get(name)
+        if value is not None:
+            headers[name] = value
+    if request.method == "HEAD":
+        upstream.release()
+        return Response(status_code=upstream.status, headers=headers)
+
+    async def chunks():
+        try:
+            async for chunk in DownloadClient.iter_chunks(upstream):
+                yield chunk
+        finally:
+            upstream.release()
+
+    return StreamingResponse(chunks(), status_code=upstream.status, headers=headers)
 
 
 # Web 路由
@@ -129,42 +291,38 @@ async def package_detail(request: Request, package_name: str):
     )
 
 
-def _build_version_html(
-    package_name: str, versions: List[schema.PackageVersion]
-) -> HTMLResponse:
-    """构建版本列表HTML"""
-    version_items = []
-    for version in versions:
-        version_str = str(version.version)
-        filename = version.filename
-        requires_python = version.requires_python
-        requires_python_attr = (
-            f'data-requires-python="{requires_python}"' if requires_python else ""
-        )
-        version_items.append(
-            f'<a href="/pypi/packages/{package_name}/{version_str}/{filename}" '
-            f"{requires_python_attr}>{filename}</a><br/>"
-        )
+def _negotiate_simple_format(request: Request, default: Optional[str]) -> Optional[str]:
+    """根据 Accept 头选择 simple 页面格式（PEP 691），返回 json 或 html"""
+    accept = request.headers.get("accept")
+    if not accept:
+        return default
 
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <meta name="pypi:repository-version" content="1.0">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <title>Links for {package_name}</title>
-        </head>
-        <body>
-            <h1>Links for {package_name}</h1>
-            {''.join(version_items)}
-        </body>
-    </html>
-    """.strip()
-
-    return HTMLResponse(
-        content=html_content,
-        headers={
-            "Content-Type": "text/html; charset=utf-8",
-            "Cache-Control": "max-age=3600",
-        },
-    )
+    best, best_q = default, 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        simple_format = _SIMPLE_FORMATS.get(media_type.lower())
+        if simple_format is None:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = simple_format, q
+    return best
+
+
+_SIMPLE_FORMATS = {
+    SIMPLE_JSON_TYPE: "json",
+    "application/vnd.pypi.simple.latest+json": "json",
+    SIMPLE_HTML_TYPE: "html",
+    "application/vnd.pypi.simple.latest+html": "html",
+    "text/html": "html",
+}
+
+_SIMPLE_HEADERS = {"Vary": "Accept", "Cache-Control": "max-age=3600"}
+# 项目页面由 ETag 重新验证（未变化时返回 304），客户端可以立即看到新版本
+_PROJECT_HEADERS = {"Vary": "Accept", "Cache-Control": "no-cache"}
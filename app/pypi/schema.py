@@ -37,6 +37,7 @@ class PackageVersion(BaseModel):
     url: str
     requires_python: Optional[str] = None
     sha256: Optional[str] = None
+    yanked: Optional[str] = None  # 撤回原因，空字符串表示已撤回
     dist_info_metadata: Optional[str] = None
     core_metadata: Optional[str] = None
 
@@ -85,6 +86,20 @@ class Statistics(BaseModel):
     storage_usage: str = Field(..., description="存储使用量")
 
 
+class SourceStatus(BaseModel):
+    """上游源健康状态"""
+
+    source: str = Field(..., description="源地址")
+    state: str = Field(..., description="熔断状态: closed, open, half_open")
+    score: float = Field(..., description="评分（期望耗时，秒），越小越优先")
+    latency_ms: Optional[float] = Field(None, description="响应延迟（EWMA，毫秒）")
+    throughput: Optional[int] = Field(None, description="下载速度（EWMA，字节/秒）")
+    error_rate: float = Field(..., description="错误率（EWMA）")
+    requests: int = Field(..., description="请求次数")
+    failures: int = Field(..., description="失败次数")
+    consecutive_failures: int = Field(..., description="连续失败次数")
+
+
 class Message(BaseModel):
     """消息提示"""
 
@@ -1,8 +1,16 @@
-from typing import Any, Dict
+import asyncio
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 from urllib.parse import quote
 
+from app.common.download_client import DownloadClient
+from app.common.io_pool import io_pool
+from app.common.proxy_manager import ProxyManager
+from app.common.responses import RenderedBody
+
+from . import schema
 from .index_manager import PyPIIndexManager
 from .package_manager import PackageManager
+from .versions import ProjectVersions
 
 
 def normalize_package_name(package_name: str) -> str:
@@ -29,25 +37,123 @@ def normalize_filename(filename: str) -> str:
     return quote(normalized)
 
 
+def format_size(size: int) -> str:
+    """格式化字节数"""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
 class PyPIService:
     def __init__(self):
         """初始化 PyPI 服务"""
-        self.index_manager = PyPIIndexManager()
-        self.package_manager = PackageManager()
+        # 索引与包下载共用一个连接池
+        self.download_client = DownloadClient(ProxyManager())
+        self.index_manager = PyPIIndexManager(self.download_client)
+        self.package_manager = PackageManager(self.download_client, self.index_manager)
+
+    async def start(self):
+        """启动服务资源"""
+        # 清理上次崩溃遗留的下载临时文件
+        storage = self.package_manager.storage
+        await storage.run(storage.recover)
+        catalog = self.package_manager.catalog
+        await catalog.open()
+        if catalog.created:
+            # 首次启用目录时从磁盘登记已有的缓存文件
+            await catalog.rebuild()
+        await self.package_manager.evictor.load()
+        await self.download_client.start()
+
+    async def close(self):
+        """释放服务资源"""
+        await self.download_client.close()
+        await self.package_manager.catalog.close()
+        io_pool.shutdown(wait=False)
+
+    async def get_statistics(self) -> schema.Statistics:
+        """获取统计信息（来自缓存目录，不遍历文件）"""
+        stats = await self.package_manager.catalog.stats()
+        # 每个文件首次下载算一次未命中
+        downloads = stats.hits + stats.files
+        return schema.Statistics(
+            total_packages=stats.projects,
+            total_downloads=downloads,
+            total_versions=stats.versions,
+            cache_hit_rate=stats.hits / downloads if downloads else 0.0,
+            storage_usage=format_size(stats.size),
+        )
+
+    async def render_versions(
+        self, simple_format: str, package_name: str
+    ) -> Optional[RenderedBody]:
+        """渲染项目页面，项目不存在或没有文件时返回 None
+
+        版本分组结果与补充的元数据都未变化时直接使用缓存的渲染结果。
+        """
+        versions = await self.index_manager.get_versions(package_name)
+        if versions is None or not versions.files:
+            return None
+        files, extracted = await self._with_extracted_metadata(package_name, versions)
+        return await self.index_manager.project_pages.get(
+            simple_format, package_name, files, (versions, extracted)
+        )
+
+    async def _with_extracted_metadata(
+        self, package_name: str, versions: ProjectVersions
+    ) -> Tuple[List[schema.PackageVersion], FrozenSet[str]]:
+        """为已缓存的 wheel 声明元数据，返回文件列表与补充了元数据的文件名"""
+        files = list(versions.files)
+        cached = await self.package_manager.cached_filenames(package_name)
+        extracted = set()
+        # 版本列表由索引管理器缓存，修改时复制
+        for index, version in enumerate(files):
+            if (
+                version.core_metadata is None
+                and version.filename.endswith(".whl")
+                and normalize_filename(version.filename) in cached
+            ):
+                files[index] = version.model_copy(
+                    update={"core_metadata": "true", "dist_info_metadata": "true"}
+                )
+                extracted.add(version.filename)
+        return files, frozenset(extracted)
+
+    async def cleanup_cache(self):
+        """按缓存配置清理过期文件并淘汰超出限制的文件"""
+        await self.package_manager.evictor.run()
 
     async def init_index(self):
         """初始化包索引"""
         await self.index_manager.init_index()
         if (
-            not self.index_manager.get_all_packages()
+            not await self.index_manager.count_packages()
             or self.index_manager.is_index_expired()
         ):
             await self.index_manager.update_index()
 
-    def get_index_status(self) -> Dict[str, Any]:
+    async def probe_sources(self):
+        """探测已熔断或长时间没有请求的上游源"""
+        client = self.download_client
+        due = client.health.due_for_probe(self.index_manager.sources)
+        await asyncio.gather(*(client.probe(source) for source in due))
+
+    def get_sources(self) -> List[schema.SourceStatus]:
+        """上游源评分，按当前优先顺序排列"""
+        return [
+            schema.SourceStatus(**status)
+            for status in self.download_client.health.scoreboard(
+                self.index_manager.sources
+            )
+        ]
+
+    async def get_index_status(self) -> Dict[str, Any]:
         """获取索引状态"""
-        return self.index_manager.get_index_status()
+        return await self.index_manager.get_index_status()
 
-    def clear_index(self):
+    async def clear_index(self):
         """清除索引缓存"""
-        self.index_manager.clear_index()
+        await self.index_manager.clear_index()
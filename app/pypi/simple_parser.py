@@ -0,0 +1,249 @@
+import codecs
+import html
+import json
+import re
+from typing import Dict, Generic, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+from urllib.parse import urljoin
+
+from .page_cache import ProjectFile
+
+T = TypeVar("T")
+
+# PEP 691 内容类型
+SIMPLE_JSON_TYPE = "application/vnd.pypi.simple.v1+json"
+SIMPLE_HTML_TYPE = "application/vnd.pypi.simple.v1+html"
+# 向上游请求时优先 JSON，不支持时回退到 HTML
+UPSTREAM_ACCEPT = f"{SIMPLE_JSON_TYPE}, {SIMPLE_HTML_TYPE};q=0.2, text/html;q=0.1"
+# PyPI 在 simple 页面中返回的最新变更序列号
+SERIAL_HEADER = "X-PyPI-Last-Serial"
+
+# <a ...>text</a>，属性值中允许出现未转义的 ">"（部分镜像的 data-requires-python）
+_ANCHOR_RE = re.compile(
+    r"""<a(?=[\s>])((?:[^>"']|"[^"]*"|'[^']*')*)>(.*?)</a\s*>""",
+    re.IGNORECASE | re.DOTALL,
+)
+# 只提取链接文本时使用的更快的模式
+_ANCHOR_TEXT_RE = re.compile(
+    r"""<a(?=[\s>])(?:[^>"']|"[^"]*"|'[^']*')*>([^<]*)</a\s*>""", re.IGNORECASE
+)
+_ANCHOR_OPEN_RE = re.compile(r"<a(?=[\s>])", re.IGNORECASE)
+_ATTR_RE = re.compile(
+    r"""([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+)))?"""
+)
+_TAG_RE = re.compile(r"<[^>]*>")
+_NORMALIZE_RE = re.compile(r"[-_.]+")
+
+
+class SimpleAnchor(NamedTuple):
+    """simple 页面中的一个链接"""
+
+    text: str
+    href: str
+    attrs: Dict[str, str]
+
+
+def normalize_project_name(name: str) -> str:
+    """PEP 503 项目名标准化"""
+    return _NORMALIZE_RE.sub("-", name).lower()
+
+
+def _unescape(value: str) -> str:
+    return html.unescape(value) if "&" in value else value
+
+
+def _parse_attrs(raw: str) -> Dict[str, str]:
+    attrs = {}
+    for match in _ATTR_RE.finditer(raw):
+        name, double, single, bare = match.groups()
+        value = double if double is not None else single
+        if value is None:
+            value = bare if bare is not None else ""
+        attrs[name.lower()] = _unescape(value)
+    return attrs
+
+
+class _IncrementalParser(Generic[T]):
+    """按块输入的解析器基类，负责解码与保留跨块的未完整链接"""
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._buffer = ""
+
+    def feed(self, data: bytes) -> List[T]:
+        """输入一块数据，返回其中完整的链接"""
+        return self._parse(self._decoder.decode(data))
+
+    def close(self) -> List[T]:
+        """结束输入，返回剩余的链接"""
+        items = self._parse(self._decoder.decode(b"", final=True))
+        self._buffer = ""
+        return items
+
+    def _extract(self, buffer: str) -> Tuple[List[T], int]:
+        """从缓冲区提取完整链接，返回结果和已处理到的位置"""
+        raise NotImplementedError
+
+    def _parse(self, text: str) -> List[T]:
+        buffer = self._buffer + text if self._buffer else text
+        items, end = self._extract(buffer)
+
+        # 保留可能未完整的链接：最后一个 "<a" 起始处，否则最后一个 "<"
+        rest = buffer[end:]
+        start = None
+        for start_match in _ANCHOR_OPEN_RE.finditer(rest):
+            start = start_match.start()
+        if start is None:
+            start = rest.rfind("<")
+        self._buffer = rest[start:] if start >= 0 else ""
+        return items
+
+
+class SimpleIndexParser(_IncrementalParser[SimpleAnchor]):
+    """simple 页面的增量解析器
+
+    不构建 DOM，只用正则提取 ``<a>`` 链接及其 ``href``/``data-*`` 属性；
+    数据可以按任意边界分块输入，未闭合的链接保留到下一块。
+    """
+
+    def _extract(self, buffer: str) -> Tuple[List[SimpleAnchor], int]:
+        anchors = []
+        end = 0
+        for match in _ANCHOR_RE.finditer(buffer):
+            raw_attrs, raw_text = match.groups()
+            end = match.end()
+            if "<" in raw_text:
+                raw_text = _TAG_RE.sub("", raw_text)
+            attrs = _parse_attrs(raw_attrs)
+            anchors.append(
+                SimpleAnchor(_unescape(raw_text.strip()), attrs.pop("href", ""), attrs)
+            )
+        return anchors, end
+
+
+class ProjectNameParser(_IncrementalParser[str]):
+    """根索引页面的增量解析器，只提取项目名
+
+    根索引包含数十万个链接，跳过属性解析和对象构建以节省时间和内存。
+    """
+
+    def _extract(self, buffer: str) -> Tuple[List[str], int]:
+        names = []
+        end = 0
+        for match in _ANCHOR_TEXT_RE.finditer(buffer):
+            end = match.end()
+            name = match[1].strip()
+            if name:
+                names.append(_unescape(name))
+        return names, end
+
+
+def parse_anchors(chunks: Iterable[bytes]) -> List[SimpleAnchor]:
+    """解析完整或分块的 simple 页面"""
+    parser = SimpleIndexParser()
+    anchors = []
+    for chunk in chunks:
+        anchors.extend(parser.feed(chunk))
+    anchors.extend(parser.close())
+    return anchors
+
+
+def split_hash(url: str) -> Tuple[str, Dict[str, str]]:
+    """拆分链接中的 ``#<hash_name>=<value>`` 片段"""
+    url, _, fragment = url.partition("#")
+    hashes = {}
+    if "=" in fragment:
+        hash_name, hash_value = fragment.split("=", 1)
+        hashes[hash_name] = hash_value
+    return url, hashes
+
+
+def parse_metadata_attr(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """解析 ``data-core-metadata``（PEP 714）或旧的 ``data-dist-info-metadata`` 属性
+
+    取值为 ``true`` 或 ``<hash_name>=<value>``，返回摘要字典；不可用时返回 None。
+    """
+    if value is None or value.strip().lower() == "false":
+        return None
+    hash_name, sep, hash_value = value.strip().partition("=")
+    return {hash_name: hash_value} if sep else {}
+
+
+def _json_metadata(item: dict) -> Optional[Dict[str, str]]:
+    """PEP 691 JSON 中的 ``core-metadata``/``dist-info-metadata`` 字段"""
+    value = item.get("core-metadata", item.get("dist-info-metadata"))
+    if isinstance(value, dict):
+        return dict(value)
+    return {} if value else None
+
+
+def anchor_to_file(anchor: SimpleAnchor, base_url: str) -> Optional[ProjectFile]:
+    """将项目页面中的链接转换为文件记录"""
+    if not anchor.text:
+        return None
+    url, hashes = split_hash(urljoin(base_url, anchor.href))
+    return ProjectFile(
+        filename=anchor.text,
+        url=url,
+        hashes=hashes,
+        requires_python=anchor.attrs.get("data-requires-python"),
+        yanked=anchor.attrs.get("data-yanked"),
+        core_metadata=parse_metadata_attr(
+            anchor.attrs.get(
+                "data-core-metadata", anchor.attrs.get("data-dist-info-metadata")
+            )
+        ),
+    )
+
+
+def parse_project_page(content: bytes, base_url: str) -> List[ProjectFile]:
+    """解析项目页面中的文件链接"""
+    files = []
+    for anchor in parse_anchors([content]):
+        file = anchor_to_file(anchor, base_url)
+        if file is not None:
+            files.append(file)
+    return files
+
+
+def is_json_response(content_type: Optional[str]) -> bool:
+    """判断响应是否为 PEP 691 JSON 格式"""
+    return bool(content_type) and SIMPLE_JSON_TYPE in content_type.lower()
+
+
+def parse_project_json(content: bytes, base_url: str) -> List[ProjectFile]:
+    """解析 PEP 691 JSON 项目页面"""
+    files = []
+    for item in json.loads(content).get("files", []):
+        filename = item.get("filename")
+        if not filename:
+            continue
+        yanked = item.get("yanked", False)
+        files.append(
+            ProjectFile(
+                filename=filename,
+                url=urljoin(base_url, item.get("url", "")),
+                hashes=dict(item.get("hashes") or {}),
+                requires_python=item.get("requires-python"),
+                yanked=yanked if isinstance(yanked, str) else ("" if yanked else None),
+                core_metadata=_json_metadata(item),
+            )
+        )
+    return files
+
+
+def parse_project_response(
+    content: bytes, content_type: Optional[str], base_url: str
+) -> List[ProjectFile]:
+    """按响应类型解析项目页面（JSON 或 HTML）"""
+    if is_json_response(content_type):
+        return parse_project_json(content, base_url)
+    return parse_project_page(content, base_url)
+
+
+def parse_project_names_json(content: bytes) -> List[str]:
+    """解析 PEP 691 JSON 根索引中的项目名"""
+    return [
+        project["name"]
+        for project in json.loads(content).get("projects", [])
+        if project.get("name")
+    ]
@@ -0,0 +1,353 @@
+import errno
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from app.common.file_lock import FileLock
+from app.common.io_pool import IOPool, io_pool
+from app.common.logger import logger
+
+from .metadata import metadata_path
+
+# 下载中的临时文件目录（位于存储目录内，保证重命名是原子的）
+TEMP_DIR_NAME = ".tmp"
+# 跨进程下载锁目录
+LOCK_DIR_NAME = ".locks"
+# 按 sha256 存放文件内容的目录
+BLOB_DIR_NAME = ".blobs"
+# 孤立的内容文件与原子写入临时文件超过该时长（秒）才会在启动时清理，
+# 避免误删其他 worker 正在登记或写入的文件
+ORPHAN_AGE = 600
+
+
+class DownloadClaim(NamedTuple):
+    """锁文件中登记的下载信息"""
+
+    temp_path: Path
+    size: Optional[int]
+    # 分段下载时临时文件已预分配完整大小，读取方以进度文件为准
+    progress_path: Optional[Path] = None
+
+
+class PackageStorage:
+    """包文件存储
+
+    负责临时文件与跨进程下载锁：同一文件同一时刻只有一个进程（worker）
+    从上游下载，其余进程通过锁文件中记录的临时文件名跟随读取。
+    异步方法在文件 I/O 线程池中执行，不阻塞事件循环。
+
+    文件内容按 sha256 存放在 ``.blobs`` 中，``包名/版本/文件名`` 是指向内容的
+    硬链接：相同内容只存一份，内容文件的链接数减一即为引用它的文件名数。
+    """
+
+    def __init__(self, root: Path, pool: Optional[IOPool] = None):
+        self.root = root
+        self.pool = pool or io_pool
+        self.temp_dir = root / TEMP_DIR_NAME
+        self.lock_dir = root / LOCK_DIR_NAME
+        self.blob_dir = root / BLOB_DIR_NAME
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key_id(key: Tuple[str, str]) -> str:
+        """将 (包名, 文件名) 转换为文件名安全的标识"""
+        return hashlib.sha256("/".join(key).encode()).hexdigest()[:32]
+
+    def blob_path(self, sha256: str) -> Path:
+        """内容文件路径"""
+        return self.blob_dir / sha256[:2] / sha256
+
+    def lock(self, key: Tuple[str, str]) -> FileLock:
+        """获取文件对应的下载锁对象（未加锁）"""
+        return FileLock(self.lock_dir / f"{self.key_id(key)}.lock")
+
+    def new_temp_path(self, key: Tuple[str, str]) -> Path:
+        """生成新的临时文件路径"""
+        return (
+            self.temp_dir
+            / f"{self.key_id(key)}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part"
+        )
+
+    @staticmethod
+    def progress_path(temp_path: Path) -> Path:
+        """分段下载的进度文件：记录临时文件中从头开始连续写入的字节数"""
+        return temp_path.with_name(temp_path.name + ".progress")
+
+    def claim(
+        self,
+        lock: FileLock,
+        temp_path: Path,
+        size: Optional[int],
+        segmented: bool = False,
+    ) -> None:
+        """在锁文件中登记当前下载的临时文件和大小"""
+        lock.write_owner(
+            json.dumps({"temp": temp_path.name, "size": size, "segmented": segmented})
+        )
+
+    def read_claim(self, lock: FileLock) -> Optional[DownloadClaim]:
+        """读取其他进程登记的临时文件和大小"""
+        content = lock.read_owner()
+        if not content:
+            return None
+        try:
+            claim = json.loads(content)
+            temp_path = self.temp_dir / claim["temp"]
+            progress_path = (
+                self.progress_path(temp_path) if claim.get("segmented") else None
+            )
+            return DownloadClaim(temp_path, claim.get("size"), progress_path)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def recover(self) -> int:
+        """清理崩溃遗留的临时文件
+
+        只删除没有进程持有下载锁的临时文件，正在下载的文件不受影响。
+        """
+        removed = 0
+        for temp_path in self.temp_dir.iterdir():
+            key_id = temp_path.name.split(".", 1)[0]
+            lock = FileLock(self.lock_dir / f"{key_id}.lock")
+            if not lock.acquire():
+                continue
+            try:
+                temp_path.unlink(missing_ok=True)
+                removed += 1
+            finally:
+                lock.release()
+
+        removed += self._remove_orphan_blobs()
+        removed += self._remove_stale_temp_files()
+        if removed:
+            logger.info("package.storage.recovered", removed=removed)
+        return removed
+
+    def _remove_orphan_blobs(self) -> int:
+        """删除没有任何文件名引用的内容文件"""
+        removed = 0
+        deadline = time.time() - ORPHAN_AGE
+        for blob in self.blob_dir.glob("*/*"):
+            try:
+                stat_result = blob.stat()
+            except FileNotFoundError:
+                continue
+            if stat_result.st_nlink <= 1 and stat_result.st_mtime < deadline:
+                blob.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def _remove_stale_temp_files(self) -> int:
+        """删除包目录中崩溃遗留的原子写入临时文件（``.文件名.pid.随机串.tmp``）"""
+        removed = 0
+        deadline = time.time() - ORPHAN_AGE
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for filename in filenames:
+                if not (filename.startswith(".") and filename.endswith(".tmp")):
+                    continue
+                path = Path(dirpath, filename)
+                try:
+                    if path.stat().st_mtime < deadline:
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+    def commit(self, temp_path: Path, final_path: Path, sha256: str) -> bool:
+        """将校验通过的临时文件登记为内容文件，并在最终路径建立链接
+
+        内容已存在时丢弃临时文件，只增加一个链接。调用方需在此之前
+        fsync 临时文件；重命名与链接完成后 fsync 所在目录，崩溃后
+        缓存路径要么不存在，要么是完整的内容。
+
+        Returns:
+            是否与已有内容重复
+        """
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            try:
+                self._link(blob, final_path)
+            except FileNotFoundError:
+                # 新内容：临时文件成为内容文件
+                os.replace(temp_path, blob)
+                _fsync_dir(blob.parent)
+                self._link(blob, final_path)
+                _fsync_dir(final_path.parent)
+                return False
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP):
+                raise
+            # 文件系统不支持硬链接：直接使用文件，不做去重
+            os.replace(temp_path if temp_path.exists() else blob, final_path)
+            _fsync_dir(final_path.parent)
+            return False
+        _fsync_dir(final_path.parent)
+        temp_path.unlink(missing_ok=True)
+        return True
+
+    def verify(self, path: Path, size: int, sha256: Optional[str]) -> Optional[bool]:
+        """命中缓存前的快速校验，不读取文件内容
+
+        大小必须与目录记录一致；文件名链接到内容文件时，还必须与记录的
+        sha256 对应的内容文件是同一个 inode（内容文件只在校验通过后创建）。
+
+        Returns:
+            文件不存在时返回 None
+        """
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat_result.st_size != size:
+            return False
+        if sha256 and stat_result.st_nlink > 1:
+            try:
+                return os.path.samestat(stat_result, os.stat(self.blob_path(sha256)))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def adopt(self, path: Path, sha256: str) -> bool:
+        """将不在内容目录中的文件（旧版本缓存）登记为内容文件
+
+        Returns:
+            是否与已有内容重复（重复时文件名改为指向已有内容）
+        """
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob)
+            return False
+        except FileExistsError:
+            if os.path.samefile(path, blob):
+                return False
+        self._link(blob, path)
+        return True
+
+    def remove(self, path: Path, sha256: Optional[str] = None):
+        """删除文件名及其元数据文件；内容不再被引用时一并删除，并清理空的版本目录和包目录"""
+        path.unlink(missing_ok=True)
+        metadata_path(path).unlink(missing_ok=True)
+        if sha256:
+            blob = self.blob_path(sha256)
+            try:
+                if blob.stat().st_nlink <= 1:
+                    blob.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+        for parent in (path.parent, path.parent.parent):
+            if parent == self.root:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    @staticmethod
+    def _link(blob: Path, path: Path):
+        """原子地让 ``path`` 成为 ``blob`` 的硬链接"""
+        link_path = path.with_name(
+            f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        )
+        os.link(blob, link_path)
+        try:
+            os.replace(link_path, path)
+        except BaseException:
+            link_path.unlink(missing_ok=True)
+            raise
+
+    async def run(self, fn, *args, **kwargs):
+        """在文件 I/O 线程池中执行阻塞调用"""
+        return await self.pool.run(fn, *args, **kwargs)
+
+    async def exists(self, path: Path) -> bool:
+        """判断文件是否存在"""
+        return await self.run(path.exists)
+
+    async def stat(self, path: Path) -> Optional[os.stat_result]:
+        """获取文件状态，文件不存在时返回 None"""
+        try:
+            return await self.run(os.stat, path)
+        except FileNotFoundError:
+            return None
+
+    async def read_bytes(self, path: Path) -> Optional[bytes]:
+        """读取文件内容，文件不存在时返回 None"""
+        try:
+            return await self.run(path.read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def write_bytes(self, path: Path, content: bytes) -> str:
+        """写入包文件：写临时文件并 fsync 后登记内容并原子链接，读取方不会看到半个文件
+
+        Returns:
+            文件内容的 sha256
+        """
+        return await self.run(self._write_atomic, path, content)
+
+    async def pread(self, fd: int, size: int, offset: int) -> bytes:
+        """从文件指定位置读取"""
+        return await self.run(os.pread, fd, size, offset)
+
+    def write_file(self, path: Path, content: bytes) -> None:
+        """原子写入不登记为内容文件的小文件（如 wheel 的元数据）"""
+        temp_path = self._write_temp(path, content)
+        try:
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        _fsync_dir(path.parent)
+
+    def _write_atomic(self, path: Path, content: bytes) -> str:
+        temp_path = self._write_temp(path, content)
+        sha256 = hashlib.sha256(content).hexdigest()
+        try:
+            self.commit(temp_path, path, sha256)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return sha256
+
+    @staticmethod
+    def _write_temp(path: Path, content: bytes) -> Path:
+        """在目标目录写入并 fsync 临时文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(
+            f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        )
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return temp_path
+
+
+def _fsync_dir(path: Path):
+    """fsync 目录，使其中的重命名与链接持久化"""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # 部分文件系统不支持对目录 fsync
+        pass
+    finally:
+        os.close(fd)
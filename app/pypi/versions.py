@@ -0,0 +1,201 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .page_cache import ProjectPage
+from .schema import PackageVersion
+from .simple_parser import normalize_project_name
+
+# PEP 440 附录中的版本号正则
+_VERSION_RE = re.compile(
+    r"""
+    ^\s*v?
+    (?:
+        (?:(?P<epoch>[0-9]+)!)?
+        (?P<release>[0-9]+(?:\.[0-9]+)*)
+        (?P<pre>[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>[0-9]+)?)?
+        (?P<post>(?:-(?P<post_n1>[0-9]+))|(?:[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?))?
+        (?P<dev>[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    )
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+_PRE_LETTERS = {"alpha": "a", "beta": "b", "c": "rc", "pre": "rc", "preview": "rc"}
+
+# 源码包（PEP 625 之前也允许 zip 等格式）的扩展名
+SDIST_EXTENSIONS = (
+    ".tar.gz",
+    ".tgz",
+    ".zip",
+    ".tar.bz2",
+    ".tbz",
+    ".tar.xz",
+    ".txz",
+    ".tar",
+)
+
+# 可直接比较的版本排序键：
+# (1, epoch, release, pre, post, dev, local)，无效版本为 (0, 原始字符串)
+VersionKey = tuple
+
+
+@lru_cache(maxsize=65536)
+def version_key(version: str) -> VersionKey:
+    """PEP 440 版本排序键，无效的版本号排在所有有效版本之前（彼此按字符串排序）"""
+    match = _VERSION_RE.match(version)
+    if match is None:
+        return (0, version)
+
+    release = tuple(int(part) for part in match.group("release").split("."))
+    while len(release) > 1 and release[-1] == 0:
+        release = release[:-1]
+
+    # 各部分编码为元组，使“没有该部分”可以和具体值比较：
+    # 只有 dev 时排在所有预发布之前；没有预发布时排在所有预发布之后
+    if match.group("pre"):
+        letter = match.group("pre_l").lower()
+        pre = (1, _PRE_LETTERS.get(letter, letter), int(match.group("pre_n") or 0))
+    elif match.group("dev") and not match.group("post"):
+        pre = (0,)
+    else:
+        pre = (2,)
+
+    if match.group("post"):
+        post = (1, int(match.group("post_n1") or match.group("post_n2") or 0))
+    else:
+        post = (0,)
+
+    dev = (0, int(match.group("dev_n") or 0)) if match.group("dev") else (1,)
+
+    # 本地版本：数字段大于字母段，数字段按数值比较
+    local = ()
+    if match.group("local"):
+        local = tuple(
+            (1, int(part), "") if part.isdigit() else (0, 0, part.lower())
+            for part in re.split(r"[-_.]", match.group("local"))
+        )
+
+    return (1, int(match.group("epoch") or 0), release, pre, post, dev, local)
+
+
+@dataclass
+class DistFile:
+    """从文件名解析出的分发文件信息"""
+
+    project: str  # PEP 503 标准化后的项目名
+    version: str  # 文件名中的版本号（原样）
+    kind: str  # wheel、sdist 或 egg
+    build: Optional[str] = None  # wheel 的构建标签
+
+
+def parse_filename(filename: str, project: Optional[str] = None) -> Optional[DistFile]:
+    """解析 wheel（PEP 427）、源码包（PEP 625）与 egg 文件名，无法识别时返回 None
+
+    wheel 与 egg 的项目名和版本号中的 ``-`` 已被转义为 ``_``，可以直接按 ``-`` 拆分；
+    旧的源码包文件名中项目名可能包含 ``-``，提供 ``project`` 时按标准化后的
+    项目名确定分隔位置，否则在第一个后面跟着数字的 ``-`` 处拆分。
+    """
+    if filename.endswith(".whl"):
+        parts = filename[: -len(".whl")].split("-")
+        if len(parts) not in (5, 6):
+            return None
+        build = parts[2] if len(parts) == 6 else None
+        return DistFile(normalize_project_name(parts[0]), parts[1], "wheel", build)
+
+    if filename.endswith(".egg"):
+        parts = filename[: -len(".egg")].split("-")
+        if len(parts) < 2:
+            return None
+        return DistFile(normalize_project_name(parts[0]), parts[1], "egg")
+
+    lower = filename.lower()
+    for extension in SDIST_EXTENSIONS:
+        if lower.endswith(extension):
+            base = filename[: -len(extension)]
+            break
+    else:
+        return None
+
+    separator = -1
+    if project is not None:
+        target = normalize_project_name(project)
+        separator = next(
+            (
+                index
+                for index, char in enumerate(base)
+                if char == "-" and normalize_project_name(base[:index]) == target
+            ),
+            -1,
+        )
+    if separator < 0:
+        match = re.search(r"-(?=\d)", base)
+        if match is None:
+            return None
+        separator = match.start()
+    version = base[separator + 1 :]
+    if not version:
+        return None
+    return DistFile(normalize_project_name(base[:separator]), version, "sdist")
+
+
+@dataclass
+class Release:
+    """同一版本的全部文件"""
+
+    version: str
+    key: VersionKey
+    files: List[PackageVersion] = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class ProjectVersions:
+    """项目页面中的文件按版本分组、排序后的结果
+
+    每个项目页面只解析一次，页面刷新（上游内容变化）后重新构建，
+    因此按对象身份比较即可判断内容是否变化。
+    """
+
+    page: ProjectPage
+    releases: List[Release]  # 按版本从新到旧排序
+    files: List[PackageVersion]  # 与 releases 顺序一致的全部文件
+
+    @classmethod
+    def from_page(cls, page: ProjectPage) -> "ProjectVersions":
+        releases: Dict[VersionKey, Release] = {}
+        for file in page.files:
+            dist = parse_filename(file.filename, page.project)
+            if dist is None:
+                continue
+            key = version_key(dist.version)
+            release = releases.get(key)
+            if release is None:
+                release = releases[key] = Release(dist.version, key)
+            release.files.append(
+                PackageVersion(
+                    version=dist.version,
+                    filename=file.filename,
+                    url=file.url,
+                    requires_python=file.requires_python,
+                    sha256=file.hashes.get("sha256"),
+                    yanked=file.yanked,
+                    core_metadata=_metadata_attr(file.core_metadata),
+                    dist_info_metadata=_metadata_attr(file.core_metadata),
+                )
+            )
+        ordered = sorted(releases.values(), key=lambda r: r.key, reverse=True)
+        files = [file for release in ordered for file in release.files]
+        return cls(page=page, releases=ordered, files=files)
+
+
+def _metadata_attr(hashes: Optional[Dict[str, str]]) -> Optional[str]:
+    """将元数据摘要转换为 simple 页面中的属性值（``true`` 或 ``sha256=...``）"""
+    if hashes is None:
+        return None
+    if not hashes:
+        return "true"
+    hash_name = "sha256" if "sha256" in hashes else next(iter(hashes))
+    return f"{hash_name}={hashes[hash_name]}"
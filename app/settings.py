@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Literal
 
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
@@ -17,10 +17,44 @@ class ProxySettings(BaseModel):
 class CacheSettings(BaseModel):
     """缓存配置"""
 
-    max_size_gb: float = Field(default=10.0, ge=0)  # 最大缓存大小（GB）
+    max_size_gb: float = Field(default=10.0, ge=0)  # 最大缓存大小（GB，0 为不限）
     min_free_space_gb: float = Field(default=5.0, ge=0)  # 最小剩余空间（GB）
     cleanup_interval_hours: int = Field(default=24, ge=1)  # 清理间隔（小时）
-    file_ttl_days: int = Field(default=30, ge=1)  # 文件保存时间（天）
+    file_ttl_days: int = Field(default=30, ge=1)  # 文件保存时间（天，按最后访问）
+    eviction_policy: Literal["lru", "lfu", "gdsf"] = "lru"  # 淘汰策略
+
+
+class HttpSettings(BaseModel):
+    """上游 HTTP 连接池配置"""
+
+    pool_size: int = Field(default=100, ge=1)  # 连接池最大连接数
+    pool_size_per_host: int = Field(default=16, ge=0)  # 每个主机最大连接数（0 为不限）
+    keepalive_timeout: float = Field(default=60.0, ge=0)  # 空闲连接保持时间（秒）
+    dns_cache_ttl: int = Field(default=300, ge=0)  # DNS 缓存时间（秒）
+    connect_timeout: float = Field(default=10.0, gt=0)  # 建立连接超时（秒）
+    # 超过该大小（MB）且上游支持范围请求时分段并行下载，0 为关闭
+    segment_threshold_mb: float = Field(default=64, ge=0)
+    segment_count: int = Field(default=4, ge=1)  # 分段并行下载的连接数
+
+
+class HedgeSettings(BaseModel):
+    """对冲请求配置
+
+    首选源在延迟分位数内未响应时，向下一个源发出相同请求，取先返回的结果。
+    """
+
+    pages: bool = True  # 项目页面（/simple/{project}/）请求是否对冲
+    percentile: float = Field(default=0.95, gt=0, lt=1)  # 按首选源延迟的该分位数等待
+    min_delay: float = Field(default=0.05, ge=0)  # 最短等待时间（秒）
+    # 最长等待时间，样本不足时也使用该值（秒）
+    max_delay: float = Field(default=1.0, ge=0)
+    budget: float = Field(default=0.1, ge=0, le=1)  # 对冲请求数占请求总数的上限
+
+
+class IOSettings(BaseModel):
+    """文件 I/O 配置"""
+
+    workers: int = Field(default=16, ge=1)  # 文件 I/O 线程池大小
 
 
 class PyPISettings(BaseModel):
@@ -55,9 +89,26 @@ class PyPISettings(BaseModel):
 
     # 下载配置
     timeout_seconds: int = 30
-    max_retries: int = 3
+    max_retries: int = 3  # 连接失败、429/5xx 或传输中断时的最大重试次数
+    retry_backoff: float = 0.5  # 首次重试的最长等待时间（秒），之后每次翻倍并随机抖动
+    retry_backoff_max: float = 30.0  # 单次重试的最长等待时间（秒）
+    # 源延迟与错误率的平滑系数
+    source_ewma_alpha: float = Field(default=0.3, gt=0, le=1)
+    source_failure_threshold: int = Field(default=3, ge=1)  # 连续失败多少次后熔断
+    # 熔断后多久允许重新尝试（秒）
+    source_open_seconds: float = Field(default=30.0, ge=0)
+    # 源健康探测间隔（秒，0 为关闭）
+    source_probe_interval: int = Field(default=60, ge=0)
     index_update_interval: int = 3600  # 索引更新间隔（秒）
+    # 按上游 changelog 增量同步索引（上游不支持时自动全量同步）
+    index_incremental_sync: bool = True
+    # 增量同步最多落后的变更数，超过时全量同步
+    index_sync_max_events: int = Field(default=50000, ge=0)
     index_cache_ttl: int = 3600  # 索引缓存过期时间（秒）
+    index_cache_entries: int = 2048  # 内存中缓存的项目页面数量
+    index_stale_while_revalidate: int = 600  # 过期后先返回旧页面再后台刷新的时长（秒）
+    index_stale_if_error: int = 86400  # 上游出错时仍可返回旧页面的时长（秒）
+    index_refresh_timeout: float = 5.0  # 有旧页面时等待上游刷新的最长时间（秒）
 
 
 class Settings(BaseSettings):
@@ -75,6 +126,18 @@ class Settings(BaseSettings):
     # 各模块配置
     pypi: PyPISettings = PyPISettings(work_dir=work_dir)
 
+    # 上游连接配置
+    http: HttpSettings = HttpSettings()
+
+    # 包缓存配置
+    cache: CacheSettings = CacheSettings()
+
+    # 对冲请求配置
+    hedge: HedgeSettings = HedgeSettings()
+
+    # 文件 I/O 配置
+    io: IOSettings = IOSettings()
+
     # 代理配置
     # 格式: {"domain": ProxySettings}
     proxies: Dict[str, ProxySettings] = {}
@@ -78,6 +78,7 @@ show_help() {
     echo "Commands:"
     echo "  start       Start the service (default)"
     echo "  clean       Clean the cache"
+    echo "  rebuild-catalog  Rebuild the package catalog from disk"
     echo "  install     Install dependencies"
     echo "  test        Run tests"
     echo "  help        Show this help message"
@@ -106,6 +107,10 @@ main() {
         "install")
             install_dependencies "${2:-all}"
             ;;
+        "rebuild-catalog")
+            echo -e "${YELLOW}Rebuilding package catalog...${NC}"
+            poetry run python -m app.pypi.catalog rebuild
+            ;;
         "help")
             show_help
             ;;
@@ -0,0 +1,91 @@
+"""缓存命中吞吐量基准测试
+
+对比旧实现（``read_bytes`` 后整体放入 ``Response``）与 ``CachedFileResponse``
+在 1 MB / 100 MB / 1 GB 文件上的吞吐量和 Python 内存峰值。
+
+uvicorn 不提供 ``http.response.zerocopysend`` 扩展，新实现在文件 I/O 线程池中读取；
+旧实现直接在事件循环中读取，没有并发请求时省去了线程切换，
+因此小文件（1 MB 及以下）单请求吞吐量低于旧实现，大文件高于旧实现。
+
+    python -m tests.benchmarks.bench_cache_hit [--sizes 1,100,1024] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from starlette.responses import Response
+
+from app.common.responses import CachedFileResponse
+
+SCOPE = {"type": "http", "method": "GET", "headers": [], "extensions": {}}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    # 模拟网络发送：只丢弃数据
+    return None
+
+
+async def serve_old(path: Path):
+    response = Response(
+        content=path.read_bytes(), media_type="application/octet-stream"
+    )
+    await response(SCOPE, _receive, _send)
+
+
+async def serve_new(path: Path):
+    response = CachedFileResponse(path)
+    await response(SCOPE, _receive, _send)
+
+
+async def serve_many(serve, path: Path, rounds: int):
+    for _ in range(rounds):
+        await serve(path)
+
+
+def run(serve, path: Path, rounds: int):
+    size = path.stat().st_size
+    # 小文件多跑几轮，保证每组至少传输约 1 GB
+    rounds = max(rounds, 2**30 // size)
+    asyncio.run(serve_many(serve, path, 1))  # 预热线程池和页缓存
+    started = time.perf_counter()
+    asyncio.run(serve_many(serve, path, rounds))
+    elapsed = time.perf_counter() - started
+
+    # 内存峰值单独测量，避免 tracemalloc 影响吞吐量数据
+    tracemalloc.start()
+    asyncio.run(serve_many(serve, path, 1))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size * rounds / elapsed / 2**20, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1,100,1024", help="文件大小（MB）")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'impl':>6} {'MB/s':>10} {'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in (int(s) for s in args.sizes.split(",")):
+            path = Path(tmp) / f"{size_mb}.whl"
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(2**20))
+            for name, serve in (("before", serve_old), ("after", serve_new)):
+                throughput, peak = run(serve, path, args.rounds)
+                print(f"{size_mb:>6}MB {name:>6} {throughput:>10.1f} {peak:>10.1f}")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""项目名索引基准测试
+
+对比旧实现（启动时把 ``package_index.json`` 整体加载为 Python 集合）与
+``ProjectNameIndex``（SQLite）的启动耗时、成员判断、前缀查询、增量更新和内存占用。
+
+    python -m tests.benchmarks.bench_name_index [--names 600000]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.pypi.name_index import ProjectNameIndex
+
+
+def _names(count: int):
+    rng = random.Random(0)
+    alphabet = string.ascii_lowercase + string.digits + "-"
+    return {
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 24)))
+        for _ in range(count)
+    }
+
+
+def bench_json(path: Path, names, probes):
+    cache_data = {
+        "last_update": None,
+        "local_packages": [],
+        "remote_packages": list(names),
+    }
+    started = time.perf_counter()
+    with open(path, "w") as f:
+        json.dump(cache_data, f)
+    save = time.perf_counter() - started
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(path) as f:
+        data = json.load(f)
+    remote = set(data["remote_packages"])
+    load = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for name in probes:
+        _ = name in remote
+    lookup = (time.perf_counter() - started) / len(probes)
+    print(
+        f"json    save {save * 1000:8.1f} ms  load {load * 1000:8.1f} ms  "
+        f"lookup {lookup * 1e6:6.2f} us  resident {memory / 1024 / 1024:7.1f} MB"
+    )
+
+
+async def bench_sqlite(path: Path, names, probes):
+    index = ProjectNameIndex(path)
+    started = time.perf_counter()
+    await index.replace_remote(names)
+    build = time.perf_counter() - started
+    await index.close()
+
+    tracemalloc.start()
+    index = ProjectNameIndex(path)
+    started = time.perf_counter()
+    await index.open()
+    load = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    await index.counts()
+    counts = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name in probes:
+        await index.contains(name)
+    lookup = (time.perf_counter() - started) / len(probes)
+
+    started = time.perf_counter()
+    for _ in range(100):
+        await index.names("abc")
+    prefix = (time.perf_counter() - started) / 100
+
+    # 上游列表只有少量变化时的更新
+    changed = set(list(names)[100:]) | {f"new-project-{i}" for i in range(100)}
+    started = time.perf_counter()
+    added, removed = await index.replace_remote(changed)
+    update = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await index.add_local("private-project")
+    add_local = time.perf_counter() - started
+    await index.close()
+    print(
+        f"sqlite  build {build * 1000:7.1f} ms  load {load * 1000:8.1f} ms  "
+        f"lookup {lookup * 1e6:6.2f} us  resident {memory / 1024 / 1024:7.1f} MB"
+    )
+    print(
+        f"        counts {counts * 1000:6.1f} ms  prefix {prefix * 1000:6.2f} ms  "
+        f"update(+{added}/-{removed}) {update * 1000:7.1f} ms  "
+        f"add_local {add_local * 1000:5.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=600_000)
+    args = parser.parse_args()
+
+    names = _names(args.names)
+    probes = random.Random(1).sample(sorted(names), 1000) + ["missing-name"] * 100
+    print(f"{len(names)} names")
+    with tempfile.TemporaryDirectory() as root:
+        bench_json(Path(root) / "package_index.json", names, probes)
+        await bench_sqlite(Path(root) / "projects.db", names, probes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""项目页面基准测试
+
+对比每次请求重新渲染项目页面与 ``ProjectPageRenders`` 缓存渲染结果
+（版本列表未变化时直接发送）的耗时和响应大小。
+
+    python -m tests.benchmarks.bench_project_pages [--files 2000] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import time
+
+from app.pypi.page_cache import ProjectFile, ProjectPage
+from app.pypi.project_pages import ProjectPageRenders, render_project_page
+from app.pypi.versions import ProjectVersions
+
+
+def _versions(count: int) -> ProjectVersions:
+    files = []
+    for i in range(count):
+        version = f"{i // 20}.{i % 20}"
+        filename = f"demo-{version}-cp311-cp311-manylinux_2_17_x86_64.whl"
+        files.append(
+            ProjectFile(
+                filename=filename,
+                url=f"https://files.example/{filename}",
+                hashes={"sha256": hashlib.sha256(filename.encode()).hexdigest()},
+                requires_python=">=3.8",
+                core_metadata={"sha256": hashlib.sha256(version.encode()).hexdigest()},
+            )
+        )
+    return ProjectVersions.from_page(ProjectPage("demo", "src", files))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    project = _versions(args.files)
+    versions, key = project.files, (project, frozenset())
+    print(f"{len(versions)} files")
+    renders = ProjectPageRenders()
+    for simple_format in ("html", "json"):
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            rendered = render_project_page(simple_format, "demo", versions)
+        every = (time.perf_counter() - started) / args.rounds
+
+        await renders.get(simple_format, "demo", versions, key)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            await renders.get(simple_format, "demo", versions, key)
+        cached = (time.perf_counter() - started) / args.rounds
+        print(
+            f"{simple_format:<5} render {every * 1000:7.2f} ms/request  "
+            f"cached {cached * 1000:6.3f} ms/request  "
+            f"{len(rendered.content) / 1e3:7.1f} KB "
+            + "  ".join(
+                f"{coding} {len(body) / 1e3:6.1f} KB"
+                for coding, body in rendered.encoded.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
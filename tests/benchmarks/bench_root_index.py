@@ -0,0 +1,77 @@
+"""根索引基准测试
+
+对比旧实现（每次请求对两个集合求并集排序，再经 pydantic 校验与 JSON 序列化）
+与缓存渲染结果（``RootIndexCache``）在重复请求时的耗时和响应大小。
+
+    python -m tests.benchmarks.bench_root_index [--names 600000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.pypi.name_index import ProjectNameIndex
+from app.pypi.root_index import RootIndexCache
+
+
+def _names(count: int):
+    rng = random.Random(0)
+    alphabet = string.ascii_lowercase + string.digits + "-"
+    return {
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 24)))
+        for _ in range(count)
+    }
+
+
+def serve_old(local: set, remote: set) -> bytes:
+    packages = sorted(local | remote)
+    validated = TypeAdapter(List[str]).validate_python(packages)
+    return json.dumps(validated).encode()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=600_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    names = _names(args.names)
+    print(f"{len(names)} names")
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        body = serve_old(set(), names)
+    old = (time.perf_counter() - started) / args.rounds
+    print(f"old            {old * 1000:8.1f} ms/request  {len(body) / 1e6:6.2f} MB")
+
+    with tempfile.TemporaryDirectory() as root:
+        index = ProjectNameIndex(Path(root) / "projects.db")
+        await index.replace_remote(names)
+        cache = RootIndexCache(index)
+        for simple_format in ("list", "html", "json"):
+            started = time.perf_counter()
+            rendered = await cache.get(simple_format)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            for _ in range(args.rounds * 20):
+                await cache.get(simple_format)
+            cached = (time.perf_counter() - started) / (args.rounds * 20)
+            print(
+                f"{simple_format:<5} render {first * 1000:8.1f} ms  "
+                f"cached {cached * 1000:6.3f} ms/request  "
+                f"{len(rendered.content) / 1e6:6.2f} MB "
+                f"gzip {len(rendered.encoded['gzip']) / 1e6:5.2f} MB"
+            )
+        await index.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""分段并行下载基准测试
+
+本地上游按连接限速（模拟镜像对单连接的限流），对比单连接下载与分段并行下载
+同一文件的冷未命中耗时。
+
+    python -m tests.benchmarks.bench_segmented_download [--size 128] [--rate 16] [--segments 1,2,4,8]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+from aiohttp import web
+
+from app.common.download_client import DownloadClient
+from app.common.proxy_manager import ProxyManager
+from app.pypi.inflight import InflightDownload
+from app.pypi.storage import PackageStorage
+from app.settings import HttpSettings
+
+MB = 1024 * 1024
+CHUNK = 64 * 1024
+
+
+def make_app(data: bytes, rate: float) -> web.Application:
+    """每个连接按 ``rate`` 字节/秒发送"""
+
+    async def handler(request):
+        start = request.http_range.start or 0
+        stop = min(request.http_range.stop or len(data), len(data))
+        status = 206 if request.http_range.start is not None else 200
+        headers = {"Accept-Ranges": "bytes", "ETag": '"bench"'}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(data)}"
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = stop - start
+        await response.prepare(request)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            for offset in range(start, stop, CHUNK):
+                await response.write(data[offset : min(offset + CHUNK, stop)])
+                sent += CHUNK
+                delay = sent / rate - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except ConnectionError:
+            # 首段读到段尾后会关闭连接
+            pass
+        return response
+
+    app = web.Application()
+    app.router.add_get("/file.whl", handler)
+    return app
+
+
+async def download(url: str, root: Path, size: int, sha256: str, segments: int):
+    http_settings = HttpSettings(segment_threshold_mb=1, segment_count=segments)
+    client = DownloadClient(ProxyManager(), http_settings=http_settings)
+    storage = PackageStorage(root)
+    try:
+        response = await client.open(url, resumable=True)
+        final_path = root / "demo" / "1.0" / f"file-{segments}.whl"
+        inflight = InflightDownload(
+            storage,
+            storage.new_temp_path(("demo", final_path.name)),
+            final_path,
+            size=size,
+            expected_sha256=sha256,
+        )
+        started = time.perf_counter()
+        await inflight.run(
+            response,
+            segments=client.plan_segments(response),
+            open_segment=partial(client.open_segment, response),
+        )
+        elapsed = time.perf_counter() - started
+        assert inflight.error is None, inflight.error
+        final_path.unlink()
+        return elapsed
+    finally:
+        await client.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=128, help="文件大小（MB）")
+    parser.add_argument("--rate", type=float, default=16, help="单连接限速（MB/s）")
+    parser.add_argument("--segments", default="1,2,4,8")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * MB)
+    sha256 = hashlib.sha256(data).hexdigest()
+    runner = web.AppRunner(make_app(data, args.rate * MB))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/file.whl"
+
+    print(f"{args.size} MB, {args.rate} MB/s per connection")
+    with tempfile.TemporaryDirectory() as root:
+        for segments in (int(value) for value in args.segments.split(",")):
+            elapsed = await download(url, Path(root), len(data), sha256, segments)
+            print(
+                f"segments={segments:<2} {elapsed:6.2f}s "
+                f"{args.size / elapsed:7.1f} MB/s"
+            )
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
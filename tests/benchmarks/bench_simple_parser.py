@@ -0,0 +1,74 @@
+"""simple 页面解析基准测试
+
+在 60 万项目的根索引样本上对比 BeautifulSoup 与 ``ProjectNameParser``
+的耗时和 Python 内存峰值；新解析器按 256 KB 分块输入，模拟边下载边解析。
+
+    python -m tests.benchmarks.bench_simple_parser [--entries 600000]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from app.common.download_client import CHUNK_SIZE
+from app.pypi.simple_parser import ProjectNameParser
+
+
+def build_root_page(entries: int) -> bytes:
+    links = "\n".join(
+        f'    <a href="/simple/project-{i}/">project-{i}</a>' for i in range(entries)
+    )
+    return (
+        "<!DOCTYPE html>\n<html>\n  <head>\n"
+        '    <meta name="pypi:repository-version" content="1.1">\n'
+        "    <title>Simple index</title>\n  </head>\n  <body>\n"
+        f"{links}\n  </body>\n</html>\n"
+    ).encode()
+
+
+def parse_bs4(content: bytes):
+    soup = BeautifulSoup(content, "html.parser")
+    return [link.string for link in soup.find_all("a") if link.string]
+
+
+def parse_streaming(content: bytes):
+    parser = ProjectNameParser()
+    names = []
+    for i in range(0, len(content), CHUNK_SIZE):
+        names.extend(parser.feed(content[i : i + CHUNK_SIZE]))
+    names.extend(parser.close())
+    return names
+
+
+def measure(parse, content: bytes):
+    started = time.perf_counter()
+    names = parse(content)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return names, elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=600_000)
+    args = parser.parse_args()
+
+    content = build_root_page(args.entries)
+    print(f"fixture: {args.entries} entries, {len(content) / 2**20:.1f} MB")
+    print(f"{'parser':>14} {'seconds':>10} {'peak MB':>10}")
+    results = {}
+    for name, parse in (("beautifulsoup", parse_bs4), ("streaming", parse_streaming)):
+        names, elapsed, peak = measure(parse, content)
+        results[name] = names
+        print(f"{name:>14} {elapsed:>10.2f} {peak:>10.1f}")
+    assert results["beautifulsoup"] == results["streaming"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""大文件写入期间的事件循环延迟基准测试
+
+``InflightDownload`` 写入一个大文件（默认 1 GB），同时测量事件循环的调度延迟，
+文件 I/O 都在线程池中执行时最大延迟应远小于一次写入的耗时。
+
+    python -m tests.benchmarks.bench_storage_io [--size 1024]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.pypi.inflight import InflightDownload
+from app.pypi.storage import PackageStorage
+
+BLOCK = b"\0" * (1024 * 1024)
+TICK = 0.01
+
+
+class _Content:
+    def __init__(self, blocks: int):
+        self.blocks = blocks
+
+    async def iter_chunked(self, chunk_size):
+        for _ in range(self.blocks):
+            yield BLOCK
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1024, help="文件大小（MB）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = PackageStorage(Path(tmp))
+        key = ("demo", "huge.whl")
+        final_path = Path(tmp) / "demo" / "huge.whl"
+        size = len(BLOCK) * args.size
+        inflight = InflightDownload(
+            storage, storage.new_temp_path(key), final_path, size
+        )
+        response = SimpleNamespace(content=_Content(args.size), release=lambda: None)
+
+        lags = []
+
+        async def ticker():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(TICK)
+                lags.append(time.perf_counter() - started - TICK)
+
+        ticker_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        try:
+            await inflight.run(response)
+        finally:
+            ticker_task.cancel()
+        elapsed = time.perf_counter() - started
+
+        assert inflight.error is None, inflight.error
+        lags.sort()
+        print(
+            f"{args.size} MB in {elapsed:.2f} s ({args.size / elapsed:.0f} MB/s)  "
+            f"loop lag p50 {lags[len(lags) // 2] * 1000:.1f} ms  "
+            f"max {lags[-1] * 1000:.1f} ms  ({len(lags)} ticks)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import os
+import xmlrpc.client
+
+import pytest
+from aiohttp import web
+
+from app.pypi.catalog import PackageCatalog
+from app.pypi.eviction import CacheEvictor
+from app.pypi.instance import pypi_service
+from app.pypi.name_index import ProjectNameIndex
+from app.pypi.page_cache import ProjectPageCache
+from app.pypi.project_pages import ProjectPageRenders
+from app.pypi.root_index import RootIndexCache
+from app.pypi.storage import PackageStorage
+from app.settings import settings
+
+WHEEL = "demo-1.0-py3-none-any.whl"
+DATA = os.urandom(2 * 1024 * 1024 + 17)
+METADATA = b"Metadata-Version: 2.1\nName: demo\nVersion: 1.0\nRequires-Dist: six\n"
+UPSTREAM_HITS = {
+    "page": 0,
+    "page_304": 0,
+    "file": 0,
+    "range": 0,
+    "metadata": 0,
+    "root": 0,
+    "changelog": 0,
+}
+PAGE_ETAG = '"page-v1"'
+UPSTREAM_STATE = {
+    "broken": False,
+    "etag": '"file-v1"',
+    "drop_at": None,
+    "page_delay": 0,
+    # 根索引中的项目与 changelog：(项目名, 版本, 时间, 操作, 序列号)
+    "projects": ["demo"],
+    "changelog": [],
+}
+
+
+@pytest.fixture
+async def upstream(tmp_path, monkeypatch):
+    """启动本地上游源，并把包管理器指向它"""
+
+    for key in UPSTREAM_HITS:
+        UPSTREAM_HITS[key] = 0
+    UPSTREAM_STATE.update(
+        broken=False,
+        etag='"file-v1"',
+        drop_at=None,
+        page_delay=0,
+        projects=["demo"],
+        changelog=[],
+    )
+
+    def last_serial():
+        return max([event[4] for event in UPSTREAM_STATE["changelog"]] or [100])
+
+    async def root_index(request):
+        UPSTREAM_HITS["root"] += 1
+        links = "".join(
+            f'<a href="{name}/">{name}</a>' for name in UPSTREAM_STATE["projects"]
+        )
+        return web.Response(
+            text=f"<html><body>{links}</body></html>",
+            content_type="text/html",
+            headers={"X-PyPI-Last-Serial": str(last_serial())},
+        )
+
+    async def xmlrpc_api(request):
+        params, method = xmlrpc.client.loads(await request.text())
+        UPSTREAM_HITS["changelog"] += 1
+        if method == "changelog_last_serial":
+            result = last_serial()
+        else:
+            result = [
+                list(event)
+                for event in UPSTREAM_STATE["changelog"]
+                if event[4] > params[0]
+            ]
+        return web.Response(
+            text=xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True),
+            content_type="text/xml",
+        )
+
+    async def simple_page(request):
+        UPSTREAM_HITS["page"] += 1
+        if UPSTREAM_STATE["page_delay"] and not request.path.startswith("/mirror/"):
+            await asyncio.sleep(UPSTREAM_STATE["page_delay"])
+        if UPSTREAM_STATE["broken"]:
+            return web.Response(status=503)
+        if request.headers.get("If-None-Match") == PAGE_ETAG:
+            UPSTREAM_HITS["page_304"] += 1
+            return web.Response(status=304, headers={"ETag": PAGE_ETAG})
+        return web.Response(
+            text=f'<a href="../../packages/ab/{WHEEL}#sha256='
+            f'{hashlib.sha256(DATA).hexdigest()}" data-dist-info-metadata="sha256='
+            f'{hashlib.sha256(METADATA).hexdigest()}">{WHEEL}</a>',
+            content_type="text/html",
+            headers={"ETag": PAGE_ETAG},
+        )
+
+    async def package_file(request):
+        if request.match_info["filename"].endswith(".metadata"):
+            UPSTREAM_HITS["metadata"] += 1
+            return web.Response(body=METADATA)
+        etag = UPSTREAM_STATE["etag"]
+        if_range = request.headers.get("If-Range")
+        if request.http_range.start is not None and if_range in (None, etag):
+            UPSTREAM_HITS["range"] += 1
+            start, stop = request.http_range.start, request.http_range.stop
+            stop = len(DATA) if stop is None else stop
+            return web.Response(
+                status=206,
+                body=DATA[start:stop],
+                headers={
+                    "Content-Range": f"bytes {start}-{stop - 1}/{len(DATA)}",
+                    "ETag": etag,
+                },
+            )
+        if request.method == "HEAD":
+            return web.Response(headers={"Content-Length": str(len(DATA))})
+        UPSTREAM_HITS["file"] += 1
+        response = web.StreamResponse(headers={"ETag": etag, "Accept-Ranges": "bytes"})
+        response.content_length = len(DATA)
+        await response.prepare(request)
+        drop_at = UPSTREAM_STATE["drop_at"]
+        for i in range(0, len(DATA), 64 * 1024):
+            if drop_at is not None and i >= drop_at:
+                # 模拟传输中断，只中断一次
+                UPSTREAM_STATE["drop_at"] = None
+                request.transport.close()
+                return response
+            await response.write(DATA[i : i + 64 * 1024])
+            await asyncio.sleep(0)
+        return response
+
+    upstream_app = web.Application()
+    upstream_app.router.add_get("/simple/", root_index)
+    upstream_app.router.add_post("/pypi", xmlrpc_api)
+    upstream_app.router.add_get("/simple/demo/", simple_page)
+    # 同一上游的第二个源地址，不受 page_delay 影响
+    upstream_app.router.add_get("/mirror/simple/demo/", simple_page)
+    upstream_app.router.add_get("/packages/ab/{filename}", package_file)
+    runner = web.AppRunner(upstream_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    sources = [f"http://127.0.0.1:{port}/simple/"]
+    index_manager = pypi_service.index_manager
+    monkeypatch.setattr(index_manager, "sources", sources)
+    names = ProjectNameIndex(tmp_path / "projects.db")
+    monkeypatch.setattr(index_manager, "names", names)
+    monkeypatch.setattr(index_manager, "root_index", RootIndexCache(names))
+    monkeypatch.setattr(index_manager, "project_pages", ProjectPageRenders())
+    monkeypatch.setattr(
+        index_manager, "page_cache", ProjectPageCache(tmp_path / "index")
+    )
+    monkeypatch.setattr(pypi_service.download_client, "retry_backoff", 0.0)
+    package_manager = pypi_service.package_manager
+    monkeypatch.setattr(package_manager, "sources", sources)
+    packages = tmp_path / "packages"
+    monkeypatch.setattr(package_manager, "storage_path", packages)
+    storage = PackageStorage(packages)
+    catalog = PackageCatalog(storage)
+    monkeypatch.setattr(package_manager, "storage", storage)
+    monkeypatch.setattr(package_manager, "catalog", catalog)
+    monkeypatch.setattr(
+        package_manager, "evictor", CacheEvictor(storage, catalog, settings.cache)
+    )
+    yield packages
+    await pypi_service.close()
+    await runner.cleanup()
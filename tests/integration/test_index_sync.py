@@ -0,0 +1,79 @@
+import pytest
+
+from app.pypi.index_manager import PyPIIndexManager
+from app.pypi.instance import pypi_service
+from app.pypi.page_cache import ProjectPageCache
+
+from .conftest import UPSTREAM_HITS, UPSTREAM_STATE
+
+
+@pytest.mark.asyncio
+async def test_index_sync_applies_changelog_since_last_serial(upstream):
+    index_manager = pypi_service.index_manager
+    UPSTREAM_STATE["projects"] = ["demo", "Old_Project", "requests"]
+
+    # 第一次全量同步，记录序列号
+    await index_manager.update_index()
+    assert UPSTREAM_HITS["root"] == 1
+    assert await index_manager.list_packages() == ["Old_Project", "demo", "requests"]
+    assert await index_manager.names.get_meta("serial") == "100"
+
+    page = await index_manager.get_project_page("demo")
+    assert page is not None
+    UPSTREAM_STATE["changelog"] = [
+        ("demo", "1.1", 0, "new release", 101),
+        ("New.Project", "0.1", 0, "create", 102),
+        ("Old_Project", None, 0, "remove project", 103),
+    ]
+
+    # 之后只请求 changelog，并使变化项目的缓存页面失效
+    await index_manager.update_index()
+    assert UPSTREAM_HITS["root"] == 1
+    assert await index_manager.list_packages() == ["New.Project", "demo", "requests"]
+    assert await index_manager.names.get_meta("serial") == "103"
+    assert await index_manager.page_cache.get("demo") is None
+
+    # 没有新变更时不修改索引
+    await index_manager.update_index()
+    assert UPSTREAM_HITS["root"] == 1
+
+
+@pytest.mark.asyncio
+async def test_index_sync_falls_back_to_full_resync(upstream, monkeypatch):
+    index_manager = pypi_service.index_manager
+    await index_manager.update_index()
+    assert UPSTREAM_HITS["root"] == 1
+
+    # 落后的变更数超过上限时重新下载根索引
+    monkeypatch.setattr(index_manager.settings, "index_sync_max_events", 1)
+    UPSTREAM_STATE["projects"] = ["demo", "flask"]
+    UPSTREAM_STATE["changelog"] = [
+        ("flask", "3.0", 0, "create", 101),
+        ("flask", "3.0", 0, "add py3 file", 102),
+    ]
+    await index_manager.update_index()
+    assert UPSTREAM_HITS["root"] == 2
+    assert await index_manager.list_packages() == ["demo", "flask"]
+    assert await index_manager.names.get_meta("serial") == "102"
+
+
+@pytest.mark.asyncio
+async def test_changelog_sync_invalidates_pages_in_other_workers(upstream, tmp_path):
+    index_manager = pypi_service.index_manager
+    await index_manager.update_index()
+    page = await index_manager.get_project_page("demo")
+    assert UPSTREAM_HITS["page"] == 1
+
+    # 另一个 worker 共用项目名索引，在自己的进程中同步 changelog
+    other = PyPIIndexManager(pypi_service.download_client)
+    other.sources = index_manager.sources
+    other.names = index_manager.names
+    other.page_cache = ProjectPageCache(tmp_path / "other")
+    UPSTREAM_STATE["changelog"] = [("demo", "1.1", 0, "new release", 101)]
+    await other.update_index()
+
+    # 本 worker 内存中的页面虽未过期，也会向上游重新验证
+    assert await index_manager.get_project_page("demo") is page
+    assert UPSTREAM_HITS["page_304"] == 1
+    assert await index_manager.get_project_page("demo") is page
+    assert UPSTREAM_HITS["page"] == 2
@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.common.download_client import UpstreamChangedError
+from app.main import app
+from app.pypi.instance import pypi_service
+from app.pypi.storage import PackageStorage
+
+from .conftest import DATA, UPSTREAM_HITS, UPSTREAM_STATE, WHEEL
+
+
+@pytest.mark.asyncio
+async def test_package_miss_is_streamed_and_cached(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.headers["content-length"] == str(len(DATA))
+        assert response.content == DATA
+
+        cached = upstream / "demo" / "1.0" / WHEEL
+        assert cached.read_bytes() == DATA
+        assert not any((upstream / ".tmp").iterdir())
+        assert not any((upstream / ".locks").iterdir())
+
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+
+        record = await pypi_service.package_manager.catalog.get("demo", WHEEL)
+        assert record.size == len(DATA)
+        assert record.sha256 == hashlib.sha256(DATA).hexdigest()
+        assert record.source_url.endswith(f"/packages/ab/{WHEEL}")
+        assert record.hits == 1
+
+        response = await client.get("/pypi/stats")
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["total_packages"] == 1
+        assert stats["total_downloads"] == 2
+        assert stats["cache_hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_cached_file_requested_under_other_version_path(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+
+        # 目录按文件名登记：命中登记的文件，不删除记录也不重新下载
+        response = await client.get(f"/pypi/packages/demo/1.0.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+        assert UPSTREAM_HITS["file"] == 1
+        record = await pypi_service.package_manager.catalog.get("demo", WHEEL)
+        assert record.path == f"demo/1.0/{WHEEL}"
+        assert (upstream / record.path).read_bytes() == DATA
+
+
+@pytest.mark.asyncio
+async def test_package_missing_upstream_returns_404(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/packages/demo/2.0/demo-2.0.tar.gz")
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_package_hit_served_from_file(upstream):
+    cached = upstream / "demo" / "1.0" / WHEEL
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(DATA)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+        assert response.headers["content-length"] == str(len(DATA))
+        assert "last-modified" in response.headers
+        etag = response.headers["etag"]
+
+        response = await client.get(
+            f"/pypi/packages/demo/1.0/{WHEEL}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_download(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(client.get(f"/pypi/packages/demo/1.0/{WHEEL}") for _ in range(20))
+        )
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.content == DATA for response in responses)
+    assert UPSTREAM_HITS["page"] == 1
+    assert UPSTREAM_HITS["file"] == 1
+    assert (upstream / "demo" / "1.0" / WHEEL).read_bytes() == DATA
+
+
+@pytest.mark.asyncio
+async def test_miss_follows_download_owned_by_other_worker(upstream):
+    storage = pypi_service.package_manager.storage
+    key = ("demo", WHEEL)
+    final_path = upstream / "demo" / "1.0" / WHEEL
+
+    # 模拟另一个 worker 持有下载锁并写入了一半数据
+    owner = storage.lock(key)
+    assert owner.acquire()
+    temp_path = storage.new_temp_path(key)
+    storage.claim(owner, temp_path, len(DATA))
+    half = len(DATA) // 2
+    temp_path.write_bytes(DATA[:half])
+
+    async def finish_download():
+        await asyncio.sleep(0.2)
+        with open(temp_path, "ab") as f:
+            f.write(DATA[half:])
+        final_path.parent.mkdir(parents=True)
+        os.replace(temp_path, final_path)
+        owner.release()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response, _ = await asyncio.gather(
+            client.get(f"/pypi/packages/demo/1.0/{WHEEL}"), finish_download()
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(DATA))
+    assert response.content == DATA
+    assert UPSTREAM_HITS["file"] == 0
+
+
+def test_recover_removes_orphaned_temp_files(tmp_path):
+    storage = PackageStorage(tmp_path)
+    orphan = storage.new_temp_path(("demo", "orphan.whl"))
+    orphan.write_bytes(b"partial")
+
+    # 仍被持有锁的下载不应被清理
+    active_key = ("demo", "active.whl")
+    active_lock = storage.lock(active_key)
+    assert active_lock.acquire()
+    active = storage.new_temp_path(active_key)
+    active.write_bytes(b"partial")
+
+    assert storage.recover() == 1
+    assert not orphan.exists()
+    assert active.exists()
+    active_lock.release()
+
+
+@pytest.mark.asyncio
+async def test_truncated_cache_file_is_redownloaded(upstream):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.content == DATA
+
+        # 模拟写到一半被截断的缓存文件
+        cached = upstream / "demo" / "1.0" / WHEEL
+        cached.unlink()
+        cached.write_bytes(DATA[: len(DATA) // 2])
+
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+        assert cached.read_bytes() == DATA
+        assert UPSTREAM_HITS["file"] == 2
+
+
+def test_recover_removes_stale_atomic_write_temp_files(tmp_path):
+    storage = PackageStorage(tmp_path)
+    version_dir = tmp_path / "demo" / "1.0"
+    version_dir.mkdir(parents=True)
+    stale = version_dir / f".{WHEEL}.123.abcd1234.tmp"
+    stale.write_bytes(b"partial")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    fresh = version_dir / f".{WHEEL}.456.abcd1234.tmp"
+    fresh.write_bytes(b"partial")
+
+    assert storage.recover() == 1
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+@pytest.mark.asyncio
+async def test_range_requests_on_cached_file(upstream):
+    cached = upstream / "demo" / "1.0" / WHEEL
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(DATA)
+    url = f"/pypi/packages/demo/1.0/{WHEEL}"
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.head(url)
+        assert response.status_code == 200
+        assert response.headers["content-length"] == str(len(DATA))
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.content == b""
+        etag = response.headers["etag"]
+
+        # 读取 zip 中央目录：后缀范围
+        response = await client.get(url, headers={"Range": "bytes=-1000"})
+        assert response.status_code == 206
+        assert response.content == DATA[-1000:]
+        assert response.headers["content-range"] == (
+            f"bytes {len(DATA) - 1000}-{len(DATA) - 1}/{len(DATA)}"
+        )
+
+        response = await client.get(
+            url, headers={"Range": "bytes=0-9,100-109", "If-Range": etag}
+        )
+        assert response.status_code == 206
+        content_type = response.headers["content-type"]
+        assert content_type.startswith("multipart/byteranges; boundary=")
+        assert int(response.headers["content-length"]) == len(response.content)
+        boundary = content_type.split("boundary=")[1].encode()
+        parts = response.content.split(b"--" + boundary)
+        assert parts[1].endswith(b"\r\n\r\n" + DATA[:10] + b"\r\n")
+        assert b"Content-Range: bytes 100-109/" in parts[2]
+        assert parts[2].endswith(DATA[100:110] + b"\r\n")
+        assert parts[3] == b"--\r\n"
+
+        # 文件已变化：忽略 Range 返回完整文件
+        response = await client.get(
+            url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+        )
+        assert response.status_code == 200
+        assert response.content == DATA
+
+        response = await client.get(url, headers={"Range": f"bytes={len(DATA)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+    assert UPSTREAM_HITS["file"] == UPSTREAM_HITS["range"] == 0
+    # HEAD 与范围请求不计为缓存命中
+    package_manager = pypi_service.package_manager
+    record = await package_manager.catalog.get("demo", WHEEL)
+    assert record.hits == 0
+    assert (await package_manager.catalog.stats()).hits == 0
+
+
+@pytest.mark.asyncio
+async def test_range_request_on_miss_is_forwarded_upstream(upstream):
+    url = f"/pypi/packages/demo/1.0/{WHEEL}"
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(url, headers={"Range": "bytes=-1000"})
+        assert response.status_code == 206
+        assert response.content == DATA[-1000:]
+        assert response.headers["content-range"].endswith(f"/{len(DATA)}")
+
+        response = await client.head(url)
+        assert response.status_code == 200
+        assert response.headers["content-length"] == str(len(DATA))
+
+    # 只转发请求的部分，不触发完整下载
+    assert UPSTREAM_HITS["range"] == 1
+    assert UPSTREAM_HITS["file"] == 0
+    assert not (upstream / "demo" / "1.0" / WHEEL).exists()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_download_resumes_with_range(upstream):
+    UPSTREAM_STATE["drop_at"] = len(DATA) // 2
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+
+    # 中断后只请求剩余部分
+    assert UPSTREAM_HITS["file"] == 1
+    assert UPSTREAM_HITS["range"] == 1
+    assert (upstream / "demo" / "1.0" / WHEEL).read_bytes() == DATA
+
+
+@pytest.mark.asyncio
+async def test_resume_rejects_changed_upstream_file(upstream):
+    client = pypi_service.download_client
+    page = await pypi_service.index_manager.get_project_page("demo")
+    UPSTREAM_STATE["drop_at"] = len(DATA) // 2
+    response = await client.open(page.files[0].url, resumable=True)
+    # 首个响应之后上游文件变化，续传时 If-Range 不再匹配
+    UPSTREAM_STATE["etag"] = '"file-v2"'
+
+    with pytest.raises(UpstreamChangedError):
+        async for _ in response.content.iter_chunked(64 * 1024):
+            pass
+    response.release()
+    assert UPSTREAM_HITS["file"] == 2
+    assert UPSTREAM_HITS["range"] == 0
+
+
+@pytest.mark.asyncio
+async def test_large_file_is_downloaded_in_segments(upstream, monkeypatch):
+    http_settings = pypi_service.download_client.http_settings
+    monkeypatch.setattr(http_settings, "segment_threshold_mb", 1)
+    monkeypatch.setattr(http_settings, "segment_count", 4)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")
+        assert response.status_code == 200
+        assert response.content == DATA
+
+    assert UPSTREAM_HITS["file"] == 1
+    assert UPSTREAM_HITS["range"] == 3
+    assert (upstream / "demo" / "1.0" / WHEEL).read_bytes() == DATA
+    assert not any((upstream / ".tmp").iterdir())
@@ -0,0 +1,244 @@
+import asyncio
+import dataclasses
+import hashlib
+import socket
+import time
+import zipfile
+
+import pytest
+from httpx import AsyncClient
+
+from app.main import app
+from app.pypi.instance import pypi_service
+from app.pypi.project_pages import render_project_page
+from app.pypi.schema import PackageVersion
+
+from app.pypi.simple_parser import SIMPLE_JSON_TYPE
+from app.settings import settings
+
+from .conftest import DATA, METADATA, UPSTREAM_HITS, UPSTREAM_STATE, WHEEL
+
+
+@pytest.mark.asyncio
+async def test_project_page_is_cached_and_revalidated(upstream):
+    index_manager = pypi_service.index_manager
+
+    page = await index_manager.get_project_page("demo")
+    assert [file.filename for file in page.files] == [WHEEL]
+    assert page.files[0].hashes["sha256"] == hashlib.sha256(DATA).hexdigest()
+    assert page.files[0].url.endswith(f"/packages/ab/{WHEEL}")
+
+    # 未过期时不访问上游
+    assert await index_manager.get_project_page("demo") is page
+    assert UPSTREAM_HITS["page"] == 1
+
+    # 过期后使用 ETag 重新验证
+    page.fetched_at = 0
+    assert await index_manager.get_project_page("demo") is page
+    assert UPSTREAM_HITS["page_304"] == 1
+    assert page.age() < 60
+
+
+@pytest.mark.asyncio
+async def test_stale_project_page_served_while_revalidating(upstream):
+    index_manager = pypi_service.index_manager
+    page = await index_manager.get_project_page("demo")
+    page.fetched_at -= index_manager.cache_ttl.total_seconds() + 1
+
+    # 刚过期的页面立即返回，刷新在后台进行
+    assert await index_manager.get_project_page("demo") is page
+    await asyncio.gather(*index_manager._background_tasks)
+    assert UPSTREAM_HITS["page_304"] == 1
+    assert page.age() < 60
+
+
+@pytest.mark.asyncio
+async def test_stale_project_page_served_on_upstream_error(upstream):
+    index_manager = pypi_service.index_manager
+    page = await index_manager.get_project_page("demo")
+    page.fetched_at -= index_manager.cache_ttl.total_seconds() + 3600
+
+    UPSTREAM_STATE["broken"] = True
+    assert await index_manager.get_project_page("demo") is page
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/demo/")
+        assert response.status_code == 200
+        assert WHEEL in response.text
+
+
+@pytest.mark.asyncio
+async def test_project_page_content_negotiation(upstream):
+    digest = hashlib.sha256(DATA).hexdigest()
+    metadata_digest = hashlib.sha256(METADATA).hexdigest()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(
+            "/pypi/simple/demo/",
+            headers={"Accept": "application/vnd.pypi.simple.v1+json"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == (
+            "application/vnd.pypi.simple.v1+json"
+        )
+        data = response.json()
+        assert data["meta"]["api-version"] == "1.0"
+        assert data["files"] == [
+            {
+                "filename": WHEEL,
+                "url": f"/pypi/packages/demo/1.0/{WHEEL}",
+                "hashes": {"sha256": digest},
+                "core-metadata": {"sha256": metadata_digest},
+                "dist-info-metadata": {"sha256": metadata_digest},
+            }
+        ]
+
+        response = await client.get(
+            "/pypi/simple/demo/",
+            headers={"Accept": "text/html, application/vnd.pypi.simple.v1+json;q=0.5"},
+        )
+        assert response.headers["content-type"].startswith("text/html")
+        assert f'href="/pypi/packages/demo/1.0/{WHEEL}#sha256={digest}"' in (
+            response.text
+        )
+
+
+@pytest.mark.asyncio
+async def test_project_page_render_is_cached_until_versions_change(upstream):
+    project_pages = pypi_service.index_manager.project_pages
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/demo/")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "no-cache"
+        etag = response.headers["etag"]
+        rendered = project_pages._rendered["demo", "html"][1]
+
+        # 版本列表未变化：304，且不重新渲染
+        response = await client.get(
+            "/pypi/simple/demo/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert project_pages._rendered["demo", "html"][1] is rendered
+
+        # 不同写法的项目名共用页面缓存与渲染结果
+        response = await client.get(
+            "/pypi/simple/Demo/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert list(project_pages._rendered) == [("demo", "html")]
+
+        # 版本列表变化后重新渲染
+        index_manager = pypi_service.index_manager
+        page = await index_manager.get_project_page("demo")
+        yanked = dataclasses.replace(page.files[0], yanked="broken build")
+        await index_manager.page_cache.put(dataclasses.replace(page, files=[yanked]))
+        response = await client.get(
+            "/pypi/simple/demo/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert 'data-yanked="broken build"' in response.text
+
+
+@pytest.mark.asyncio
+async def test_wheel_metadata_served_from_upstream_then_cached_wheel(upstream):
+    metadata_url = f"/pypi/packages/demo/1.0/{WHEEL}.metadata"
+    metadata_hash = hashlib.sha256(METADATA).hexdigest()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/demo/")
+        assert f'data-core-metadata="sha256={metadata_hash}"' in response.text
+        assert f'data-dist-info-metadata="sha256={metadata_hash}"' in response.text
+
+        response = await client.get(
+            "/pypi/simple/demo/", headers={"Accept": SIMPLE_JSON_TYPE}
+        )
+        file = response.json()["files"][0]
+        assert file["core-metadata"] == {"sha256": metadata_hash}
+
+        # wheel 未缓存：转发上游的元数据文件，不下载 wheel
+        response = await client.get(metadata_url)
+        assert response.status_code == 200
+        assert response.content == METADATA
+        assert UPSTREAM_HITS["metadata"] == 1
+        assert UPSTREAM_HITS["file"] == 0
+
+        # wheel 已缓存：提取一次并保存在 wheel 旁边
+        wheel = upstream / "demo" / "1.0" / WHEEL
+        wheel.parent.mkdir(parents=True)
+        with zipfile.ZipFile(wheel, "w") as archive:
+            archive.writestr("demo-1.0.dist-info/METADATA", METADATA)
+        assert (await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")).status_code == 200
+
+        response = await client.get(metadata_url)
+        assert response.status_code == 200
+        assert response.content == METADATA
+        assert (wheel.parent / f"{WHEEL}.metadata").read_bytes() == METADATA
+        assert UPSTREAM_HITS["metadata"] == 1
+
+        response = await client.get("/pypi/packages/demo/1.0/demo-1.0.tar.gz.metadata")
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_failing_source_is_ranked_after_healthy_source(upstream, monkeypatch):
+    index_manager = pypi_service.index_manager
+    live = index_manager.sources[0]
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{sock.getsockname()[1]}/simple/"
+    monkeypatch.setattr(index_manager, "sources", [dead, live])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/demo/")
+        assert response.status_code == 200
+        board = (await client.get("/pypi/sources")).json()
+
+    assert [row["source"] for row in board] == [live, dead]
+    assert board[0]["requests"] == 1 and board[0]["latency_ms"] is not None
+    assert board[1]["failures"] == 1 and board[1]["state"] == "closed"
+
+    # 之后的请求直接从评分更高的源开始
+    page = await index_manager._refresh_page("demo", None)
+    assert page.source.startswith(live)
+    assert pypi_service.get_sources()[1].requests == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_source_page_request_is_hedged(upstream, monkeypatch):
+    index_manager = pypi_service.index_manager
+    slow = index_manager.sources[0]
+    mirror = slow.replace("/simple/", "/mirror/simple/")
+    monkeypatch.setattr(index_manager, "sources", [slow, mirror])
+    monkeypatch.setattr(settings.hedge, "max_delay", 0.05)
+    monkeypatch.setattr(settings.hedge, "budget", 1.0)
+    UPSTREAM_STATE["page_delay"] = 2
+
+    started = time.monotonic()
+    page = await asyncio.wait_for(index_manager.get_project_page("demo"), 1)
+    assert time.monotonic() - started < 1
+    assert page.source == mirror + "demo/"
+    assert [file.filename for file in page.files] == [WHEEL]
+
+
+def test_project_page_html_is_escaped():
+    version = PackageVersion(
+        version="1.0", filename="demo-1.0<b>.tar.gz", url="https://files/x"
+    )
+    html = render_project_page("html", "de mo", [version]).content.decode()
+    assert 'href="/pypi/packages/de%20mo/1.0/demo-1.0%3Cb%3E.tar.gz"' in html
+    assert ">demo-1.0&lt;b&gt;.tar.gz</a>" in html
+
+
+@pytest.mark.asyncio
+async def test_wheel_metadata_extracted_from_catalogued_path(upstream):
+    wheel = upstream / "demo" / "1.0" / WHEEL
+    wheel.parent.mkdir(parents=True)
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("demo-1.0.dist-info/METADATA", METADATA)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.get(f"/pypi/packages/demo/1.0/{WHEEL}")).status_code == 200
+
+        # 以其他版本路径请求：从登记的 wheel 中提取，不转发上游
+        response = await client.get(f"/pypi/packages/demo/1.0.0/{WHEEL}.metadata")
+        assert response.status_code == 200
+        assert response.content == METADATA
+        assert UPSTREAM_HITS["metadata"] == 0
+        assert (wheel.parent / f"{WHEEL}.metadata").read_bytes() == METADATA
@@ -0,0 +1,75 @@
+import pytest
+from httpx import AsyncClient
+
+from app.main import app
+from app.pypi.instance import pypi_service
+from app.pypi.simple_parser import SIMPLE_JSON_TYPE
+
+from .conftest import UPSTREAM_STATE
+
+
+@pytest.mark.asyncio
+async def test_root_index_is_rendered_once_and_revalidated(upstream):
+    index_manager = pypi_service.index_manager
+    UPSTREAM_STATE["projects"] = [f"project-{i:04d}" for i in range(500)]
+    await index_manager.update_index()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/")
+        assert response.status_code == 200
+        assert response.json() == UPSTREAM_STATE["projects"]
+
+        headers = {"Accept": SIMPLE_JSON_TYPE, "Accept-Encoding": "gzip"}
+        response = await client.get("/pypi/simple/", headers=headers)
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept, Accept-Encoding"
+        assert len(response.json()["projects"]) == 500
+        rendered = index_manager.root_index._rendered["json"][1]
+
+        # 未变化时返回 304，且不重新渲染
+        etag = response.headers["etag"]
+        response = await client.get(
+            "/pypi/simple/", headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        response = await client.get(
+            "/pypi/simple/", headers={"Accept": SIMPLE_JSON_TYPE, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert index_manager.root_index._rendered["json"][1] is rendered
+
+        # 索引变化后重新渲染
+        UPSTREAM_STATE["changelog"] = [("new-project", "1.0", 0, "create", 101)]
+        await index_manager.update_index()
+        response = await client.get(
+            "/pypi/simple/", headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["projects"][-1] == {"name": "project-0499"}
+        assert {"name": "new-project"} in response.json()["projects"]
+
+
+@pytest.mark.asyncio
+async def test_root_index_pagination(upstream):
+    index_manager = pypi_service.index_manager
+    UPSTREAM_STATE["projects"] = ["alpha", "beta", "beta-x", "gamma", "delta"]
+    await index_manager.update_index()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/pypi/simple/", params={"prefix": "beta"})
+        assert response.json() == ["beta", "beta-x"]
+        assert "link" not in response.headers
+
+        response = await client.get("/pypi/simple/", params={"limit": 2})
+        assert response.json() == ["alpha", "beta"]
+        next_url = response.headers["link"].split(";")[0].strip("<>")
+        response = await client.get(next_url)
+        assert response.json() == ["beta-x", "delta"]
+
+        response = await client.get(
+            "/pypi/simple/", params={"cursor": "delta"}, headers={"Accept": "text/html"}
+        )
+        assert '<a href="/pypi/simple/gamma/">gamma</a>' in response.text
+        assert "beta" not in response.text
@@ -0,0 +1,90 @@
+import hashlib
+
+import pytest
+
+from app.pypi.catalog import ArtifactRecord, PackageCatalog
+from app.pypi.storage import PackageStorage
+
+
+@pytest.mark.asyncio
+async def test_catalog_records_hits_and_stats(tmp_path):
+    catalog = PackageCatalog(PackageStorage(tmp_path))
+    await catalog.open()
+    assert catalog.created
+
+    for version in ("1.0", "2.0"):
+        filename = f"demo-{version}.tar.gz"
+        await catalog.put(
+            ArtifactRecord(
+                project="demo",
+                filename=filename,
+                version=version,
+                path=f"demo/{version}/{filename}",
+                size=100,
+                sha256="0" * 64,
+                fetched_at=1.0,
+                last_access=1.0,
+            )
+        )
+
+    assert await catalog.hit("demo", "demo-1.0.tar.gz")
+    assert not await catalog.hit("demo", "missing.tar.gz")
+    record = await catalog.get("demo", "demo-1.0.tar.gz")
+    assert record.hits == 1
+    assert record.last_access > 1.0
+    assert sorted(await catalog.list_versions("demo")) == ["1.0", "2.0"]
+
+    stats = await catalog.stats()
+    assert (stats.projects, stats.versions, stats.files) == (1, 2, 2)
+    assert (stats.size, stats.hits) == (200, 1)
+
+    await catalog.delete_version("demo", "2.0")
+    assert await catalog.list_versions("demo") == ["1.0"]
+    await catalog.close()
+
+    # 重新打开后数据仍在
+    catalog = PackageCatalog(PackageStorage(tmp_path))
+    await catalog.open()
+    assert not catalog.created
+    assert (await catalog.get("demo", "demo-1.0.tar.gz")).hits == 1
+    await catalog.close()
+
+
+@pytest.mark.asyncio
+async def test_catalog_rebuild_from_disk(tmp_path):
+    kept = tmp_path / "demo" / "1.0" / "demo-1.0.tar.gz"
+    added = tmp_path / "other" / "0.1" / "other-0.1.tar.gz"
+    for path in (kept, added):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(path.name.encode())
+    (tmp_path / ".tmp").mkdir()
+    (tmp_path / ".tmp" / "partial.part").write_bytes(b"x")
+
+    catalog = PackageCatalog(PackageStorage(tmp_path))
+    await catalog.put(
+        ArtifactRecord(
+            project="demo",
+            filename="demo-1.0.tar.gz",
+            version="1.0",
+            path="demo/1.0/demo-1.0.tar.gz",
+            size=len(kept.name),
+            source_url="https://example.org/demo-1.0.tar.gz",
+            hits=5,
+        )
+    )
+    await catalog.put(
+        ArtifactRecord(
+            project="gone",
+            filename="gone-1.0.tar.gz",
+            version="1.0",
+            path="gone/1.0/gone-1.0.tar.gz",
+            size=1,
+        )
+    )
+
+    assert await catalog.rebuild() == 2
+    assert (await catalog.get("demo", "demo-1.0.tar.gz")).hits == 5
+    assert await catalog.get("gone", "gone-1.0.tar.gz") is None
+    record = await catalog.get("other", "other-0.1.tar.gz")
+    assert record.sha256 == hashlib.sha256(added.name.encode()).hexdigest()
+    await catalog.close()
@@ -0,0 +1,23 @@
+import asyncio
+
+from app.common.download_client import DownloadClient
+from app.common.proxy_manager import ProxyManager
+
+
+def test_session_is_closed_when_event_loop_changes():
+    client = DownloadClient(ProxyManager())
+
+    async def session():
+        return client.session
+
+    first = asyncio.run(session())
+
+    async def reopen():
+        second = client.session
+        await asyncio.sleep(0)
+        await client.close()
+        return second
+
+    second = asyncio.run(reopen())
+    assert second is not first
+    assert first.closed
@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+from app.pypi.catalog import PackageCatalog
+from app.pypi.eviction import GB, CacheEvictor
+from app.pypi.storage import PackageStorage
+from app.settings import CacheSettings
+
+KB = 1024
+
+
+def _write(storage: PackageStorage, name: str, size: int, age: float):
+    path = storage.root / name / "1.0" / f"{name}-1.0.tar.gz"
+    path.parent.mkdir(parents=True)
+    path.write_bytes((name.encode() * size)[:size])
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+async def _evictor(tmp_path, policy: str, max_kb: float) -> CacheEvictor:
+    storage = PackageStorage(tmp_path)
+    catalog = PackageCatalog(storage)
+    cache_settings = CacheSettings(
+        max_size_gb=max_kb * KB / GB, min_free_space_gb=0, eviction_policy=policy
+    )
+    return CacheEvictor(storage, catalog, cache_settings)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy, survivors",
+    [
+        # old 命中次数最多但最早被访问
+        ("lru", {"big", "small"}),
+        # old 命中次数最多，small 与 big 次数相同但 small 较早访问
+        ("lfu", {"old", "big"}),
+        # 小文件单位字节价值最高
+        ("gdsf", {"old", "small"}),
+    ],
+)
+async def test_eviction_policies(tmp_path, policy, survivors):
+    evictor = await _evictor(tmp_path, policy, max_kb=12)
+    paths = {
+        "old": _write(evictor.storage, "old", 4 * KB, age=300),
+        "big": _write(evictor.storage, "big", 8 * KB, age=200),
+        "small": _write(evictor.storage, "small", 1 * KB, age=100),
+    }
+    await evictor.catalog.rebuild()
+    await evictor.load()
+    assert evictor.total_size == 13 * KB
+
+    evictor.touch(paths["old"], 4 * KB)
+    evictor.touch(paths["old"], 4 * KB)
+    evictor.touch(paths["small"], 1 * KB)
+    evictor.touch(paths["big"], 8 * KB)
+
+    await evictor.make_room()
+    remaining = {name for name, path in paths.items() if path.exists()}
+    assert remaining == survivors
+    assert evictor.total_size == sum(paths[name].stat().st_size for name in survivors)
+    # 空的版本目录和包目录一并删除
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".")) == (
+        sorted(survivors)
+    )
+
+
+@pytest.mark.asyncio
+async def test_make_room_for_incoming_and_free_space_floor(tmp_path, monkeypatch):
+    evictor = await _evictor(tmp_path, "lru", max_kb=0)
+    first = _write(evictor.storage, "first", 4 * KB, age=200)
+    second = _write(evictor.storage, "second", 4 * KB, age=100)
+    await evictor.catalog.rebuild()
+    await evictor.load()
+
+    free = {"bytes": 6 * KB}
+
+    async def free_space():
+        return free["bytes"] + (0 if first.exists() else 4 * KB)
+
+    monkeypatch.setattr(evictor, "free_space", free_space)
+    evictor.settings.min_free_space_gb = 4 * KB / GB
+
+    # 剩余 6KB，写入 4KB 后低于 4KB 下限：淘汰最旧的文件
+    assert await evictor.make_room(4 * KB) == 1
+    assert not first.exists()
+    assert second.exists()
+
+    # 刚写入的文件受保护
+    evictor.record(second, 4 * KB)
+    assert await evictor.make_room(64 * KB, protect={second}) == 0
+    assert second.exists()
+
+    # 其他程序占满磁盘：最多淘汰本缓存新写入的量，不清空缓存
+    async def no_space():
+        return 0
+
+    monkeypatch.setattr(evictor, "free_space", no_space)
+    third = _write(evictor.storage, "third", 2 * KB, age=0)
+    evictor.record(third, 2 * KB)
+    assert await evictor.make_room() == 1
+    assert not second.exists()
+    assert third.exists()
+    assert await evictor.make_room() == 0
+    assert third.exists()
+
+
+@pytest.mark.asyncio
+async def test_shared_content_is_counted_once(tmp_path):
+    evictor = await _evictor(tmp_path, "lru", max_kb=6)
+    paths = [_write(evictor.storage, name, 4 * KB, age=0) for name in ("a", "b")]
+    digest = "0" * 64
+    for path in paths:
+        evictor.record(path, 4 * KB, digest)
+    # 两个硬链接共享同一份内容，只占 4KB
+    assert evictor.total_size == 4 * KB
+    assert await evictor.make_room() == 0
+
+    evictor.forget(paths[0])
+    assert evictor.total_size == 4 * KB
+    evictor.forget(paths[1])
+    assert evictor.total_size == 0
+
+
+@pytest.mark.asyncio
+async def test_expire_by_last_access(tmp_path):
+    evictor = await _evictor(tmp_path, "lru", max_kb=0)
+    stale = _write(evictor.storage, "stale", KB, age=40 * 86400)
+    fresh = _write(evictor.storage, "fresh", KB, age=40 * 86400)
+    await evictor.catalog.rebuild()
+    await evictor.load()
+    evictor.touch(fresh, KB)
+
+    assert await evictor.expire(30) == 1
+    assert not stale.exists()
+    assert fresh.exists()
+    assert len(evictor) == 1
+    assert evictor.total_size == KB
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.common.hedging import Hedger
+from app.common.source_health import SourceHealth
+from app.settings import HedgeSettings, PyPISettings
+
+
+def _hedger(tmp_path, budget: float = 1.0) -> Hedger:
+    health = SourceHealth(PyPISettings(work_dir=str(tmp_path), sources=[]))
+    return Hedger(health, HedgeSettings(max_delay=0.05, budget=budget))
+
+
+def _attempts(delays: dict, calls: list, released: list):
+    async def attempt(source):
+        calls.append(source)
+        try:
+            await asyncio.sleep(delays[source])
+        except asyncio.CancelledError:
+            released.append(f"{source}:cancelled")
+            raise
+        return None if delays[source] is None else source
+
+    return attempt
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled(tmp_path):
+    hedger = _hedger(tmp_path)
+    calls, released = [], []
+    attempt = _attempts({"a": 5, "b": 0.01, "c": 0}, calls, released)
+
+    assert await hedger.run("pages", ["a", "b", "c"], attempt) == "b"
+    await asyncio.sleep(0)
+    # 每次请求最多对冲一次，输掉的请求被取消
+    assert calls == ["a", "b"]
+    assert released == ["a:cancelled"]
+
+
+@pytest.mark.asyncio
+async def test_budget_and_disabled_kinds_fall_back_to_sequential(tmp_path):
+    hedger = _hedger(tmp_path, budget=0.0)
+    calls, released = [], []
+    attempt = _attempts({"a": 0.1, "b": 0}, calls, released)
+    assert await hedger.run("pages", ["a", "b"], attempt) == "a"
+    assert calls == ["a"]
+
+    hedger = _hedger(tmp_path)
+    calls.clear()
+    assert await hedger.run("unknown", ["a", "b"], attempt) == "a"
+    assert calls == ["a"]
+
+    # 失败时立即尝试下一个源
+    calls.clear()
+
+    async def failing(source):
+        calls.append(source)
+        if source == "a":
+            raise RuntimeError("boom")
+        return source
+
+    assert await hedger.run("pages", ["a", "b"], failing) == "b"
+    assert calls == ["a", "b"]
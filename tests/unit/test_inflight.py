@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.pypi.inflight import DownloadIntegrityError, ForeignDownload, InflightDownload
+from app.pypi.storage import PackageStorage
+
+DATA = os.urandom(300 * 1024)
+
+
+class _Content:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def iter_chunked(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i : i + chunk_size]
+
+
+class _GatedContent(_Content):
+    """先发送前一半数据，等读取方开始读取后再发送其余部分"""
+
+    def __init__(self, data: bytes, gate: asyncio.Event):
+        super().__init__(data)
+        self.gate = gate
+
+    async def iter_chunked(self, chunk_size):
+        half = len(self.data) // 2
+        yield self.data[:half]
+        await self.gate.wait()
+        yield self.data[half:]
+
+
+def _response(data: bytes):
+    return SimpleNamespace(content=_Content(data), release=lambda: None)
+
+
+def _download(storage: PackageStorage, name: str, **kwargs) -> InflightDownload:
+    final_path = storage.root / name / "1.0" / f"{name}-1.0.tar.gz"
+    return InflightDownload(
+        storage, storage.new_temp_path((name, final_path.name)), final_path, **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_stored_once(tmp_path):
+    storage = PackageStorage(tmp_path)
+    sha256 = hashlib.sha256(DATA).hexdigest()
+
+    first = _download(storage, "first", size=len(DATA), expected_sha256=sha256)
+    await first.run(_response(DATA))
+    second = _download(storage, "second", size=len(DATA))
+    await second.run(_response(DATA))
+
+    assert (first.sha256, first.duplicate) == (sha256, False)
+    assert (second.sha256, second.duplicate) == (sha256, True)
+    blob = storage.blob_path(sha256)
+    assert os.path.samefile(first.final_path, blob)
+    assert os.path.samefile(second.final_path, blob)
+    assert blob.stat().st_nlink == 3
+    assert not any(storage.temp_dir.iterdir())
+
+    # 删除一个文件名时保留内容，删除最后一个时一并删除
+    storage.remove(first.final_path, sha256)
+    assert blob.exists()
+    storage.remove(second.final_path, sha256)
+    assert not blob.exists()
+    assert not (tmp_path / "second").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body, kwargs",
+    [
+        (DATA[:-1] + b"\0", {"expected_sha256": hashlib.sha256(DATA).hexdigest()}),
+        (DATA[: len(DATA) // 2], {"size": len(DATA)}),
+    ],
+    ids=["corrupted", "truncated"],
+)
+async def test_invalid_download_never_enters_cache(tmp_path, body, kwargs):
+    storage = PackageStorage(tmp_path)
+    inflight = _download(storage, "demo", **kwargs)
+    gate = asyncio.Event()
+    response = SimpleNamespace(content=_GatedContent(body, gate), release=lambda: None)
+    task = asyncio.create_task(inflight.run(response))
+
+    received = b""
+    with pytest.raises(RuntimeError):
+        async for chunk in inflight.tail():
+            received += chunk
+            gate.set()
+    await task
+    assert isinstance(inflight.error, DownloadIntegrityError)
+    # 客户端拿不到最后一个字节，不会把坏文件当作完整文件
+    assert len(received) == len(body) - 1
+    assert not inflight.final_path.exists()
+    assert not any(storage.temp_dir.iterdir())
+    assert not any(storage.blob_dir.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_reader_joining_during_commit_opens_committed_file(tmp_path):
+    storage = PackageStorage(tmp_path)
+    inflight = _download(storage, "demo", size=len(DATA))
+    commit = storage.commit
+    joined = []
+
+    def commit_then_join(*args):
+        duplicate = commit(*args)
+        # 临时文件已移走，摘要尚未公布
+        with inflight._open_reader() as file:
+            joined.append(file.read())
+        return duplicate
+
+    storage.commit = commit_then_join
+    await inflight.run(_response(DATA))
+    assert inflight.error is None
+    assert joined == [DATA]
+
+
+class _SlowContent(_Content):
+    def __init__(self, data: bytes, delay: float):
+        super().__init__(data)
+        self.delay = delay
+
+    async def iter_chunked(self, chunk_size):
+        async for chunk in super().iter_chunked(chunk_size):
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_segmented_download_is_read_in_order(tmp_path):
+    storage = PackageStorage(tmp_path)
+    inflight = _download(
+        storage,
+        "demo",
+        size=len(DATA),
+        expected_sha256=hashlib.sha256(DATA).hexdigest(),
+    )
+    key = ("demo", inflight.final_path.name)
+    owner = storage.lock(key)
+    assert owner.acquire()
+    storage.claim(owner, inflight.temp_path, len(DATA), segmented=True)
+    follower = ForeignDownload(storage, storage.lock(key), inflight.final_path)
+
+    step = len(DATA) // 4
+    unavailable = 2 * step
+    opened = []
+
+    async def open_segment(start, end):
+        retry = (start, end) in opened
+        opened.append((start, end))
+        if (start, end) == (unavailable, 3 * step) and not retry:
+            return None
+        # 后面的段先写完，首段最慢
+        return SimpleNamespace(
+            content=_SlowContent(DATA[start:end], 0), release=lambda: None
+        )
+
+    async def run():
+        try:
+            await inflight.run(
+                SimpleNamespace(
+                    content=_SlowContent(DATA, 0.002), release=lambda: None
+                ),
+                segments=[step, unavailable, 3 * step],
+                open_segment=open_segment,
+            )
+        finally:
+            owner.release()
+
+    async def read(download):
+        return b"".join([chunk async for chunk in download.tail()])
+
+    _, local, foreign = await asyncio.gather(run(), read(inflight), read(follower))
+    assert inflight.error is None
+    # 各段只请求本段的范围；打开失败的段由前一段读完自己的范围后继续请求
+    assert opened == [
+        (step, unavailable),
+        (unavailable, 3 * step),
+        (3 * step, len(DATA)),
+        (unavailable, 3 * step),
+    ]
+    assert inflight._segments == [(0, step), (step, 3 * step), (3 * step, len(DATA))]
+    assert local == foreign == DATA
+    assert inflight.final_path.read_bytes() == DATA
+    assert not any(storage.temp_dir.iterdir())
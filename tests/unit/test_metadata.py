@@ -0,0 +1,49 @@
+import zipfile
+
+import pytest
+
+from app.pypi.metadata import extract_wheel_metadata
+from app.pypi.simple_parser import parse_metadata_attr, parse_project_json
+
+METADATA = b"Metadata-Version: 2.1\nName: demo\nVersion: 1.0\n"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, None),
+        ("false", None),
+        ("true", {}),
+        ("sha256=abc", {"sha256": "abc"}),
+    ],
+)
+def test_parse_metadata_attr(value, expected):
+    assert parse_metadata_attr(value) == expected
+
+
+def test_parse_project_json_core_metadata():
+    content = (
+        b'{"files": [{"filename": "a-1.0-py3-none-any.whl", "url": "a.whl",'
+        b' "core-metadata": {"sha256": "abc"}},'
+        b' {"filename": "b-1.0-py3-none-any.whl", "url": "b.whl",'
+        b' "dist-info-metadata": true},'
+        b' {"filename": "c-1.0.tar.gz", "url": "c.tar.gz"}]}'
+    )
+    files = parse_project_json(content, "https://example.com/simple/a/")
+    assert [file.core_metadata for file in files] == [{"sha256": "abc"}, {}, None]
+
+
+def test_extract_wheel_metadata(tmp_path):
+    # 缓存路径中的文件名已标准化，包名与版本取自原始文件名
+    filename = "my_pkg-1.0-py3-none-any.whl"
+    wheel = tmp_path / "my-pkg-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("my_pkg/__init__.py", "")
+        archive.writestr("vendored-2.0.dist-info/METADATA", b"other")
+        archive.writestr("my_pkg-1.0.dist-info/METADATA", METADATA)
+        archive.writestr("my_pkg-1.0.dist-info/RECORD", "")
+    assert extract_wheel_metadata(wheel, filename) == METADATA
+
+    broken = tmp_path / "broken-1.0-py3-none-any.whl"
+    broken.write_bytes(b"not a zip")
+    assert extract_wheel_metadata(broken, broken.name) is None
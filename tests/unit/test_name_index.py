@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from app.pypi.name_index import ProjectNameIndex
+
+
+@pytest.mark.asyncio
+async def test_remote_updates_write_only_changes(tmp_path):
+    index = ProjectNameIndex(tmp_path / "projects.db")
+    assert await index.replace_remote(["requests", "flask", "django"]) == (3, 0)
+    await index.add_local("private-pkg")
+    await index.add_local("flask")
+
+    # flask 仍在本地，不会因为上游移除而消失
+    assert await index.replace_remote(["requests", "django", "numpy"]) == (1, 1)
+    assert await index.names() == [
+        "django",
+        "flask",
+        "numpy",
+        "private-pkg",
+        "requests",
+    ]
+    assert await index.counts() == (2, 3)
+    assert await index.contains("flask")
+
+    await index.remove_local("flask")
+    await index.remove_local("requests")
+    assert not await index.contains("flask")
+    assert await index.contains("requests")
+    await index.close()
+
+
+@pytest.mark.asyncio
+async def test_prefix_scan_and_legacy_import(tmp_path):
+    legacy = tmp_path / "package_index.json"
+    legacy.write_text(
+        json.dumps(
+            {
+                "last_update": "2024-01-01T00:00:00",
+                "local_packages": ["py-local"],
+                "remote_packages": ["pytest", "pytest-asyncio", "pyyaml", "requests"],
+            }
+        )
+    )
+    index = ProjectNameIndex(tmp_path / "projects.db")
+    assert await index.import_json(legacy) == "2024-01-01T00:00:00"
+    assert not legacy.exists()
+    assert await index.import_json(legacy) is None
+
+    assert await index.names("pytest") == ["pytest", "pytest-asyncio"]
+    assert await index.names("py") == ["py-local", "pytest", "pytest-asyncio", "pyyaml"]
+    assert await index.names("zzz") == []
+    assert await index.count() == 5
+    await index.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from app.common import responses
+from app.common.responses import MAX_RANGES, CachedFileResponse, parse_range_header
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("bytes=0-99", [(0, 100)]),
+        ("bytes=900-", [(900, 1000)]),
+        ("bytes=-100", [(900, 1000)]),
+        ("bytes=-5000", [(0, 1000)]),
+        ("bytes=990-2000", [(990, 1000)]),
+        # 重叠与相邻的范围合并，并按起始位置排序
+        ("bytes=500-599, 0-9, 10-19, 550-650", [(0, 20), (500, 651)]),
+        # 无法满足
+        ("bytes=1000-", []),
+        ("bytes=-0", []),
+        # 语法无效时忽略
+        ("bytes=9-1", None),
+        ("bytes=a-b", None),
+        ("bytes=-", None),
+        ("items=0-1", None),
+        ("bytes=" + ",".join(["0-1"] * (MAX_RANGES + 1)), None),
+    ],
+)
+def test_parse_range_header(value, expected):
+    assert parse_range_header(value, 1000) == expected
+
+
+async def _get(path, headers):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await CachedFileResponse(path)(scope, None, send)
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_cached_file_small_and_chunked_paths_agree(tmp_path, monkeypatch):
+    path = tmp_path / "demo.whl"
+    content = bytes(range(256)) * 40
+    path.write_bytes(content)
+
+    # 小文件在打开时整体读入
+    small = [await _get(path, {}), await _get(path, {"Range": "bytes=100-199"})]
+    # 块大小小于文件时按块 pread
+    monkeypatch.setattr(responses, "READ_CHUNK_SIZE", 1000)
+    chunked = [await _get(path, {}), await _get(path, {"Range": "bytes=100-199"})]
+
+    assert small == chunked == [(200, content), (206, content[100:200])]
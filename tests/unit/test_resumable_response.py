@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+
+from app.common.download_client import (
+    CHUNK_SIZE,
+    RESUME_PROGRESS_RESET,
+    ResumableResponse,
+)
+
+SIZE = 64 * CHUNK_SIZE
+
+
+class _Trickle:
+    """每个连接只发送一块数据就断开"""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.status = 206 if start else 200
+        self.url = "https://files.example/demo.whl"
+        self.content_type = "application/octet-stream"
+        self.content_length = SIZE - start
+        self.headers = {
+            "ETag": '"v1"',
+            "Content-Range": f"bytes {start}-{SIZE - 1}/{SIZE}",
+        }
+        self.content = self
+
+    async def iter_chunked(self, chunk_size):
+        yield b"\0" * chunk_size
+        raise aiohttp.ClientPayloadError("Connection closed")
+
+    def release(self):
+        pass
+
+
+def _client(max_retries: int):
+    opened = []
+
+    async def open(url, headers, statuses):
+        start = int(headers["Range"][len("bytes=") :].split("-")[0])
+        opened.append(start)
+        return _Trickle(start)
+
+    return SimpleNamespace(
+        max_retries=max_retries,
+        backoff=lambda failures: 0,
+        open=open,
+        health=SimpleNamespace(observe_transfer=lambda *args: None),
+        opened=opened,
+    )
+
+
+@pytest.mark.asyncio
+async def test_trickling_upstream_is_limited_by_retries():
+    client = _client(max_retries=3)
+    response = ResumableResponse(client, "https://files.example/demo.whl", _Trickle(0))
+
+    received = 0
+    with pytest.raises(aiohttp.ClientPayloadError):
+        async for chunk in response.iter_chunked(CHUNK_SIZE):
+            received += len(chunk)
+    # 每个连接都有进展，但不足以重置失败计数
+    assert len(client.opened) == 3
+    assert received == 4 * CHUNK_SIZE < RESUME_PROGRESS_RESET
@@ -0,0 +1,95 @@
+import json
+
+from app.pypi.simple_parser import (
+    ProjectNameParser,
+    parse_anchors,
+    parse_project_names_json,
+    parse_project_page,
+    parse_project_response,
+)
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <body>
+    <h1>Links for demo</h1>
+    <a href="../../packages/ab/demo-1.0.tar.gz#sha256=abc123" data-requires-python="&gt;=3.8">demo-1.0.tar.gz</a><br/>
+    <A HREF='../../packages/cd/demo-1.1-py3-none-any.whl' data-requires-python=">=3.9" data-yanked>demo-1.1-py3-none-any.whl</A>
+    <a href="/packages/ef/demo-2.0.zip" data-yanked="broken &amp; bad">
+      demo-2.0.zip
+    </a>
+  </body>
+</html>
+""".encode()
+
+
+def test_parse_project_page():
+    files = parse_project_page(PAGE, "https://mirror.example/simple/demo/")
+
+    assert [f.filename for f in files] == [
+        "demo-1.0.tar.gz",
+        "demo-1.1-py3-none-any.whl",
+        "demo-2.0.zip",
+    ]
+    assert files[0].url == "https://mirror.example/packages/ab/demo-1.0.tar.gz"
+    assert files[0].hashes == {"sha256": "abc123"}
+    assert files[0].requires_python == ">=3.8"
+    assert files[0].yanked is None
+    assert files[1].requires_python == ">=3.9"
+    assert files[1].yanked == ""
+    assert files[2].url == "https://mirror.example/packages/ef/demo-2.0.zip"
+    assert files[2].yanked == "broken & bad"
+
+
+def test_parser_handles_any_chunk_boundary():
+    expected = parse_anchors([PAGE])
+    for size in (1, 2, 7, 64):
+        chunks = [PAGE[i : i + size] for i in range(0, len(PAGE), size)]
+        assert parse_anchors(chunks) == expected
+
+
+def test_parser_names_only_and_utf8_split():
+    page = '<a href="/simple/café/">café</a><a href="/simple/b/">b</a>'.encode()
+    parser = ProjectNameParser()
+    names = []
+    for i in range(len(page)):
+        names.extend(parser.feed(page[i : i + 1]))
+    names.extend(parser.close())
+    assert names == ["café", "b"]
+
+
+def test_parse_pep691_json():
+    content = json.dumps(
+        {
+            "meta": {"api-version": "1.1"},
+            "name": "demo",
+            "files": [
+                {
+                    "filename": "demo-1.0.tar.gz",
+                    "url": "../../packages/ab/demo-1.0.tar.gz",
+                    "hashes": {"sha256": "abc123"},
+                    "requires-python": ">=3.8",
+                },
+                {
+                    "filename": "demo-1.1.tar.gz",
+                    "url": "https://files.example/demo-1.1.tar.gz",
+                    "hashes": {},
+                    "yanked": True,
+                },
+            ],
+        }
+    ).encode()
+
+    files = parse_project_response(
+        content,
+        "application/vnd.pypi.simple.v1+json",
+        "https://mirror.example/simple/demo/",
+    )
+    assert files[0].url == "https://mirror.example/packages/ab/demo-1.0.tar.gz"
+    assert files[0].hashes == {"sha256": "abc123"}
+    assert files[0].requires_python == ">=3.8"
+    assert files[0].yanked is None
+    assert files[1].url == "https://files.example/demo-1.1.tar.gz"
+    assert files[1].yanked == ""
+
+    root = json.dumps({"projects": [{"name": "a"}, {"name": "b"}]}).encode()
+    assert parse_project_names_json(root) == ["a", "b"]
@@ -0,0 +1,59 @@
+from app.common import source_health
+from app.common.source_health import CLOSED, HALF_OPEN, OPEN, SourceHealth
+from app.settings import PyPISettings
+
+FAST = "https://fast.example/simple/"
+SLOW = "https://slow.example/simple/"
+
+
+def _health(tmp_path) -> SourceHealth:
+    pypi_settings = PyPISettings(
+        work_dir=str(tmp_path),
+        sources=[SLOW, FAST],
+        source_failure_threshold=2,
+        source_open_seconds=30,
+    )
+    return SourceHealth(pypi_settings)
+
+
+def test_rank_by_latency_and_errors(tmp_path):
+    health = _health(tmp_path)
+    # 没有记录时保持配置顺序
+    assert health.rank([SLOW, FAST]) == [SLOW, FAST]
+
+    health.observe(SLOW + "demo/", 2.0, True)
+    health.observe("https://fast.example/packages/demo.whl", 0.1, True)
+    assert health.rank([SLOW, FAST]) == [FAST, SLOW]
+
+    # 失败按超时时间计入期望耗时
+    health.observe(FAST + "demo/", 0.1, False)
+    assert health.rank([SLOW, FAST]) == [SLOW, FAST]
+
+    # 不属于任何源的地址不记录
+    health.observe("https://other.example/file", 1.0, False)
+    assert sum(row["requests"] for row in health.scoreboard([SLOW, FAST])) == 3
+
+
+def test_circuit_opens_and_half_opens(tmp_path, monkeypatch):
+    health = _health(tmp_path)
+    now = [1000.0]
+    monkeypatch.setattr(source_health.time, "monotonic", lambda: now[0])
+
+    health.observe(FAST, 0.1, True)
+    health.observe(SLOW, 5.0, True)
+    health.observe(FAST, 0.1, False)
+    assert health.scoreboard([FAST])[0]["state"] == CLOSED
+    health.observe(FAST, 0.1, False)
+    board = {row["source"]: row for row in health.scoreboard([SLOW, FAST])}
+    assert board[FAST]["state"] == OPEN
+    assert health.rank([FAST, SLOW]) == [SLOW, FAST]
+    assert health.due_for_probe([FAST]) == []
+
+    # 冷却后半开：允许探测，成功即恢复
+    now[0] += 31
+    assert health.scoreboard([FAST])[0]["state"] == HALF_OPEN
+    assert health.due_for_probe([FAST]) == [FAST]
+    health.observe(FAST, 0.1, True)
+    board = health.scoreboard([FAST])[0]
+    assert board["state"] == CLOSED
+    assert board["consecutive_failures"] == 0
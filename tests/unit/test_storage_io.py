@@ -0,0 +1,57 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.pypi.inflight import InflightDownload
+from app.pypi.storage import PackageStorage
+
+BLOCK = b"\0" * (1024 * 1024)
+# 1 GB 的测量见 tests/benchmarks/bench_storage_io.py
+TOTAL_BLOCKS = 64
+TICK = 0.01
+MAX_LAG = 0.1
+
+
+class _Content:
+    async def iter_chunked(self, chunk_size):
+        for _ in range(TOTAL_BLOCKS):
+            yield BLOCK
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_large_write(tmp_path):
+    storage = PackageStorage(tmp_path)
+    key = ("demo", "large.whl")
+    final_path = tmp_path / "demo" / "large.whl"
+    inflight = InflightDownload(
+        storage, storage.new_temp_path(key), final_path, len(BLOCK) * TOTAL_BLOCKS
+    )
+    response = SimpleNamespace(content=_Content(), release=lambda: None)
+
+    # 写入期间测量事件循环的调度延迟
+    max_lag = 0.0
+    ticks = 0
+
+    async def ticker():
+        nonlocal max_lag, ticks
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            max_lag = max(max_lag, time.perf_counter() - started - TICK)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        await inflight.run(response)
+    finally:
+        ticker_task.cancel()
+
+    try:
+        assert inflight.error is None
+        assert final_path.stat().st_size == len(BLOCK) * TOTAL_BLOCKS
+        assert ticks > 0
+        assert max_lag < MAX_LAG
+    finally:
+        final_path.unlink(missing_ok=True)
@@ -0,0 +1,95 @@
+from app.pypi.page_cache import ProjectFile, ProjectPage
+from app.pypi.versions import (
+    ProjectVersions,
+    parse_filename,
+    version_key,
+)
+
+
+def test_version_key_orders_by_pep440():
+    versions = [
+        "1.10",
+        "1.9",
+        "1.0.post1",
+        "1.0",
+        "1.0rc1",
+        "1.0b2",
+        "1.0a1",
+        "1.0.dev0",
+        "1.0+local.2",
+        "1!0.1",
+        "not-a-version",
+    ]
+    assert sorted(versions, key=version_key) == [
+        "not-a-version",
+        "1.0.dev0",
+        "1.0a1",
+        "1.0b2",
+        "1.0rc1",
+        "1.0",
+        "1.0+local.2",
+        "1.0.post1",
+        "1.9",
+        "1.10",
+        "1!0.1",
+    ]
+    assert version_key("1.0") == version_key("1.0.0") == version_key("v1.0")
+    assert version_key("1.0-1") == version_key("1.0.post1")
+    assert version_key("1.0alpha2") == version_key("1.0a2")
+
+
+def test_parse_filename():
+    wheel = parse_filename("Foo_Bar-1.0.post1-1-py3-none-any.whl")
+    assert (wheel.project, wheel.version, wheel.kind, wheel.build) == (
+        "foo-bar",
+        "1.0.post1",
+        "wheel",
+        "1",
+    )
+    sdist = parse_filename("python-dateutil-2.8.2.tar.gz")
+    assert (sdist.project, sdist.version, sdist.kind) == (
+        "python-dateutil",
+        "2.8.2",
+        "sdist",
+    )
+    # 项目名包含数字开头的部分时按已知项目名拆分
+    sdist = parse_filename("py-3to2-1.0-1.zip", project="py_3to2")
+    assert (sdist.project, sdist.version) == ("py-3to2", "1.0-1")
+    egg = parse_filename("setuptools-0.6c11-py2.7.egg")
+    assert (egg.project, egg.version, egg.kind) == ("setuptools", "0.6c11", "egg")
+    assert parse_filename("demo-1.0.win32.exe") is None
+    assert parse_filename("demo.tar.gz") is None
+
+
+def test_project_versions_group_and_sort():
+    filenames = [
+        "demo-1.9.tar.gz",
+        "demo-1.10-py3-none-any.whl",
+        "demo-1.10.tar.gz",
+        "demo-2.0rc1.tar.gz",
+        "demo-1.11.tar.gz",
+        "demo-1.9-py3-none-any.whl",
+    ]
+    files = [
+        ProjectFile(filename, f"https://files/{filename}") for filename in filenames
+    ]
+    versions = ProjectVersions.from_page(ProjectPage("demo", "src", files))
+
+    assert [release.version for release in versions.releases] == [
+        "2.0rc1",
+        "1.11",
+        "1.10",
+        "1.9",
+    ]
+    assert [file.filename for file in versions.releases[2].files] == [
+        "demo-1.10-py3-none-any.whl",
+        "demo-1.10.tar.gz",
+    ]
+    assert [file.version for file in versions.files] == [
+        "2.0rc1",
+        "1.11",
+        "1.10",
+        "1.10",
+        "1.9",
+        "1.9",
+    ]